@@ -0,0 +1,361 @@
+import hashlib
+import json
+import math
+import os
+import time
+
+import metrics
+from chat_utils import accumulate_per_user
+from text_pipeline import raw_tokens, simple_filter
+
+TRAIT_NAMES = ['openness', 'conscientiousness', 'extraversion', 'agreeableness', 'neuroticism']
+
+# Log-odds blend per trait: model log-odds times 'model', plus the lexicon
+# feature times 'lexicon', plus 'bias'. The lexicon feature is tanh of the net
+# hits per LEXICON_SCALE% of tokens: 0 without hits, bounded to +-1, so a short
+# text full of lexicon words moves the score by at most 'lexicon' log-odds
+# instead of saturating it. With no lexicon hits the blend is the model
+# probability. fit_blend() replaces these with weights fitted on labeled data.
+DEFAULT_BLEND = {trait: {'model': 1.0, 'lexicon': 1.5, 'bias': 0.0} for trait in TRAIT_NAMES}
+LEXICON_SCALE = 5.0
+_EPS = 1e-6
+
+
+def _logit(p):
+    p = min(max(p, _EPS), 1 - _EPS)
+    return math.log(p / (1 - p))
+
+
+def lexicon_feature(raw, tokens):
+    return math.tanh(raw * 100 / max(tokens, 1) / LEXICON_SCALE)
+
+
+def _sigmoid(z):
+    return 1 / (1 + math.exp(-z)) if z >= 0 else math.exp(z) / (1 + math.exp(z))
+
+
+def blend_path(model_path):
+    """``<model>.blend.json`` beside a .joblib file or a .flat directory."""
+    return os.path.splitext(model_path.rstrip(os.sep))[0] + '.blend.json'
+
+
+_blends = {}  # path -> (stamp, params)
+
+
+def load_blend(path):
+    """Blend weights from ``path`` (reloaded when it changes), or DEFAULT_BLEND if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return DEFAULT_BLEND
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _blends.get(path)
+    if cached is None or cached[0] != stamp:
+        with open(path, encoding='utf-8') as f:
+            params = json.load(f)['traits']
+        cached = _blends[path] = (stamp, dict(DEFAULT_BLEND, **params))
+    return cached[1]
+
+
+class Analysis(object):
+    """One participant's result, shared by the CLI and the web app.
+
+    ``scores`` are the blended probabilities per trait and ``labels`` 1
+    where a score is above 0.5. ``lexicon`` holds the raw weighted lexicon scores,
+    ``lexicon_normalized`` the same divided by the largest, ``model_labels``
+    and ``model_proba`` the classifier output (None without a model or when
+    no model features were found). A trait with neither model output nor
+    lexicon hits scores 0.
+    """
+
+    def __init__(self, name, messages, tokens, lexicon, lexicon_normalized, model_labels, model_proba, scores):
+        self.name = name
+        self.messages = messages
+        self.tokens = tokens
+        self.lexicon = lexicon
+        self.lexicon_normalized = lexicon_normalized
+        self.model_labels = model_labels
+        self.model_proba = model_proba
+        self.scores = scores
+        self.labels = {trait: int(p > 0.5) for trait, p in scores.items()}
+
+    @property
+    def dominant(self):
+        if not any(self.scores.values()):
+            return None
+        return max(self.scores, key=self.scores.get)
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'messages': self.messages,
+            'tokens': self.tokens,
+            'scores': {k: round(v, 4) for k, v in self.scores.items()},
+            'labels': self.labels,
+            'dominant': self.dominant,
+            'lexicon': {k: round(v, 4) for k, v in self.lexicon.items()},
+            'lexicon_normalized': {k: round(v, 4) for k, v in self.lexicon_normalized.items()},
+            'model_labels': self.model_labels,
+            'model_proba': None if self.model_proba is None else {k: round(v, 4) for k, v in self.model_proba.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['name'], d['messages'], d['tokens'], d['lexicon'], d['lexicon_normalized'],
+                   d['model_labels'], d['model_proba'], d['scores'])
+
+
+class UserState(object):
+    """One participant's running lexicon hits and model term counts.
+
+    Each message is split with ``raw_tokens`` once. The lexicon side runs
+    those words through the pipeline (slang, negation, stemming); the model
+    side gets ``simple_filter`` of the same words when its vectorizer takes
+    them as they are, and otherwise preprocesses the message itself.
+    """
+
+    __slots__ = ('analyzer', 'messages', 'tokens', 'hits', 'negation', 'model_acc', 'trace')
+
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+        self.messages = 0
+        self.tokens = 0
+        self.hits = {}        # lexicon term -> count
+        self.negation = [0]   # open negation window, carried across messages
+        self.model_acc = analyzer.counter.accumulator() if analyzer.counter is not None else None
+        self.trace = metrics.current()
+
+    def add(self, message):
+        a = self.analyzer
+        trace = self.trace
+        if trace is not None:
+            t0 = time.perf_counter()
+        raw = list(raw_tokens(message))
+        tokens = list(a.pipeline.message_tokens(raw, self.negation))
+        self.messages += 1
+        self.tokens += len(tokens)
+        vocab, hits = a.lexicon.vocabulary, self.hits
+        for tok in tokens:
+            if tok in vocab:
+                hits[tok] = hits.get(tok, 0) + 1
+        if trace is not None:
+            t1 = time.perf_counter()
+            trace.add('preprocess', t1 - t0)
+        if self.model_acc is not None:
+            if a.shared_tokens:
+                a.counter.fold_tokens(self.model_acc, list(simple_filter(raw)))
+            else:
+                self.model_acc.add(message)
+        if trace is not None:
+            trace.add('vectorize', time.perf_counter() - t1)
+            trace.incr('messages')
+            trace.incr('tokens', len(tokens))
+
+
+class HybridAnalyzer(object):
+    """Lexicon and model scores from one tokenization pass, blended per trait.
+
+    ``pipeline`` is the TextPipeline the lexicon was stemmed for and
+    ``lexicon`` a TraitLexicon; without ``model_path`` only the lexicon is
+    scored. Built per analysis run (cheap: everything it holds is cached
+    elsewhere), so a reloaded model is picked up by the next run.
+    """
+
+    def __init__(self, pipeline, lexicon, model_path=None, blend=None, pipeline_fingerprint=''):
+        from feature_accumulator import term_counter
+        from model_registry import get_model
+        from preprocessing import simple_preprocess
+        self.pipeline = pipeline
+        self.lexicon = lexicon
+        self.model_path = model_path
+        self.counter = None
+        self.shared_tokens = False
+        if model_path:
+            data = get_model(model_path)
+            preprocess = data.get('preprocess_func', simple_preprocess)
+            self.counter = term_counter(data['vec'], preprocess)
+            self.shared_tokens = preprocess is simple_preprocess and self.counter.accepts_tokens
+            if blend is None:
+                blend = load_blend(blend_path(model_path))
+        self.blend = blend or DEFAULT_BLEND
+        self.pipeline_fingerprint = pipeline_fingerprint
+
+    def new_user(self):
+        return UserState(self)
+
+    def fingerprint(self):
+        """Cache key part for everything besides the model: pipeline, lexicon and blend weights."""
+        h = hashlib.sha1(self.pipeline_fingerprint.encode('utf-8'))
+        h.update(self.lexicon.fingerprint().encode('utf-8'))
+        h.update(json.dumps(self.blend, sort_keys=True).encode('utf-8'))
+        return h.hexdigest()[:12]
+
+    def features(self, states):
+        """Per-state lexicon raw scores (lexicon trait order), model labels and probabilities."""
+        raw = self.lexicon.scores_matrix([s.hits for s in states])
+        if self.counter is None:
+            return raw, [None] * len(states), [None] * len(states)
+        from model import predict_accumulated
+        labels, probas = predict_accumulated([s.model_acc for s in states], self.model_path, return_proba=True)
+        return raw, labels, probas
+
+    def analyze_users(self, states, names):
+        """[Analysis] for UserStates, scored in one lexicon matmul and one model pass."""
+        from trait_lexicon import normalize_scores
+        if not states:
+            return []
+        raw, labels, probas = self.features(states)
+        norm = normalize_scores(raw)
+        traits = self.lexicon.traits
+        out = []
+        for i, (state, name) in enumerate(zip(states, names)):
+            lexicon = dict(zip(traits, raw[i].tolist()))
+            proba = probas[i]
+            if proba is not None and None in proba.values():
+                # Nothing left for the model after preprocessing ("ok ya"): its
+                # all-zero labels stand, the blend uses the lexicon alone
+                proba = None
+            scores = {}
+            for trait in TRAIT_NAMES:
+                if proba is None and not lexicon.get(trait):
+                    scores[trait] = 0.0  # no evidence either way
+                    continue
+                w = self.blend.get(trait, DEFAULT_BLEND[trait])
+                z = w['bias'] + w['lexicon'] * lexicon_feature(lexicon.get(trait, 0.0), state.tokens)
+                if proba is not None:
+                    z += w['model'] * _logit(proba[trait])
+                scores[trait] = _sigmoid(z)
+            out.append(Analysis(name, state.messages, state.tokens, lexicon, dict(zip(traits, norm[i].tolist())),
+                                None if self.counter is None else labels[i], proba, scores))
+        return out
+
+    def analyze_messages(self, messages, name='User'):
+        state = self.new_user()
+        for message in messages:
+            state.add(message)
+        return self.analyze_users([state], [name])[0]
+
+    def analyze_records(self, records, progress=None, chunk=64):
+        """{name: Analysis} for ``iter_chat_records`` output, one state per sender.
+
+        Senders are scored in one batch. With ``progress`` (a job_queue.Job)
+        they are scored ``chunk`` at a time and each is reported with
+        ``progress.participant_done``; if a chunk fails its senders are
+        retried one by one, so a sender that fails is reported with its
+        error and left out of the result.
+        """
+        states = accumulate_per_user(records, self.new_user)
+        if progress is None:
+            return dict(zip(states, self.analyze_users(list(states.values()), list(states))))
+        names = list(states)
+        out = {}
+        for start in range(0, len(names), chunk):
+            batch = names[start:start + chunk]
+            try:
+                results = self.analyze_users([states[n] for n in batch], batch)
+            except Exception:
+                results = None
+            if results is not None:
+                for name, analysis in zip(batch, results):
+                    out[name] = analysis
+                    progress.participant_done(name)
+                continue
+            for name in batch:
+                try:
+                    out[name] = self.analyze_users([states[name]], [name])[0]
+                except Exception as e:
+                    progress.participant_done(name, error=str(e))
+                    continue
+                progress.participant_done(name)
+        return out
+
+    def analyze_chat(self, open_records, cache=None, progress=None):
+        """Like ``model.predict_chat``: with a ResultCache, only senders not seen before are analyzed.
+
+        Without a model nothing is cached. ``progress`` as in ``analyze_records``.
+        """
+        if cache is None or not self.model_path:
+            return self.analyze_records(open_records(), progress)
+        from model_registry import model_fingerprint
+        from result_cache import TextDigest
+        # Rows belong to the model (a new model drops them, shared with
+        # /v1/predict); the analyzer fingerprint only namespaces them
+        key, namespace = model_fingerprint(self.model_path), 'hybrid-' + self.fingerprint()
+        digests = {name: d.hexdigest() for name, d in accumulate_per_user(open_records(), TextDigest).items()}
+        results, missing = {}, set()
+        for name, digest in digests.items():
+            hit = cache.get(key, digest, namespace)
+            if hit is None:
+                missing.add(name)
+            else:
+                results[name] = Analysis.from_dict(dict(hit, name=name))
+                if progress is not None:
+                    progress.participant_done(name)
+        metrics.incr('result_cache_hits', len(digests) - len(missing))
+        metrics.incr('result_cache_misses', len(missing))
+        if missing:
+            fresh = self.analyze_records((r for r in open_records() if r[1] in missing), progress)
+            for name, analysis in fresh.items():
+                results[name] = analysis
+                cache.put(key, digests[name], analysis.as_dict(), namespace)
+        return {name: results[name] for name in digests if name in results}
+
+
+def fit_blend(analyzer, texts, labels):
+    """Per-trait blend weights from labeled texts (use data the model was not trained on).
+
+    A one-feature-per-source logistic regression per trait on the model
+    log-odds and ``lexicon_feature``, i.e. Platt scaling of the two scores
+    together.
+    """
+    import numpy as np
+    from sklearn.linear_model import LogisticRegression
+    states = []
+    for text in texts:
+        state = analyzer.new_user()
+        state.add(text)
+        states.append(state)
+    raw, _, probas = analyzer.features(states)
+    traits = analyzer.lexicon.traits
+    params = {}
+    for k, trait in enumerate(TRAIT_NAMES):
+        col = traits.index(trait) if trait in traits else None
+        X = np.array([[_logit(p[trait]) if p is not None else 0.0,
+                       lexicon_feature(raw[i, col] if col is not None else 0.0, s.tokens)]
+                      for i, (s, p) in enumerate(zip(states, probas))])
+        y = np.array([row[k] for row in labels])
+        if len(set(y.tolist())) < 2:
+            params[trait] = dict(DEFAULT_BLEND[trait])
+            continue
+        lr = LogisticRegression(C=1.0).fit(X, y)
+        params[trait] = {'model': float(lr.coef_[0][0]), 'lexicon': float(lr.coef_[0][1]),
+                         'bias': float(lr.intercept_[0])}
+    return params
+
+
+def main():
+    import argparse
+    import csv
+    from app import get_analyzer
+    parser = argparse.ArgumentParser(description="Fit the lexicon+model blend weights on a labeled CSV")
+    parser.add_argument('--csv', required=True, help='Labeled CSV (id,text,openness,...) not used to train the model')
+    parser.add_argument('--model', required=True)
+    parser.add_argument('--out', default=None, help='Default: <model>.blend.json, picked up automatically')
+    args = parser.parse_args()
+
+    texts, labels = [], []
+    with open(args.csv, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            texts.append(row['text'])
+            labels.append([int(row[t]) for t in TRAIT_NAMES])
+    params = fit_blend(get_analyzer(args.model, blend=DEFAULT_BLEND), texts, labels)
+    out = args.out or blend_path(args.model)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump({'csv': os.path.basename(args.csv), 'rows': len(texts), 'traits': params}, f, indent=2)
+    for trait, w in params.items():
+        print(f"{trait:<18} model={w['model']:.3f} lexicon={w['lexicon']:.3f} bias={w['bias']:.3f}")
+    print(f"Saved to {out}")
+
+
+if __name__ == '__main__':
+    main()
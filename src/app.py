@@ -1,32 +1,43 @@
 import re
 import os
+import sys
 import argparse
 import csv
-import sys
-from collections import Counter
-import matplotlib.pyplot as plt
-
-# Minimal external libs
-import nltk
-from Sastrawi.Stemmer.StemmerFactory import StemmerFactory
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.multioutput import MultiOutputClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import f1_score, classification_report
-import joblib
-
-from chat_utils import read_chat_file
-from preprocessing import preprocess_text
+from functools import lru_cache
 
-# ------------------ Utilities ------------------
-# Ensure NLTK stopwords available (download if missing)
-try:
-    _ = nltk.corpus.stopwords.words('indonesian')
-except Exception:
-    nltk.download('stopwords')
+# Heavy libraries (nltk, sklearn, matplotlib) are imported inside the
+# functions that need them so `--chat` starts quickly.
+from chat_utils import iter_chat_records, accumulate_per_user
+from preprocessing import BASE_DIR, PREPROCESS_VERSION, preprocess_text, stemmer
+from text_pipeline import TextPipeline
 
-STOPWORDS = set(nltk.corpus.stopwords.words('indonesian'))
+# ------------------ Utilities ------------------
+NLTK_DATA_DIRS = [
+    os.environ.get('NLTK_DATA', ''),
+    os.path.expanduser('~/nltk_data'),
+    os.path.join(sys.prefix, 'nltk_data'),
+    os.path.join(sys.prefix, 'share', 'nltk_data'),
+    os.path.join(sys.prefix, 'lib', 'nltk_data'),
+    '/usr/share/nltk_data', '/usr/local/share/nltk_data',
+    '/usr/lib/nltk_data', '/usr/local/lib/nltk_data',
+]
+
+@lru_cache(maxsize=None)
+def get_stopwords():
+    # Read the NLTK corpus file directly when it is installed; importing nltk
+    # itself costs more than a second.
+    for d in NLTK_DATA_DIRS:
+        path = os.path.join(d, 'corpora', 'stopwords', 'indonesian')
+        if d and os.path.isfile(path):
+            with open(path, encoding='utf-8') as f:
+                return frozenset(line.strip() for line in f if line.strip())
+    # Ensure NLTK stopwords available (download if missing)
+    import nltk
+    try:
+        _ = nltk.corpus.stopwords.words('indonesian')
+    except Exception:
+        nltk.download('stopwords')
+    return frozenset(nltk.corpus.stopwords.words('indonesian'))
 
 # Simple slang normalization (extend as needed)
 SLANG = {
@@ -58,64 +69,88 @@ def apply_negation(tokens, window=3):
     return tokens
 
 # ------------------ Preprocessing ------------------
-factory = StemmerFactory()
-stemmer = factory.create_stemmer()
+# App pipeline: its own slang list + NLTK stopwords, same single-pass scanner.
+# The cached stemmer is shared with preprocessing so both warm one cache.
+@lru_cache(maxsize=None)
+def _pipeline():
+    return TextPipeline(slang=SLANG, stopwords=get_stopwords(), stemmer=stemmer, negations=NEGATIONS)
 
 def preprocess_text(text):
-    # remove urls and mentions quickly
-    text = re.sub(r'http\S+', ' ', text)
-    text = re.sub(r'[@#]\w+', ' ', text)
-    tokens = tokenize(text)
-    tokens = apply_negation(tokens)
-    processed = []
-    for t in tokens:
-        neg = False
-        if t.startswith('NOT_'):
-            neg = True
-            t = t[4:]
-        if not t or t.isdigit():
-            continue
-        stem = stemmer.stem(t)
-        if stem in STOPWORDS:
-            continue
-        if neg:
-            stem = 'NOT_' + stem
-        processed.append(stem)
-    return processed
-
-# ------------------ Lexicon (simple, stemmed) ------------------
-# Note: stem your lexicon words with Sastrawi if you expand it
-RAW_TRAITS = {
-    "openness": ["imajinasi", "ide", "baru", "pikir", "kreatif"],
-    "conscientiousness": ["disiplin", "tepat", "rapi", "teratur", "kerja"],
-    "extraversion": ["teman", "bicara", "senang", "ramai", "ngobrol", "koneksi"],
-    "agreeableness": ["bantu", "baik", "peduli", "teman", "sopan"],
-    "neuroticism": ["cemas", "khawatir", "takut", "gelisah", "panik"]
-}
-
-# Stem the lexicon once at startup
-TRAITS = {}
-for trait, words in RAW_TRAITS.items():
-    stemmed = []
-    for w in words:
-        w_stem = stemmer.stem(w)
-        stemmed.append(w_stem)
-    TRAITS[trait] = stemmed
+    return _pipeline()(text)
+
+@lru_cache(maxsize=1)
+def _pipeline_fingerprint():
+    import hashlib
+    p = _pipeline()
+    state = repr((sorted(SLANG.items()), sorted(p.stopwords), sorted(NEGATIONS), p.window))
+    return hashlib.sha1(state.encode('utf-8')).hexdigest()[:12]
+
+def preprocess_joined(text):
+    # Module-level so worker processes can pickle it by reference
+    return ' '.join(preprocess_text(text))
+
+def preprocess_many(texts, n_jobs=1, corpus_cache=None):
+    """[preprocess_joined(t) for t in texts], optionally on a process pool (same order).
+
+    With a corpus cache only rows not preprocessed before are stemmed.
+    """
+    from corpus_cache import open_corpus_cache, func_name
+    from preprocess_pool import preprocess_parallel, resolve_jobs, warm_stem_cache
+    texts = list(texts)
+    cache = open_corpus_cache(corpus_cache)
+    if cache is not None:
+        # The app pipeline has its own slang table and NLTK stopwords: key on them too
+        name = f"{func_name(preprocess_joined)}:{_pipeline_fingerprint()}"
+        out = cache.get_many(name, texts)
+        missing = [i for i, v in enumerate(out) if v is None]
+        if missing:
+            fresh = preprocess_many([texts[i] for i in missing], n_jobs)
+            cache.put_many(name, [texts[i] for i in missing], fresh)
+            for i, v in zip(missing, fresh):
+                out[i] = v
+        return out
+    if resolve_jobs(n_jobs) > 1:
+        # Stem each distinct word once across the workers before fanning out the texts
+        pipeline = _pipeline()
+        warm_stem_cache((tok for t in texts for tok, _ in pipeline.tagged_tokens(t)
+                         if tok and not tok.isdigit()), n_jobs)
+    return preprocess_parallel(texts, preprocess_joined, n_jobs)
+
+# ------------------ Lexicon (weighted, stemmed) ------------------
+# Kata dan bobot per trait ada di ocean_lexicon.txt (atau env TRAIT_LEXICON_PATH);
+# dikompilasi sekali ke matriks sparse term x trait, lihat trait_lexicon.py
+TRAIT_LEXICON_PATH = os.environ.get('TRAIT_LEXICON_PATH', os.path.join(BASE_DIR, 'ocean_lexicon.txt'))
+
+@lru_cache(maxsize=None)
+def get_lexicon():
+    from trait_lexicon import load_trait_lexicon
+    return load_trait_lexicon(TRAIT_LEXICON_PATH, stem=stemmer.stem, version=PREPROCESS_VERSION)
+
+def lexicon_scores_many(token_lists):
+    """[(raw scores, normalized scores)] per token list, scored in one sparse matmul.
+
+    Each item is an iterable of pipeline tokens or a {token: count} dict.
+    """
+    from trait_lexicon import normalize_scores
+    lexicon = get_lexicon()
+    raw = lexicon.scores_matrix(token_lists)
+    norm = normalize_scores(raw)
+    traits = lexicon.traits
+    return [(dict(zip(traits, r)), dict(zip(traits, n))) for r, n in zip(raw.tolist(), norm.tolist())]
 
 def lexicon_scores(tokens):
-    counts = Counter(tokens)
-    scores = {}
-    for trait, words in TRAITS.items():
-        score = sum(counts[w] for w in words if w in counts)
-        scores[trait] = score
-    # normalize to 0..1 by dividing by max (safe)
-    mx = max(scores.values()) if max(scores.values()) > 0 else 1
-    norm = {k: v / mx for k, v in scores.items()}
-    return scores, norm
+    return lexicon_scores_many([tokens])[0]
 
 # ------------------ Lightweight classifier (optional) ------------------
-def train_classifier(csv_path, model_out='personality_clf.joblib'):
+def train_classifier(csv_path, model_out='personality_clf.joblib', n_jobs=1, corpus_cache=True):
     # CSV expected columns: id,text,openness,conscientiousness,extraversion,agreeableness,neuroticism
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.multioutput import MultiOutputClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import f1_score, classification_report
+    import joblib
+
     texts = []
     labels = []
     with open(csv_path, newline='', encoding='utf-8') as f:
@@ -135,8 +170,9 @@ def train_classifier(csv_path, model_out='personality_clf.joblib'):
         print("No data found in CSV.")
         return
 
-    # Preprocess texts (lightweight, may be slower on CPU but OK for small datasets)
-    processed_texts = [' '.join(preprocess_text(t)) for t in texts]
+    # Preprocess texts; stemming holds the GIL, so n_jobs > 1 spreads it over processes
+    from preprocess_pool import resolve_jobs
+    processed_texts = preprocess_many(texts, n_jobs, corpus_cache)
 
     # TF-IDF vectorizer limited to reduce memory usage
     vec = TfidfVectorizer(max_features=4000, ngram_range=(1,2), lowercase=True)
@@ -146,9 +182,9 @@ def train_classifier(csv_path, model_out='personality_clf.joblib'):
 
     X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.15, random_state=42)
 
-    # Multi-output classifier with light solver; single-threaded to save RAM/CPU
+    # Multi-output classifier with light solver; single-threaded by default to save RAM/CPU
     base = LogisticRegression(solver='liblinear', max_iter=200)
-    clf = MultiOutputClassifier(base, n_jobs=1)
+    clf = MultiOutputClassifier(base, n_jobs=resolve_jobs(n_jobs))
     print("Training classifier (this may take some minutes on CPU)...")
     clf.fit(X_train, y_train)
 
@@ -161,12 +197,16 @@ def train_classifier(csv_path, model_out='personality_clf.joblib'):
         pass
     print(classification_report(y_val, y_pred, target_names=['openness','conscientiousness','extraversion','agreeableness','neuroticism']))
 
-    # Save model and vectorizer
-    joblib.dump({'vec': vec, 'clf': clf}, model_out, compress=3)
+    # Save model and vectorizer, with the preprocessing they were trained on.
+    # Imported by module name, so the pickle points at app.preprocess_joined
+    # also when this file runs as __main__
+    from app import preprocess_joined as trained_preprocess
+    joblib.dump({'vec': vec, 'clf': clf, 'preprocess_func': trained_preprocess}, model_out, compress=3)
     print(f"Model saved to {model_out}")
 
 def predict_with_model(text, model_path):
-    data = joblib.load(model_path)
+    from model_registry import get_model
+    data = get_model(model_path)
     vec = data['vec']
     clf = data['clf']
     proc = ' '.join(preprocess_text(text))
@@ -185,11 +225,45 @@ def interpret_trait(trait):
     }
     return mapping.get(trait, trait)
 
+def plot_scores(name, normalized):
+    import matplotlib.pyplot as plt
+    traits = list(normalized)
+    plt.bar([t.capitalize() for t in traits], [normalized[t] for t in traits])
+    plt.ylim(0, 1)
+    plt.title(f"OCEAN (lexicon) - {name}")
+    plt.show()
+
+# ------------------ Hybrid analyzer ------------------
+def get_analyzer(model_path=None, blend=None):
+    """HybridAnalyzer over this module's pipeline and lexicon (CLI and web app share it)."""
+    from analyzer import HybridAnalyzer
+    return HybridAnalyzer(_pipeline(), get_lexicon(), model_path, blend=blend,
+                          pipeline_fingerprint=_pipeline_fingerprint())
+
 # ------------------ Main script behavior ------------------
 def analyze_chat_file(chat_path, model_path=None, show_plot=False):
-    name, messages, text = read_chat_file(chat_path)
-    tokens = preprocess_text(text)
-    raw_scores, normalized = lexicon_scores(tokens)
+    # One streaming pass over the chat, one tokenization per message: the same
+    # words feed the lexicon counts and, when a model is given, its term counts
+    try:
+        analyzer = get_analyzer(model_path)
+        model_error = None
+    except Exception as e:
+        analyzer, model_error = get_analyzer(), e
+
+    name = None
+    def messages():
+        nonlocal name
+        for _, sender, message in iter_chat_records(chat_path):
+            if sender is None:
+                continue
+            # Ambil nama pengirim dari pesan pertama
+            if name is None:
+                name = sender
+            yield message
+
+    result = analyzer.analyze_messages(messages())
+    name = result.name = name or "Unknown"
+    normalized = result.lexicon_normalized
 
     print(f"\nNama Pengirim: {name}")
     print("\n=== Personality Scores (normalized) ===")
@@ -202,27 +276,73 @@ def analyze_chat_file(chat_path, model_path=None, show_plot=False):
     else:
         print(f"\nInterpretasi: Tidak ditemukan kecenderungan kepribadian yang dominan pada {name}.")
 
+    if show_plot:
+        plot_scores(name, normalized)
+
     if model_path:
         print("\nModel-based prediction:")
-        try:
-            pred = predict_with_model(text, model_path)
-            for k, v in pred.items():
+        if model_error is not None:
+            print("Model prediction failed:", model_error)
+        else:
+            for k, v in result.model_labels.items():
                 print(f"{k}: {v}")
-        except Exception as e:
-            print("Model prediction failed:", e)
+            print("\n=== Skor gabungan (lexicon + model) ===")
+            for k, v in result.scores.items():
+                print(f"{k.capitalize()}: {v:.2f}")
+            if result.dominant:
+                print(f"\nInterpretasi gabungan: {name} cenderung memiliki kepribadian {interpret_trait(result.dominant)}.")
+    return result
+
+def analyze_chat_dir(chat_dir, model_path):
+    # Semua peserta dari semua file chat dianalisis dalam satu batch
+    analyzer = get_analyzer(model_path)
+    keys, states = [], []
+    for fname in sorted(os.listdir(chat_dir)):
+        if not fname.endswith('.txt'):
+            continue
+        user_states = accumulate_per_user(iter_chat_records(os.path.join(chat_dir, fname)), analyzer.new_user)
+        for name, state in user_states.items():
+            keys.append((fname, name))
+            states.append(state)
+    if not states:
+        print(f"No chat messages found in {chat_dir}")
+        return {}
+
+    results = {}
+    for (fname, _), analysis in zip(keys, analyzer.analyze_users(states, [name for _, name in keys])):
+        results.setdefault(fname, {})[analysis.name] = analysis
+
+    for fname, users in results.items():
+        print(f"\n=== {fname} ({len(users)} users) ===")
+        for name, analysis in users.items():
+            print(f"{name}: " + ', '.join(f"{k}={analysis.model_labels.get(k)} ({v:.2f})"
+                                          for k, v in analysis.scores.items()))
+    return results
 
 def main():
     parser = argparse.ArgumentParser(description="Lightweight Personality Detector (CPU-friendly)")
-    parser.add_argument('--chat', help='Path to chat text file', required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--chat', help='Path to chat text file')
+    source.add_argument('--chat_dir', help='Folder of chat exports (.txt) to score in one batch with --use_model')
     parser.add_argument('--train_csv', help='Optional: path to labeled CSV to train model')
     parser.add_argument('--model_out', help='Output path for saved model', default='personality_clf.joblib')
     parser.add_argument('--use_model', help='Optional: path to saved model to run predictions', default=None)
+    parser.add_argument('--plot', action='store_true', help='Show a bar chart of the lexicon scores (needs matplotlib)')
+    parser.add_argument('--n_jobs', type=int, default=1,
+                        help='Worker processes for training preprocessing and per-trait fits (-1 = all cores)')
+    parser.add_argument('--corpus_cache', default=True,
+                        help='Preprocessed-row cache for training (default: CORPUS_CACHE_PATH or cache/corpus.sqlite; "" to disable)')
     args = parser.parse_args()
 
     if args.train_csv:
-        train_classifier(args.train_csv, model_out=args.model_out)
+        train_classifier(args.train_csv, model_out=args.model_out, n_jobs=args.n_jobs, corpus_cache=args.corpus_cache)
 
-    analyze_chat_file(args.chat, model_path=args.use_model)
+    if args.chat_dir:
+        if not args.use_model:
+            parser.error('--chat_dir requires --use_model')
+        analyze_chat_dir(args.chat_dir, args.use_model)
+    else:
+        analyze_chat_file(args.chat, model_path=args.use_model, show_plot=args.plot)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,918 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Hermetic runs: no on-disk caches from earlier runs, no shared metrics state.
+# Set before the project modules below read them at import time.
+for _var in ('RESULT_CACHE_PATH', 'CORPUS_CACHE_PATH', 'STEM_CACHE_PATH'):
+    os.environ[_var] = ''
+# The shipped stem table is part of the tree, so runs always use it
+for _var in ('METRICS_DIR', 'JOB_STATE_DIR', 'STEM_TABLE_PATH'):
+    os.environ.pop(_var, None)
+
+from preprocessing import BASE_DIR
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (participants, messages) per corpus size
+SIZES = {
+    'small': (10, 500),
+    'medium': (40, 5000),
+    'large': (200, 50000),
+}
+TRAIT_NAMES = ['openness', 'conscientiousness', 'extraversion', 'agreeableness', 'neuroticism']
+
+# Chat-style variations applied to the (formal) sentence pools
+_PRONOUNS = [('Saya', 'aku'), ('Saya', 'gw'), ('Saya', 'sy'), ('Saya', 'Saya')]
+_NEGATIONS = [('tidak', 'gak'), ('tidak', 'tdk'), ('tidak', 'nggak'), ('tidak', 'tidak')]
+_TAILS = ['', '', '', ' sih', ' wkwk', ' ya', ' deh', ' 😂', ' hehe', '!!', ' btw', ' http://contoh.com/x']
+
+
+def load_pools():
+    """Sentences of make_data_train.py (with their trait label) and chat_sample.txt messages."""
+    from chat_utils import iter_chat_records
+    from make_data_train import TRAIT_DATA
+
+    labeled = []
+    for k, (_, texts, _) in enumerate(TRAIT_DATA):
+        for i, text in enumerate(texts):
+            labels = [0] * len(TRAIT_DATA)
+            labels[k] = 1 if i < 20 else 0
+            labeled.append((text, labels))
+    samples = [msg for _, sender, msg in iter_chat_records(os.path.join(BASE_DIR, 'data', 'chat_sample.txt'))
+               if sender is not None]
+    return labeled, samples
+
+
+def chatify(rng, text):
+    pronoun, neg = rng.choice(_PRONOUNS), rng.choice(_NEGATIONS)
+    text = re.sub(r'\b%s\b' % pronoun[0], pronoun[1], text)
+    text = re.sub(r'\b%s\b' % neg[0], neg[1], text)
+    if rng.random() < 0.5:
+        text = text.lower()
+    return text + rng.choice(_TAILS)
+
+
+def synthetic_messages(pools, n_messages, seed=42):
+    labeled, samples = pools
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n_messages):
+        if rng.random() < 0.7:
+            text = chatify(rng, rng.choice(labeled)[0])
+        else:
+            text = rng.choice(samples)
+        if rng.random() < 0.1:
+            text += '\n' + chatify(rng, rng.choice(labeled)[0])  # continuation line
+        out.append(text)
+    return out
+
+
+def synthetic_chat(pools, n_participants, n_messages, seed=42):
+    """WhatsApp export lines; every participant gets a share of the messages."""
+    rng = random.Random(seed + 1)
+    names = [f"Peserta {i + 1}" for i in range(n_participants)]
+    lines = []
+    for i, text in enumerate(synthetic_messages(pools, n_messages, seed)):
+        sender = names[i % n_participants] if i < n_participants else rng.choice(names)
+        minute = i % (24 * 60)
+        lines.append(f"[{1 + i // (24 * 60) % 28}/11, {minute // 60:02d}:{minute % 60:02d}] {sender}: {text}")
+    return lines
+
+
+def synthetic_training_csv(pools, path, n_rows, seed=42):
+    import csv
+    labeled = pools[0]
+    rng = random.Random(seed + 2)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name', 'text'] + TRAIT_NAMES)
+        for i in range(n_rows):
+            text, labels = labeled[i % len(labeled)] if i < len(labeled) else rng.choice(labeled)
+            writer.writerow([i + 1, f"User_{i + 1}", chatify(rng, text)] + labels)
+
+
+# ------------------ Replaced code paths ------------------
+# The implementations the current ones replaced, kept as the baseline of the
+# *_legacy / *_sklearn / *_reload benchmarks and for their equivalence checks.
+
+# Single-word slang for the pipeline equivalence check: the old tokenize()
+# could only substitute one token for one token
+REFERENCE_SLANG = {'gk': 'tidak', 'gw': 'saya', 'tdk': 'tidak', 'lo': 'kamu'}
+
+# Inputs that exercise the ordering of the old URL -> mention -> word chain
+EDGE_CASES = [
+    "",
+    "   ",
+    "lihat http://contoh.com/a?b=1 dan @budi #promo ya",
+    "@http://x.com tetap dibuang",
+    "xhttpyhttpz dan abchttp://x.com",
+    "@abchttp://x.com #taghttps://y.id",
+    "HTTP://BESAR.COM tidak dihapus karena huruf besar",
+    "email saya budi@mail.com ok",
+    "@@ganda ##dua a@b#c",
+    "tidak tidak suka makan nasi goreng",
+    "saya tidak mau, bukan karena malas tapi tak sempat",
+    "angka 123 dan 4a5 serta ²³",
+    "İstanbul ÇOK güzel ǅemal",
+    "kata_dengan_underscore dan snake_case",
+    "gak tdk nggak bukan tak",
+    "http",
+    "akhir kalimat http",
+    "gw gk suka, lo tdk mau ikut",
+]
+
+
+def legacy_preprocess_text(text):
+    from preprocessing import STOPWORDS, apply_negation, stemmer
+    text = re.sub(r'http\S+', ' ', text)
+    text = re.sub(r'[@#]\w+', ' ', text)
+    tokens = [REFERENCE_SLANG.get(t, t) for t in re.findall(r'\w+', text.lower())]
+    tokens = apply_negation(tokens)
+    processed = []
+    for t in tokens:
+        neg = False
+        if t.startswith('NOT_'):
+            neg = True
+            t = t[4:]
+        if not t or t.isdigit():
+            continue
+        stem = stemmer.stem(t)
+        if stem in STOPWORDS:
+            continue
+        if neg:
+            stem = 'NOT_' + stem
+        processed.append(stem)
+    return processed
+
+
+def legacy_simple_preprocess(text):
+    text = re.sub(r'http\S+', ' ', text)
+    text = re.sub(r'[@#]\w+', ' ', text)
+    tokens = re.findall(r'\w+', text.lower())
+    basic_stops = {'dan', 'atau', 'di', 'ke', 'dari', 'pada', 'dalam', 'untuk', 'dengan', 'yang', 'ini', 'itu'}
+    filtered = [t for t in tokens if t not in basic_stops and len(t) > 2]
+    return ' '.join(filtered)
+
+
+def legacy_lexicon_scores(tokens, traits):
+    # Old app.lexicon_scores: a Counter per text, Python sums per trait
+    from collections import Counter
+    counts = Counter(tokens)
+    scores = {}
+    for trait, words in traits.items():
+        scores[trait] = sum(counts[w] for w in words if w in counts)
+    mx = max(scores.values()) if max(scores.values()) > 0 else 1
+    return scores, {k: v / mx for k, v in scores.items()}
+
+
+def sklearn_scores(clf, X):
+    # Old scoring: one predict + one predict_proba loop over the estimators
+    import numpy as np
+    pred = clf.predict(X)
+    proba = np.column_stack([p[:, list(e.classes_).index(1)]
+                             for p, e in zip(clf.predict_proba(X), clf.estimators_)])
+    return pred, proba
+
+
+def check_analyzer(analyzer, model_path, pools):
+    """The hybrid analyzer agrees with predict_chat, scores empty participants as
+    no evidence, shares the result cache with /v1/predict and reports jobs per
+    participant."""
+    from app import get_analyzer
+    from chat_utils import iter_chat_records
+    from job_queue import Job
+    from model import predict_batch, predict_chat
+    from result_cache import ResultCache
+    lines = synthetic_chat(pools, 5, 200, seed=3)
+    # One participant has nothing left after preprocessing
+    lines.append('[10/11, 09:00] Diam: ok ya')
+    open_records = lambda: iter_chat_records(lines)
+
+    results = analyzer.analyze_chat(open_records)
+    labels, probas = predict_chat(open_records, model_path, return_proba=True)
+    for name, a in results.items():
+        assert a.model_labels == labels[name], f"model labels differ for {name}"
+        if probas[name] and None not in probas[name].values():
+            assert all(abs(a.model_proba[t] - p) < 1e-6 for t, p in probas[name].items()), name
+
+    empty = results['Diam']
+    assert empty.model_proba is None and not any(empty.model_labels.values()), empty.as_dict()
+    assert not any(empty.labels.values()), empty.as_dict()
+    assert analyzer.analyze_messages(['ok ya']).as_dict()['scores'] is not None
+
+    # Jobs score senders in chunks with the same results; a failing chunk is
+    # retried sender by sender so only the broken one is reported
+    job = Job(None)
+    chunked = analyzer.analyze_records(open_records(), progress=job, chunk=2)
+    assert {n: a.as_dict() for n, a in chunked.items()} == {n: a.as_dict() for n, a in results.items()}
+    assert all(p['done'] and 'error' not in p for p in job.participants.values()), job.participants
+    real = analyzer.analyze_users
+    def flaky(states, names):
+        if 'Diam' in names:
+            raise ValueError('boom')
+        return real(states, names)
+    analyzer.analyze_users = flaky
+    try:
+        job = Job(None)
+        partial = analyzer.analyze_records(open_records(), progress=job, chunk=4)
+    finally:
+        del analyzer.analyze_users
+    assert set(partial) == set(results) - {'Diam'}, sorted(partial)
+    assert job.participants['Diam'].get('error') == 'boom', job.participants['Diam']
+    assert sum('error' in p for p in job.participants.values()) == 1
+
+    # A short text packed with lexicon words must not saturate its score, and
+    # lexicon-only analysis labels nothing without evidence
+    word = next(t for t in analyzer.lexicon.vocabulary if not t.startswith('NOT_'))
+    packed = analyzer.analyze_messages([f'{word} {word} xyz abc'])
+    assert max(packed.scores.values()) < 0.99, packed.as_dict()
+    lexicon_only = get_analyzer().analyze_messages(['pokoknya gitu deh besok lagi'])
+    assert not any(lexicon_only.labels.values()), lexicon_only.as_dict()
+
+    # Analyzer rows and /v1/predict rows of the same model share one cache
+    cache = ResultCache(os.path.join(tempfile.mkdtemp(), 'results.sqlite'))
+    analyzer.analyze_chat(open_records, cache=cache)
+    predict_batch(['aku suka belajar hal baru'], model_path, cache=cache)
+    hits = cache.hits
+    cached = analyzer.analyze_chat(open_records, cache=cache)
+    assert cache.hits - hits == len(results), "analyzer rows were dropped by /v1/predict rows"
+    assert {n: a.as_dict() for n, a in cached.items()} == {n: a.as_dict() for n, a in results.items()}
+    cache.close()
+
+
+def importtime(module):
+    """[(name, depth, cumulative_us)] from ``python -X importtime -c 'import module'``."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=SRC_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cum_us, name = line.split('|', 2)
+        name = name[1:]  # drop the separator space; the rest is nesting indent
+        entries.append((name.strip(), (len(name) - len(name.lstrip())) // 2, int(cum_us)))
+    return entries
+
+
+def measure(func, repeat, warmup=1):
+    """Wall-clock seconds of ``repeat`` calls of ``func`` after ``warmup`` untimed calls."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples, items, unit):
+    samples = sorted(samples)
+    median = statistics.median(samples)
+    return {
+        'unit': unit,
+        'items': items,
+        'repeat': len(samples),
+        'median_s': median,
+        'min_s': samples[0],
+        'max_s': samples[-1],
+        'stdev_s': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'per_item_us': median / items * 1e6,
+        'items_per_s': items / median if median else None,
+        'samples_s': samples,
+    }
+
+
+class Suite(object):
+    """Builds the synthetic corpus once and runs the selected benchmarks on it."""
+
+    def __init__(self, size, seed, repeat, model=None, train_rows=1000, workdir=None, jobs=-1):
+        self.size = size
+        self.seed = seed
+        self.repeat = repeat
+        self.train_rows = train_rows
+        self.jobs = jobs
+        self.workdir = workdir or tempfile.mkdtemp(prefix='personality-bench-')
+        self.n_participants, self.n_messages = SIZES[size]
+        self.pools = load_pools()
+        self.lines = synthetic_chat(self.pools, self.n_participants, self.n_messages, seed)
+        self.chat_path = os.path.join(self.workdir, 'chat.txt')
+        with open(self.chat_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.lines) + '\n')
+        self.messages = synthetic_messages(self.pools, self.n_messages, seed)
+        self.train_csv = os.path.join(self.workdir, 'train.csv')
+        synthetic_training_csv(self.pools, self.train_csv, train_rows, seed)
+        self._model = model
+        self._users = None
+        self._tokens = None
+
+    @property
+    def model(self):
+        # Default: a model trained on the synthetic CSV, so results do not depend
+        # on whichever personality_clf.joblib happens to be checked out
+        if self._model is None:
+            self._model = os.path.join(self.workdir, 'bench_model.joblib')
+            self._train(self._model)
+        return self._model
+
+    @property
+    def users(self):
+        if self._users is None:
+            from chat_utils import parse_chat_per_user
+            self._users = {name: ' '.join(msgs) for name, msgs in parse_chat_per_user(self.chat_path).items()}
+        return self._users
+
+    @property
+    def tokens(self):
+        # Pipeline tokens per message, the input of the lexicon benchmarks
+        if self._tokens is None:
+            from preprocessing import preprocess_text
+            self._tokens = [preprocess_text(m) for m in self.messages]
+        return self._tokens
+
+    def _train(self, model_out, n_jobs=1):
+        from model import train_classifier
+        with contextlib.redirect_stdout(io.StringIO()):
+            train_classifier(self.train_csv, model_out=model_out, n_jobs=n_jobs, corpus_cache=False)
+
+    # Each bench_* returns (samples, items, unit[, info]); info is a dict of
+    # figures that are not timings (accuracy, sizes) stored with the result
+
+    def bench_preprocess_text_cold(self):
+        # Empty stem cache: words missing from the stem table go through Sastrawi once
+        from preprocessing import preprocess_text, stemmer
+
+        def run():
+            stemmer.clear()
+            for m in self.messages:
+                preprocess_text(m)
+        return measure(run, 1, warmup=0), len(self.messages), 'message'
+
+    def bench_preprocess_text_oov(self):
+        # Empty stem cache and no stem table: every distinct word is out of vocabulary
+        from preprocessing import preprocess_text, stemmer
+        table = stemmer.table
+
+        def run():
+            stemmer.clear()
+            for m in self.messages:
+                preprocess_text(m)
+        stemmer.table = {}
+        try:
+            return measure(run, 1, warmup=0), len(self.messages), 'message'
+        finally:
+            stemmer.table = table
+            stemmer.clear()
+
+    def bench_preprocess_text(self):
+        # Warm stem cache, the steady state of a long-running server
+        from preprocessing import preprocess_text
+        run = lambda: [preprocess_text(m) for m in self.messages]
+        return measure(run, self.repeat), len(self.messages), 'message'
+
+    def bench_preprocess_simple(self):
+        from preprocessing import simple_preprocess
+        run = lambda: [simple_preprocess(m) for m in self.messages]
+        return measure(run, self.repeat), len(self.messages), 'message'
+
+    def bench_preprocess_simple_legacy(self):
+        # The old regex chain; its output must match simple_preprocess
+        from preprocessing import simple_preprocess
+        for text in EDGE_CASES + self.messages:
+            assert legacy_simple_preprocess(text) == simple_preprocess(text), text
+        run = lambda: [legacy_simple_preprocess(m) for m in self.messages]
+        return measure(run, self.repeat), len(self.messages), 'message'
+
+    def _reference_pipeline(self):
+        # The compiled pipeline with the single-word slang of the old tokenize()
+        from preprocessing import NEGATIONS, STOPWORDS, stemmer
+        from text_pipeline import TextPipeline
+        return TextPipeline(slang=REFERENCE_SLANG, stopwords=STOPWORDS, stemmer=stemmer, negations=NEGATIONS)
+
+    def bench_pipeline_compiled(self):
+        pipeline = self._reference_pipeline()
+        run = lambda: [pipeline(m) for m in self.messages]
+        return measure(run, self.repeat), len(self.messages), 'message'
+
+    def bench_pipeline_legacy(self):
+        # The old regex chain; its output must match the compiled pipeline
+        pipeline = self._reference_pipeline()
+        for text in EDGE_CASES + self.messages:
+            assert legacy_preprocess_text(text) == pipeline(text), text
+        run = lambda: [legacy_preprocess_text(m) for m in self.messages]
+        return measure(run, self.repeat), len(self.messages), 'message'
+
+    def bench_slang_compile(self):
+        from slang import compile_lexicon
+        source = os.path.join(BASE_DIR, 'slangwords.txt')
+        cache_path = os.path.join(self.workdir, 'slangwords.lexicon')
+        return measure(lambda: compile_lexicon(source, cache_path), self.repeat), 1, 'call'
+
+    def bench_slang_load(self):
+        from slang import compile_lexicon, load_lexicon
+        source = os.path.join(BASE_DIR, 'slangwords.txt')
+        cache_path = os.path.join(self.workdir, 'slangwords.lexicon')
+        compile_lexicon(source, cache_path)
+        return measure(lambda: load_lexicon(source, cache_path), self.repeat), 1, 'call'
+
+    def _stem_tokens(self):
+        from text_pipeline import raw_tokens
+        return [t for m in self.messages for t in raw_tokens(m) if not t.isdigit()]
+
+    def bench_stem_sastrawi(self):
+        # Every token through Sastrawi, no table or cache. This is the set-backed
+        # dictionary; the stock list-backed one costs ~0.1 s per distinct word,
+        # too slow to run at these sizes
+        from stem_cache import create_cached_stemmer
+        tokens, stemmer = self._stem_tokens(), create_cached_stemmer(maxsize=0)
+        stemmer.preload()
+
+        def run():
+            for t in tokens:
+                stemmer.stem(t)
+        return measure(run, 1, warmup=0), len(tokens), 'token'
+
+    def bench_stem_cache_cold(self):
+        # LRU stem cache without the table, starting empty
+        from stem_cache import create_cached_stemmer
+        tokens, cache = self._stem_tokens(), create_cached_stemmer()
+        cache.preload()
+
+        def run():
+            cache.clear()
+            for t in tokens:
+                cache.stem(t)
+        samples = measure(run, 1, warmup=0)
+        return samples, len(tokens), 'token', {'hit_rate': cache.stats()['hit_rate']}
+
+    def bench_stem_cache_warm(self):
+        from stem_cache import create_cached_stemmer
+        tokens, cache = self._stem_tokens(), create_cached_stemmer()
+
+        def run():
+            for t in tokens:
+                cache.stem(t)
+        return measure(run, self.repeat), len(tokens), 'token'
+
+    def bench_stem_cache_reload(self):
+        # Warming the cache from the file a previous process saved
+        from stem_cache import create_cached_stemmer
+        cache = create_cached_stemmer()
+        for t in self._stem_tokens():
+            cache.stem(t)
+        path = os.path.join(self.workdir, 'stem_cache.json')
+        cache.save(path)
+        return measure(lambda: create_cached_stemmer().load(path), self.repeat), cache.stats()['size'], 'entry'
+
+    def bench_stem_table(self):
+        # Shipped stem table in front of an empty cache, as preprocessing uses it
+        from preprocessing import STEM_TABLE_PATH
+        from stem_cache import create_cached_stemmer
+        tokens, cache = self._stem_tokens(), create_cached_stemmer(table_path=STEM_TABLE_PATH)
+        cache.preload()
+
+        def run():
+            cache.clear()
+            for t in tokens:
+                cache.stem(t)
+        samples = measure(run, 1, warmup=0)
+        return samples, len(tokens), 'token', {'oov_rate': cache.stats()['oov_rate']}
+
+    def bench_preprocess_many_cold(self):
+        # app.preprocess_many in one process, stem cache emptied first
+        from app import preprocess_many
+        from preprocessing import stemmer
+
+        def run():
+            stemmer.clear()
+            preprocess_many(self.messages)
+        return measure(run, 1, warmup=0), len(self.messages), 'message'
+
+    def bench_preprocess_many_parallel(self):
+        # Same, on ``jobs`` worker processes; the output must not change
+        from app import preprocess_many
+        from preprocess_pool import resolve_jobs
+        from preprocessing import stemmer
+        expected = preprocess_many(self.messages)
+
+        def run():
+            stemmer.clear()
+            assert preprocess_many(self.messages, n_jobs=self.jobs) == expected
+        return measure(run, 1, warmup=0), len(self.messages), 'message', {'n_jobs': resolve_jobs(self.jobs)}
+
+    def bench_corpus_cache_retrain(self):
+        # Retraining on the same rows in a new process: cold stem cache, warm corpus cache
+        from app import preprocess_many
+        from corpus_cache import CorpusCache
+        from preprocessing import stemmer
+        cache = CorpusCache(os.path.join(self.workdir, 'corpus.sqlite'))
+        expected = preprocess_many(self.messages, corpus_cache=cache)
+
+        def run():
+            stemmer.clear()
+            assert preprocess_many(self.messages, corpus_cache=cache) == expected
+        return measure(run, self.repeat, warmup=0), len(self.messages), 'message'
+
+    def bench_parse_chat_per_user(self):
+        from chat_utils import parse_chat_per_user
+        return measure(lambda: parse_chat_per_user(self.chat_path), self.repeat), len(self.lines), 'line'
+
+    def bench_predict_cold(self):
+        # Model load + first call (vectorizer/scorer compilation) every time
+        from model import predict_with_model
+        from model_registry import _registry
+        model, text = self.model, next(iter(self.users.values()))
+
+        def run():
+            _registry.invalidate()
+            predict_with_model(text, model)
+        return measure(run, self.repeat, warmup=0), 1, 'call'
+
+    def bench_predict_warm(self):
+        from model import predict_with_model
+        model, texts = self.model, list(self.users.values())
+        run = lambda: [predict_with_model(t, model) for t in texts]
+        return measure(run, self.repeat), len(texts), 'participant'
+
+    def bench_predict_reload(self):
+        # Without the model registry: joblib.load on every prediction
+        import joblib
+        from preprocessing import simple_preprocess
+        model, texts = self.model, list(self.users.values())
+
+        def predict(text):
+            data = joblib.load(model)
+            preprocess = data.get('preprocess_func', simple_preprocess)
+            return data['clf'].predict(data['vec'].transform([preprocess(text)]))[0]
+        run = lambda: [predict(t) for t in texts]
+        return measure(run, self.repeat), len(texts), 'participant'
+
+    def _score_input(self):
+        from model_registry import get_model
+        from preprocessing import simple_preprocess
+        data = get_model(self.model)
+        preprocess = data.get('preprocess_func', simple_preprocess)
+        return data['clf'], data['vec'].transform([preprocess(t) for t in self.messages])
+
+    def bench_score_sklearn(self):
+        clf, X = self._score_input()
+        return measure(lambda: sklearn_scores(clf, X), self.repeat), X.shape[0], 'message'
+
+    def bench_score_fused(self):
+        # Fused trait scorer; labels must match and probabilities agree to 1e-9
+        import numpy as np
+        from fused_scorer import FusedLogistic
+        clf, X = self._score_input()
+        scorer = FusedLogistic.from_classifier(clf)
+        pred, proba = sklearn_scores(clf, X)
+        fpred, fproba = scorer.scores(X)
+        assert (pred == fpred).all(), "fused scorer labels differ"
+        diff = float(np.max(np.abs(proba - fproba)))
+        assert diff <= 1e-9, f"fused scorer probabilities differ by {diff}"
+        return measure(lambda: scorer.scores(X), self.repeat), X.shape[0], 'message', {'max_dp': diff}
+
+    def _features(self, mode):
+        # Fit on 80% of the synthetic CSV, report accuracy on the rest and time
+        # transforming the participants' texts
+        import csv
+        import pickle
+        import numpy as np
+        from sklearn.metrics import f1_score
+        from model import make_classifier, make_vectorizer
+        from preprocessing import simple_preprocess
+        with open(self.train_csv, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        texts = [simple_preprocess(r['text']) for r in rows]
+        y = np.array([[int(r[t]) for t in TRAIT_NAMES] for r in rows])
+        order = random.Random(self.seed).sample(range(len(rows)), len(rows))
+        cut = len(rows) * 4 // 5
+        train, test = order[:cut], order[cut:]
+
+        vec = make_vectorizer(mode)
+        X = vec.fit_transform([texts[i] for i in train])
+        clf = make_classifier().fit(X, y[train])
+        pred = clf.predict(vec.transform([texts[i] for i in test]))
+        info = {
+            'features': X.shape[1],
+            'accuracy': float((pred == y[test]).mean()),
+            'macro_f1': float(np.mean([f1_score(y[test][:, j], pred[:, j], zero_division=0)
+                                       for j in range(len(TRAIT_NAMES))])),
+            'vectorizer_kb': len(pickle.dumps(vec)) // 1024,
+        }
+        docs = [simple_preprocess(t) for t in self.users.values()]
+        return measure(lambda: vec.transform(docs), self.repeat), len(docs), 'participant', info
+
+    def bench_features_tfidf(self):
+        return self._features('tfidf')
+
+    def bench_features_hashing(self):
+        return self._features('hashing')
+
+    def _lexicon_input(self):
+        # 200 words of the corpus spread over the traits
+        vocab = sorted({t for tokens in self.tokens for t in tokens if not t.startswith('NOT_')})
+        words = random.Random(self.seed).sample(vocab, min(200, len(vocab)))
+        traits = {trait: words[i::len(TRAIT_NAMES)] for i, trait in enumerate(TRAIT_NAMES)}
+        return traits, [(w, trait, 1.0) for trait, ws in traits.items() for w in ws]
+
+    def bench_lexicon_counter_loop(self):
+        traits, _ = self._lexicon_input()
+        run = lambda: [legacy_lexicon_scores(t, traits) for t in self.tokens]
+        return measure(run, self.repeat), len(self.tokens), 'message'
+
+    def bench_lexicon_sparse(self):
+        from collections import Counter
+        import numpy as np
+        from trait_lexicon import TraitLexicon, normalize_scores
+        traits, entries = self._lexicon_input()
+        # Without negated weights the matrix must reproduce the old counts exactly
+        plain = TraitLexicon.from_entries(entries, traits=TRAIT_NAMES, negated_weight=0)
+        raw = plain.scores_matrix(self.tokens)
+        norm = normalize_scores(raw)
+        for i, tokens in enumerate(self.tokens):
+            old_raw, old_norm = legacy_lexicon_scores(tokens, traits)
+            assert [old_raw[t] for t in TRAIT_NAMES] == raw[i].tolist(), f"raw lexicon scores differ for {tokens}"
+            assert np.allclose([old_norm[t] for t in TRAIT_NAMES], norm[i]), f"normalized scores differ for {tokens}"
+
+        lexicon = TraitLexicon.from_entries(entries, traits=TRAIT_NAMES)
+        # Negated occurrences subtract; {token: count} dicts score like token lists
+        word = traits['openness'][0]
+        assert lexicon.scores_matrix([[word, word, 'NOT_' + word]])[0, 0] == 1.0
+        assert (lexicon.scores_matrix([dict(Counter(self.tokens[0]))]) == lexicon.scores_matrix(self.tokens[:1])).all()
+        run = lambda: normalize_scores(lexicon.scores_matrix(self.tokens))
+        return measure(run, self.repeat), len(self.tokens), 'message'
+
+    def bench_train(self):
+        model_out = os.path.join(self.workdir, 'train_bench.joblib')
+        return measure(lambda: self._train(model_out), max(1, self.repeat // 2), warmup=0), self.train_rows, 'row'
+
+    def bench_train_parallel(self):
+        from preprocess_pool import resolve_jobs
+        model_out = os.path.join(self.workdir, 'train_bench.joblib')
+        samples = measure(lambda: self._train(model_out, self.jobs), max(1, self.repeat // 2), warmup=0)
+        return samples, self.train_rows, 'row', {'n_jobs': resolve_jobs(self.jobs)}
+
+    def _client(self):
+        import web_app
+        web_app.MODEL_PATH = self.model
+        web_app.result_cache = None
+        return web_app.app.test_client()
+
+    def bench_http_analyze_text(self):
+        client = self._client()
+        text = next(iter(self.users.values()))
+
+        def run():
+            response = client.post('/analyze', data={'text': text})
+            assert response.status_code == 200, response.get_data(as_text=True)
+        return measure(run, self.repeat * 5, warmup=2), 1, 'request'
+
+    def bench_http_analyze_file(self):
+        client = self._client()
+        with open(self.chat_path, 'rb') as f:
+            body = f.read()
+
+        def run():
+            response = client.post('/analyze', data={'file': (io.BytesIO(body), 'chat.txt')},
+                                   content_type='multipart/form-data')
+            assert response.status_code == 200, response.get_data(as_text=True)
+        return measure(run, self.repeat), len(self.lines), 'line'
+
+    def bench_http_predict_ndjson(self):
+        client = self._client()
+        ndjson = 'application/x-ndjson'
+
+        def post(body):
+            response = client.post('/v1/predict', data=body, content_type=ndjson)
+            assert response.status_code == 200, response.get_data(as_text=True)
+            return [json.loads(line) for line in response.get_data().splitlines()]
+
+        # A broken line (here not even UTF-8) gets an error line; the stream goes on
+        rows = post(b'{"id": "a", "text": "aku suka belajar"}\n\xff\xfe\n{"id": "b", "text": "gak suka ramai"}\n')
+        assert [r['id'] for r in rows] == ['a', 1, 'b'] and 'error' in rows[1], rows
+
+        body = ''.join(json.dumps({'id': name, 'text': text}) + '\n' for name, text in self.users.items()).encode()
+        run = lambda: post(body)
+        return measure(run, self.repeat * 5, warmup=2), len(self.users), 'document'
+
+    def _analyzer(self):
+        # Checked against predict_chat before any analyzer timing
+        from app import get_analyzer
+        analyzer = get_analyzer(self.model)
+        if not getattr(self, '_analyzer_checked', False):
+            check_analyzer(analyzer, self.model, self.pools)
+            self._analyzer_checked = True
+        return analyzer
+
+    def bench_analyzer_separate(self):
+        # Lexicon and model in their own passes, as before the hybrid analyzer
+        from app import _pipeline, get_lexicon
+        from chat_utils import accumulate_per_user, iter_chat_records
+        from model import accumulator_factory, predict_accumulated
+        self._analyzer()
+
+        def run():
+            accs = accumulate_per_user(iter_chat_records(self.lines), accumulator_factory(self.model))
+            predict_accumulated(list(accs.values()), self.model)
+            messages = {}
+            for _, sender, message in iter_chat_records(self.lines):
+                messages.setdefault(sender, []).append(message)
+            get_lexicon().scores_matrix([_pipeline().tokens_from_messages(m) for m in messages.values()])
+        return measure(run, self.repeat), len(self.lines), 'line'
+
+    def bench_analyzer_hybrid(self):
+        from chat_utils import iter_chat_records
+        analyzer = self._analyzer()
+        run = lambda: analyzer.analyze_records(iter_chat_records(self.lines))
+        return measure(run, self.repeat), len(self.lines), 'line'
+
+    def bench_analyzer_job(self):
+        # As /jobs runs it: participants scored in chunks, with progress
+        from chat_utils import iter_chat_records
+        from job_queue import Job
+        analyzer = self._analyzer()
+        run = lambda: analyzer.analyze_records(iter_chat_records(self.lines), progress=Job(None))
+        return measure(run, self.repeat), len(self.lines), 'line'
+
+    def _import(self, module):
+        # Cold start of a fresh interpreter importing ``module``; info has the
+        # in-process import time and its heaviest direct imports
+        entries = importtime(module)
+        heaviest = sorted(((us, name) for name, depth, us in entries if depth <= 1 and name != module),
+                          reverse=True)[:3]
+        info = {'import_ms': sum(us for _, depth, us in entries if depth == 0) / 1000}
+        info.update((name, us / 1000) for us, name in heaviest)
+
+        def run():
+            subprocess.run([sys.executable, '-c', f'import {module}'], cwd=SRC_DIR, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return measure(run, self.repeat), 1, 'process', info
+
+    def bench_import_app(self):
+        return self._import('app')
+
+    def bench_import_web_app(self):
+        return self._import('web_app')
+
+    def bench_import_model(self):
+        return self._import('model')
+
+    def bench_import_preprocessing(self):
+        return self._import('preprocessing')
+
+    @classmethod
+    def names(cls):
+        return [name[len('bench_'):] for name in vars(cls) if name.startswith('bench_')]
+
+    def run(self, names):
+        results = {}
+        for name in names:
+            out = getattr(self, 'bench_' + name)()
+            results[name] = summarize(*out[:3])
+            if len(out) > 3:
+                results[name]['info'] = out[3]
+            print_result(name, results[name])
+        return results
+
+
+def environment():
+    import numpy
+    import sklearn
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_DIR,
+                                    capture_output=True, text=True, timeout=10).stdout.strip())
+    except (OSError, subprocess.SubprocessError):
+        commit, dirty = None, None
+    return {
+        'git_commit': commit,
+        'git_dirty': dirty,
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def print_result(name, r):
+    print(f"{name:<26} median {r['median_s'] * 1000:10.2f} ms  "
+          f"{r['per_item_us']:12.1f} us/{r['unit']:<12} (min {r['min_s'] * 1000:.2f}, n={r['repeat']})", flush=True)
+    if r.get('info'):
+        print(' ' * 28 + ', '.join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}"
+                                   for k, v in r['info'].items()), flush=True)
+
+
+def compare(base, new, threshold):
+    """Print per-benchmark median ratios; returns the names that got slower than ``threshold``."""
+    for key in ('size', 'seed', 'train_rows', 'jobs'):
+        if base['meta'].get(key) != new['meta'].get(key):
+            print(f"warning: runs differ in {key} ({base['meta'].get(key)} vs {new['meta'].get(key)})")
+    for key in ('cpu_count', 'python', 'sklearn', 'numpy'):
+        if base['meta']['env'].get(key) != new['meta']['env'].get(key):
+            print(f"warning: environment differs in {key} "
+                  f"({base['meta']['env'].get(key)} vs {new['meta']['env'].get(key)})")
+
+    print(f"{'benchmark':<26} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+    regressions = []
+    for name in base['benchmarks']:
+        if name not in new['benchmarks']:
+            continue
+        b, n = base['benchmarks'][name], new['benchmarks'][name]
+        ratio = n['median_s'] / b['median_s']
+        flag = ''
+        # Both the median and the best run must be slower, so one noisy sample does not count
+        if ratio > 1 + threshold and n['min_s'] > b['min_s'] * (1 + threshold):
+            flag = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 / (1 + threshold):
+            flag = 'faster'
+        print(f"{name:<26} {b['median_s'] * 1000:10.2f} {n['median_s'] * 1000:10.2f} {ratio:7.2f}  {flag}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {threshold:.0%}: {', '.join(regressions)}")
+    return regressions
+
+
+def load_run(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite: preprocessing, parsing, prediction, training, HTTP")
+    parser.add_argument('--size', choices=sorted(SIZES), default='small', help='Synthetic chat corpus size')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark')
+    parser.add_argument('--train_rows', type=int, default=1000, help='Rows of the synthetic training CSV')
+    parser.add_argument('--model', default=None, help='Model for predict/http benchmarks (default: trained on the synthetic CSV)')
+    parser.add_argument('--jobs', type=int, default=-1,
+                        help='Worker processes for the *_parallel benchmarks (default -1: all cores)')
+    parser.add_argument('--only', default=None, help='Comma-separated benchmark names or prefixes')
+    parser.add_argument('--list', action='store_true', help='List benchmark names and exit')
+    parser.add_argument('--out', default=None, help='Write results as JSON')
+    parser.add_argument('--compare', nargs='+', metavar='RUN.json',
+                        help='BASE [NEW]: compare two result files, or BASE against a fresh run')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    names = Suite.names()
+    if args.list:
+        print('\n'.join(names))
+        return
+    if args.compare and len(args.compare) > 2:
+        parser.error('--compare takes BASE [NEW]')
+    if args.compare and len(args.compare) == 2:
+        regressions = compare(load_run(args.compare[0]), load_run(args.compare[1]), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    if args.only:
+        prefixes = [p.strip() for p in args.only.split(',') if p.strip()]
+        names = [n for n in names if any(n.startswith(p) for p in prefixes)]
+        if not names:
+            parser.error(f"--only matches no benchmark; choose from {', '.join(Suite.names())}")
+
+    suite = Suite(args.size, args.seed, args.repeat, model=args.model, train_rows=args.train_rows, jobs=args.jobs)
+    print(f"Corpus '{args.size}': {suite.n_participants} participants, {suite.n_messages:,} messages, "
+          f"{args.train_rows:,} training rows (seed {args.seed})")
+    run = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'size': args.size,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'train_rows': args.train_rows,
+            'jobs': args.jobs,
+            'model': args.model,
+            'env': environment(),
+        },
+    }
+    try:
+        run['benchmarks'] = suite.run(names)
+    finally:
+        shutil.rmtree(suite.workdir, ignore_errors=True)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2)
+        print(f"Results written to {args.out}")
+    if args.compare:
+        regressions = compare(load_run(args.compare[0]), run, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
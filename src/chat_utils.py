@@ -1,21 +1,118 @@
+import io
 import re
 
+# Header of a WhatsApp export line, covering the common locale variants:
+#   [10/11, 08:00] Nama: pesan              (iOS, tanpa tahun)
+#   [01/02/24, 10.00.00] Nama: pesan        (iOS, locale Indonesia)
+#   [1/2/24, 9:05:33 PM] Name: message      (iOS, locale US)
+#   01/02/2024, 10.00 - Nama: pesan         (Android)
+#   1/2/24, 9:05 PM - Name: message         (Android, locale US)
+#   01.02.24, 10:00 - Name: message         (locale Eropa)
+# iOS exports may start lines with U+200E and put U+202F before AM/PM.
+_TIME = r'\d{1,2}[.:]\d{2}(?:[.:]\d{2})?(?:[ \u202f]?[AaPp]\.?[Mm]\.?)?'
+_HEADER_RE = re.compile(
+    r'^\u200e?(?:'
+    r'\[(?P<bdate>\d{1,4}[./-]\d{1,2}(?:[./-]\d{2,4})?),? (?P<btime>' + _TIME + r')\] '
+    r'|(?P<date>\d{1,4}[./-]\d{1,2}[./-]\d{2,4}),? (?P<time>' + _TIME + r') - )'
+)
+# Sender names never contain ': '; system messages ("... joined") have no sender
+_SENDER_RE = re.compile(r'\u200e?([^:]+?): ?(.*)$', re.DOTALL)
+
+MAX_MESSAGE_CHARS = 100000
+
+
+def iter_chat_records(source, max_message_chars=MAX_MESSAGE_CHARS):
+    """Stream (timestamp, sender, message) records from a WhatsApp export.
+
+    ``source`` is a path or any iterable of lines (an open file, an upload
+    stream, ``text.splitlines()``). Lines without a header are continuation
+    lines and are appended to the current message with a newline. Text before
+    the first header is yielded with ``timestamp`` and ``sender`` set to
+    None; system messages (header without ``Name:``) are skipped. Only the
+    current record is held in memory, and a message stops growing after
+    ``max_message_chars`` characters.
+    """
+    if isinstance(source, str):
+        with open(source, 'r', encoding='utf-8') as f:
+            yield from iter_chat_records(f, max_message_chars)
+        return
+
+    timestamp = sender = None
+    parts, size = [], 0
+    for line in source:
+        line = line.rstrip('\r\n')
+        m = _HEADER_RE.match(line)
+        if m is None:
+            # Continuation of the current message (or preamble before any header)
+            if (sender is not None or timestamp is None) and size < max_message_chars and line.strip():
+                parts.append(line.strip())
+                size += len(line)
+            continue
+
+        if parts:
+            yield timestamp, sender, '\n'.join(parts)
+        timestamp = f"{m.group('bdate') or m.group('date')} {m.group('btime') or m.group('time')}"
+        parts, size = [], 0
+        body = _SENDER_RE.match(line, m.end())
+        if body is None:
+            sender = None  # system message: drop it and its continuation lines
+            continue
+        sender = body.group(1).strip()
+        message = body.group(2).strip()
+        if message:
+            parts.append(message[:max_message_chars])
+            size = len(parts[0])
+    if parts:
+        yield timestamp, sender, '\n'.join(parts)
+
+
+def iter_stream_lines(stream, encoding='utf-8-sig', errors='replace'):
+    """Decode a binary stream (e.g. an upload) line by line from the start.
+
+    The stream is rewound first, so it can be read again for a second pass,
+    and it is left open afterwards (the decoder is detached, not closed).
+    """
+    stream.seek(0)
+    text = io.TextIOWrapper(stream, encoding=encoding, errors=errors)
+    try:
+        yield from text
+    finally:
+        text.detach()
+
+
+def accumulate_per_user(records, factory):
+    """Feed each record's message to a per-sender accumulator.
+
+    ``factory()`` creates an accumulator with an ``add(message)`` method for
+    every new sender. Returns {sender: accumulator} in first-seen order.
+    """
+    per_user = {}
+    for _, sender, message in records:
+        if sender is None:
+            continue
+        acc = per_user.get(sender)
+        if acc is None:
+            acc = per_user[sender] = factory()
+        acc.add(message)
+    return per_user
+
+
+class _MessageList(list):
+    add = list.append
+
+
 def read_chat_file(chat_path):
-    with open(chat_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    name = None
     messages = []
-    for line in lines:
-        parts = line.split(':', 2)
-        if len(parts) >= 3:
-            messages.append(parts[2].strip())
+    for _, sender, message in iter_chat_records(chat_path):
+        if sender is None:
+            continue
+        # Ambil nama pengirim dari pesan pertama
+        if name is None:
+            name = sender
+        messages.append(message)
     text = ' '.join(messages)
-    # Ambil nama pengirim dari baris pertama
-    if lines:
-        first_line = lines[0]
-        name = first_line.split(']', 1)[-1].split(':', 1)[0].strip()
-    else:
-        name = "Unknown"
-    return name, messages, text
+    return name or "Unknown", messages, text
 
 def read_import_file(import_path):
     data = {}
@@ -31,13 +128,4 @@ def read_import_file(import_path):
     return data  # {nama: [list teks]}
 
 def parse_chat_per_user(chat_path):
-    user_msgs = {}
-    with open(chat_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            m = re.match(r"\[\d{2}/\d{2}/\d{2}, \d{2}\.\d{2}\.\d{2}\] ([^:]+): (.+)", line.strip())
-            if m:
-                name, msg = m.group(1).strip(), m.group(2).strip()
-                if name not in user_msgs:
-                    user_msgs[name] = []
-                user_msgs[name].append(msg)
-    return user_msgs  # {name: [msg, ...]}
\ No newline at end of file
+    return accumulate_per_user(iter_chat_records(chat_path), _MessageList)  # {name: [msg, ...]}
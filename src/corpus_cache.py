@@ -0,0 +1,150 @@
+import os
+import sys
+import sqlite3
+import hashlib
+import threading
+
+from preprocessing import BASE_DIR, PREPROCESS_VERSION
+from preprocess_pool import imap_chunks, preprocess_parallel
+
+# Kosongkan CORPUS_CACHE_PATH untuk menonaktifkan cache korpus saat training
+DEFAULT_CORPUS_CACHE = os.environ.get('CORPUS_CACHE_PATH', os.path.join(BASE_DIR, 'cache', 'corpus.sqlite'))
+
+_BATCH = 500  # keys per SELECT, below SQLite's bound-parameter limit
+
+
+def func_name(func):
+    module = func.__module__
+    if module == '__main__':
+        # Same key whether app.py runs as a script or is imported
+        module = os.path.splitext(os.path.basename(sys.modules['__main__'].__file__))[0]
+    return f"{module}.{func.__qualname__}"
+
+
+class CorpusCache(object):
+    """On-disk cache of preprocessed training rows.
+
+    Rows are keyed by sha1 of (preprocess function, preprocessing version,
+    raw text), so retraining after appending rows to a CSV only
+    preprocesses the new ones, and hyperparameter sweeps that refit
+    vectorizers reuse the same preprocessed text. When a function is stored
+    under a new version, its rows from older versions are dropped.
+    """
+
+    def __init__(self, path, version=PREPROCESS_VERSION):
+        self.path = path
+        self.version = str(version)
+        self.hits = 0
+        self.misses = 0
+        self._purged = set()
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS rows ('
+                         'key TEXT PRIMARY KEY, func TEXT NOT NULL, '
+                         'version TEXT NOT NULL, value TEXT NOT NULL)')
+
+    def _key(self, name, text):
+        h = hashlib.sha1(f"{name}\0{self.version}\0".encode('utf-8'))
+        h.update(text.encode('utf-8'))
+        return h.hexdigest()
+
+    def get_many(self, name, texts):
+        """Cached values for ``texts`` (None where missing), in order."""
+        keys = [self._key(name, t) for t in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _BATCH):
+                batch = keys[i:i + _BATCH]
+                marks = ','.join('?' * len(batch))
+                found.update(self._db.execute(f'SELECT key, value FROM rows WHERE key IN ({marks})', batch))
+        values = [found.get(k) for k in keys]
+        hits = sum(v is not None for v in values)
+        self.hits += hits
+        self.misses += len(values) - hits
+        return values
+
+    def put_many(self, name, texts, values):
+        rows = [(self._key(name, t), name, self.version, v) for t, v in zip(texts, values)]
+        with self._lock:
+            self._db.execute('BEGIN')
+            if name not in self._purged:
+                self._db.execute('DELETE FROM rows WHERE func = ? AND version != ?', (name, self.version))
+                self._purged.add(name)
+            self._db.executemany('INSERT OR REPLACE INTO rows (key, func, version, value) VALUES (?, ?, ?, ?)', rows)
+            self._db.execute('COMMIT')
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM rows').fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': entries,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM rows')
+
+
+def open_corpus_cache(cache=True):
+    """Resolve a ``corpus_cache`` argument.
+
+    True -> the default cache (``CORPUS_CACHE_PATH``), a string -> a cache at
+    that path, a CorpusCache -> itself, False/None/'' -> None (disabled).
+    """
+    if isinstance(cache, CorpusCache):
+        return cache
+    if cache is True:
+        cache = DEFAULT_CORPUS_CACHE
+    return CorpusCache(cache) if cache else None
+
+
+def preprocess_cached(texts, func, cache=None, n_jobs=1):
+    """``[func(t) for t in texts]`` where only rows missing from ``cache`` are computed.
+
+    ``func`` must return a string (the preprocessed text fed to the
+    vectorizer). Misses run through ``preprocess_parallel``.
+    """
+    texts = list(texts)
+    if cache is None:
+        return preprocess_parallel(texts, func, n_jobs)
+    name = func_name(func)
+    values = cache.get_many(name, texts)
+    missing = [i for i, v in enumerate(values) if v is None]
+    if missing:
+        fresh = preprocess_parallel([texts[i] for i in missing], func, n_jobs)
+        cache.put_many(name, [texts[i] for i in missing], fresh)
+        for i, v in zip(missing, fresh):
+            values[i] = v
+    return values
+
+
+def imap_cached(func, chunks, cache=None, n_jobs=1):
+    """Streaming form of ``preprocess_cached`` over ``(texts, payload)`` chunks.
+
+    Yields ``(results, payload)`` in input order; only cache misses are sent
+    to the worker pool.
+    """
+    if cache is None:
+        yield from imap_chunks(func, chunks, n_jobs, extra=True)
+        return
+    name = func_name(func)
+
+    def lookups():
+        for texts, payload in chunks:
+            values = cache.get_many(name, texts)
+            missing = [i for i, v in enumerate(values) if v is None]
+            yield [texts[i] for i in missing], (texts, values, missing, payload)
+
+    for fresh, (texts, values, missing, payload) in imap_chunks(func, lookups(), n_jobs, extra=True):
+        if missing:
+            cache.put_many(name, [texts[i] for i in missing], fresh)
+            for i, v in zip(missing, fresh):
+                values[i] = v
+        yield values, payload
@@ -6,7 +6,8 @@ sys.path.append('.')
 
 from model import predict_with_model
 from preprocessing import simple_preprocess
-import joblib
+from model_registry import get_model
+from hashed_features import HashedVocabulary
 
 print("=== DEBUGGING MODEL PREDICTIONS ===")
 print(f"Current working directory: {os.getcwd()}")
@@ -23,14 +24,18 @@ if not os.path.exists(model_path):
     exit(1)
 
 try:
-    model_data = joblib.load(model_path)
+    model_data = get_model(model_path)
     print(f"✅ Model loaded successfully from {model_path}!")
     print(f"Model keys: {model_data.keys()}")
     
     if 'vec' in model_data:
         vec = model_data['vec']
-        print(f"Vocabulary size: {len(vec.vocabulary_)}")
-        print(f"Sample vocabulary: {list(vec.vocabulary_.items())[:10]}")
+        if isinstance(vec.vocabulary_, HashedVocabulary):
+            # --features hashing: terms map to hash buckets, there is no term list
+            print(f"Hashed features: {len(vec.vocabulary_)} buckets, no vocabulary")
+        else:
+            print(f"Vocabulary size: {len(vec.vocabulary_)}")
+            print(f"Sample vocabulary: {list(vec.vocabulary_.items())[:10]}")
     
 except Exception as e:
     print(f"❌ Error loading model: {e}")
@@ -0,0 +1,165 @@
+import time
+import weakref
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+import metrics
+
+
+_WORD_PATTERNS = (r'\b\w+\b', r'(?u)\b\w+\b', r'(?u)\b\w\w+\b')
+
+
+class TermCounter(object):
+    """Per-model compiled analyzer that folds messages into sparse term counts.
+
+    It reproduces a fitted word ``TfidfVectorizer`` on the text
+    ``' '.join(messages)`` without ever building that string: each message is
+    preprocessed and tokenized on its own, and the last ``max_n - 1`` tokens
+    are carried over so n-grams spanning two messages are still counted.
+    This is exact for token-local preprocessing such as ``simple_preprocess``.
+    """
+
+    def __init__(self, vec, preprocess):
+        if vec.analyzer != 'word':
+            raise ValueError(f"TermCounter needs a word analyzer, got {vec.analyzer!r}")
+        self.vec = vec
+        self.preprocess = preprocess
+        self._preprocessor = vec.build_preprocessor()
+        self._tokenize = vec.build_tokenizer()
+        self._stop_words = vec.get_stop_words()
+        self.min_n, self.max_n = vec.ngram_range
+        self.vocabulary = vec.vocabulary_
+        self.n_features = len(vec.vocabulary_)
+        # Words from text_pipeline.raw_tokens (lowercase \w+ runs, 3+ characters
+        # after simple_filter) come out of these tokenizers unchanged, so they
+        # can be folded without re-joining and re-tokenizing them
+        self.accepts_tokens = (getattr(vec, 'preprocessor', None) is None
+                               and getattr(vec, 'tokenizer', None) is None
+                               and getattr(vec, 'strip_accents', None) is None
+                               and getattr(vec, 'token_pattern', None) in _WORD_PATTERNS)
+
+    def accumulator(self):
+        # Decided once per user, so the untraced per-message path has no checks
+        trace = metrics.current()
+        if trace is None:
+            return TermAccumulator(self)
+        return TracedTermAccumulator(self, trace)
+
+    def _fold(self, acc, processed):
+        # Returns the number of tokens counted
+        if not processed.strip():
+            return 0
+        acc.empty = False
+        return self._fold_tokens(acc, self._tokenize(self._preprocessor(processed)))
+
+    def fold_tokens(self, acc, tokens):
+        """Like ``acc.add(message)`` for a message already split into ``simple_filter``
+        words (only when ``accepts_tokens``); returns the number of tokens counted."""
+        if not tokens:
+            return 0
+        acc.empty = False
+        return self._fold_tokens(acc, tokens)
+
+    def _fold_tokens(self, acc, tokens):
+        if self._stop_words is not None:
+            tokens = [t for t in tokens if t not in self._stop_words]
+        if not tokens:
+            return 0
+        acc.n_tokens += len(tokens)
+
+        vocab = self.vocabulary
+        counts = acc.counts
+        seq = acc.tail + tokens
+        start = len(acc.tail)
+        for n in range(self.min_n, self.max_n + 1):
+            # Only n-grams ending in the new message; earlier ones were counted
+            for end in range(max(start, n - 1), len(seq)):
+                term = seq[end] if n == 1 else ' '.join(seq[end - n + 1:end + 1])
+                col = vocab.get(term)
+                if col is not None:
+                    counts[col] = counts.get(col, 0) + 1
+        if self.max_n > 1:
+            acc.tail = seq[-(self.max_n - 1):]
+        return len(tokens)
+
+    def counts_matrix(self, accumulators):
+        indptr, indices, data = [0], [], []
+        for acc in accumulators:
+            indices.extend(acc.counts)
+            data.extend(acc.counts.values())
+            indptr.append(len(indices))
+        X = sp.csr_matrix((np.asarray(data, dtype=np.float64),
+                           np.asarray(indices, dtype=np.int32),
+                           np.asarray(indptr, dtype=np.int32)),
+                          shape=(len(accumulators), self.n_features))
+        X.sort_indices()
+        return X
+
+    def transform(self, accumulators):
+        """TF-IDF rows for the accumulators, as ``vec.transform`` would give."""
+        X = self.counts_matrix(accumulators)
+        vec = self.vec
+        if vec.binary:
+            X.data.fill(1.0)
+        if vec.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1.0
+        if vec.use_idf:
+            X.data *= vec.idf_[X.indices]
+        if vec.norm is not None:
+            X = normalize(X, norm=vec.norm, copy=False)
+        return X
+
+
+class TermAccumulator(object):
+    """One user's running term counts. Memory grows with distinct terms, not chat length."""
+
+    __slots__ = ('counter', 'counts', 'tail', 'n_tokens', 'empty')
+
+    def __init__(self, counter):
+        self.counter = counter
+        self.counts = {}  # column -> raw count
+        self.tail = []
+        self.n_tokens = 0
+        self.empty = True
+
+    def add(self, message):
+        counter = self.counter
+        counter._fold(self, counter.preprocess(message))
+
+
+class TracedTermAccumulator(TermAccumulator):
+    """TermAccumulator that adds preprocess/vectorize time and token counts to a metrics trace."""
+
+    __slots__ = ('trace',)
+
+    def __init__(self, counter, trace):
+        TermAccumulator.__init__(self, counter)
+        self.trace = trace
+
+    def add(self, message):
+        # Per message, so plain dict updates rather than timer objects
+        counter = self.counter
+        clock = time.perf_counter
+        t0 = clock()
+        processed = counter.preprocess(message)
+        t1 = clock()
+        n = counter._fold(self, processed)
+        stages, counts = self.trace.stages, self.trace.counts
+        stages['preprocess'] = stages.get('preprocess', 0.0) + (t1 - t0)
+        stages['vectorize'] = stages.get('vectorize', 0.0) + (clock() - t1)
+        counts['messages'] = counts.get('messages', 0) + 1
+        counts['tokens'] = counts.get('tokens', 0) + n
+
+
+_counters = weakref.WeakKeyDictionary()
+
+
+def term_counter(vec, preprocess):
+    """TermCounter for a fitted vectorizer, built once per loaded model."""
+    counter = _counters.get(vec)
+    if counter is None or counter.preprocess is not preprocess:
+        counter = _counters[vec] = TermCounter(vec, preprocess)
+    return counter
@@ -0,0 +1,359 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import importlib
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+from hashed_features import HashedVocabulary
+
+FORMAT = 'personality-flat'
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+# Only preprocessing functions from these modules may be named by a manifest
+TRUSTED_PREPROCESS_MODULES = {'preprocessing', 'app'}
+
+
+def _preprocess_name(func):
+    if func is None:
+        return None
+    if func.__module__ not in TRUSTED_PREPROCESS_MODULES:
+        raise ValueError(f"cannot export preprocess_func from module {func.__module__!r}")
+    return f"{func.__module__}:{func.__qualname__}"
+
+
+def _resolve_preprocess(name):
+    if name is None:
+        return None
+    module, _, attr = name.partition(':')
+    if module not in TRUSTED_PREPROCESS_MODULES:
+        raise ValueError(f"untrusted preprocess_func {name!r} in manifest")
+    return getattr(importlib.import_module(module), attr)
+
+
+def _write_array(out_dir, name, array, dtype):
+    # Content-addressed file names: a new export never overwrites files an
+    # existing manifest (or a running process' mmap) still points at
+    raw = np.ascontiguousarray(array, dtype=dtype).tobytes()
+    digest = hashlib.sha1(raw).hexdigest()
+    fname = f"{name}.{digest[:12]}.bin"
+    path = os.path.join(out_dir, fname)
+    if not os.path.exists(path):
+        with open(path + '.tmp', 'wb') as f:
+            f.write(raw)
+        os.replace(path + '.tmp', path)
+    return {'file': fname, 'dtype': np.dtype(dtype).str, 'shape': list(np.shape(array)), 'sha1': digest}
+
+
+def export_flat(data, out_dir):
+    """Write a model dict (as saved by ``train_classifier``) as a flat artifact.
+
+    Layout of ``out_dir``:
+
+    - ``manifest.json``: vectorizer settings, trait names, class labels,
+      the preprocess function by name, and the array files below
+    - vocabulary: UTF-8 terms, one per line, in column order (sklearn
+      assigns columns in sorted term order, so this is a sorted table);
+      hashed-feature models have none, a term's column is its hash bucket
+    - ``idf`` (V,), ``coef`` (n_traits, V) and ``intercept`` (n_traits,) as
+      raw little-endian float32
+
+    The manifest is replaced last, so readers see either the old or the new
+    artifact. Loading it executes no pickle. ``out_dir`` must be new, empty
+    or an earlier export; afterwards only the files the old manifest listed
+    and the new one no longer uses are removed.
+    """
+    vec, clf = data['vec'], data['clf']
+    if vec.analyzer != 'word' or vec.preprocessor is not None or vec.tokenizer is not None:
+        raise ValueError("only word analyzers with the default preprocessor/tokenizer can be exported")
+    if vec.strip_accents is not None:
+        raise ValueError("strip_accents is not supported by the flat format")
+
+    estimators = clf.estimators_
+    classes = [[int(c) for c in est.classes_] for est in estimators]
+    if any(c != [0, 1] for c in classes):
+        raise ValueError(f"flat format needs binary 0/1 estimators, got classes {classes}")
+
+    previous = _previous_manifest(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    if isinstance(vec.vocabulary_, HashedVocabulary):
+        # Hashed features: the column is computed from the term, no table to store
+        features = 'hashing'
+        n_features = vec.n_features
+        vocabulary = {'hashing': True}
+        vocab_file = None
+    else:
+        features = 'tfidf'
+        terms = sorted(vec.vocabulary_, key=vec.vocabulary_.get)
+        if any('\n' in t for t in terms):
+            raise ValueError("vocabulary terms may not contain newlines")
+        n_features = len(terms)
+        vocab_raw = '\n'.join(terms).encode('utf-8')
+        vocab_sha1 = hashlib.sha1(vocab_raw).hexdigest()
+        vocab_file = f"vocab.{vocab_sha1[:12]}.txt"
+        with open(os.path.join(out_dir, vocab_file + '.tmp'), 'wb') as f:
+            f.write(vocab_raw)
+        os.replace(os.path.join(out_dir, vocab_file + '.tmp'), os.path.join(out_dir, vocab_file))
+        vocabulary = {'file': vocab_file, 'sha1': vocab_sha1}
+
+    stop_words = vec.get_stop_words()
+    manifest = {
+        'format': FORMAT,
+        'version': FORMAT_VERSION,
+        'trait_names': list(data.get('trait_names') or
+                            ['openness', 'conscientiousness', 'extraversion', 'agreeableness', 'neuroticism']),
+        'classes': classes,
+        'preprocess_func': _preprocess_name(data.get('preprocess_func')),
+        'features': features,
+        'vectorizer': {
+            'n_features': n_features,
+            'lowercase': bool(vec.lowercase),
+            'token_pattern': vec.token_pattern,
+            'ngram_range': list(vec.ngram_range),
+            'stop_words': sorted(stop_words) if stop_words else None,
+            'binary': bool(vec.binary),
+            'sublinear_tf': bool(vec.sublinear_tf),
+            'use_idf': bool(vec.use_idf),
+            'norm': vec.norm,
+        },
+        'vocabulary': vocabulary,
+        'arrays': {
+            'idf': _write_array(out_dir, 'idf', vec.idf_ if vec.use_idf else np.ones(n_features), '<f4'),
+            'coef': _write_array(out_dir, 'coef', np.vstack([est.coef_[0] for est in estimators]), '<f4'),
+            'intercept': _write_array(out_dir, 'intercept', [est.intercept_[0] for est in estimators], '<f4'),
+        },
+    }
+    manifest['content_sha1'] = hashlib.sha1(json.dumps(manifest, sort_keys=True).encode('utf-8')).hexdigest()
+
+    tmp = os.path.join(out_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+
+    # Drop files of the previous export that the new manifest no longer uses
+    if previous is not None:
+        for fname in _manifest_files(previous) - _manifest_files(manifest):
+            try:
+                os.remove(os.path.join(out_dir, fname))
+            except OSError:
+                pass
+    return manifest
+
+
+def _manifest_files(manifest):
+    files = {a['file'] for a in manifest.get('arrays', {}).values()}
+    vocab_file = manifest.get('vocabulary', {}).get('file')
+    if vocab_file:
+        files.add(vocab_file)
+    # Only names a previous export could have written, never anything else in the folder
+    return {f for f in files if os.path.basename(f) == f and
+            re.fullmatch(r'(vocab\.[0-9a-f]{12}\.txt|(idf|coef|intercept)\.[0-9a-f]{12}\.bin)', f)}
+
+
+def _previous_manifest(out_dir):
+    """The manifest already in ``out_dir``, None for a new or empty folder; ValueError for any other folder."""
+    if not os.path.isdir(out_dir) or not os.listdir(out_dir):
+        return None
+    try:
+        with open(os.path.join(out_dir, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    if not isinstance(manifest, dict) or manifest.get('format') != FORMAT:
+        raise ValueError(f"{out_dir!r} is not empty and holds no flat model; export to a new folder")
+    return manifest
+
+
+class FlatVocabulary(object):
+    """Term -> column lookup over the artifact's sorted string table.
+
+    The table is only read, and the lookup dict built, on first use, so
+    loading a model does not pay for it until something is vectorized.
+    """
+
+    def __init__(self, path, n_features):
+        self._path = path
+        self._n = n_features
+        self._index = None
+
+    def _lookup(self):
+        if self._index is None:
+            with open(self._path, 'rb') as f:
+                raw = f.read().decode('utf-8')
+            terms = raw.split('\n') if raw else []
+            self._index = dict(zip(terms, range(len(terms))))
+        return self._index
+
+    def get(self, term, default=None):
+        return self._lookup().get(term, default)
+
+    def __getitem__(self, term):
+        return self._lookup()[term]
+
+    def __contains__(self, term):
+        return term in self._lookup()
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        return iter(self._lookup())
+
+    def items(self):
+        return self._lookup().items()
+
+
+class FlatVectorizer(object):
+    """Inference-only stand-in for a fitted word ``TfidfVectorizer``.
+
+    It exposes the attributes ``TermCounter`` reads (``build_tokenizer``,
+    ``vocabulary_``, ``idf_``, ...) so accumulators work unchanged.
+    """
+
+    analyzer = 'word'
+
+    def __init__(self, params, vocabulary, idf):
+        self.lowercase = params['lowercase']
+        self.token_pattern = params['token_pattern']
+        self.ngram_range = tuple(params['ngram_range'])
+        self.stop_words = frozenset(params['stop_words']) if params['stop_words'] else None
+        self.binary = params['binary']
+        self.sublinear_tf = params['sublinear_tf']
+        self.use_idf = params['use_idf']
+        self.norm = params['norm']
+        self.vocabulary_ = vocabulary
+        self.idf_ = idf
+        self._pattern = re.compile(self.token_pattern)
+
+    def build_preprocessor(self):
+        return str.lower if self.lowercase else (lambda doc: doc)
+
+    def build_tokenizer(self):
+        # Same rule as sklearn: a pattern with one group yields that group
+        if self._pattern.groups == 1:
+            return lambda doc: [m.group(1) for m in self._pattern.finditer(doc)]
+        return self._pattern.findall
+
+    def get_stop_words(self):
+        return self.stop_words
+
+    def get_feature_names_out(self):
+        return np.asarray(sorted(self.vocabulary_, key=self.vocabulary_.get), dtype=object)
+
+    def _count(self, doc, preprocess, tokenize, vocab, min_n, max_n):
+        tokens = tokenize(preprocess(doc))
+        if self.stop_words is not None:
+            tokens = [t for t in tokens if t not in self.stop_words]
+        counts = {}
+        for n in range(min_n, max_n + 1):
+            for i in range(len(tokens) - n + 1):
+                term = tokens[i] if n == 1 else ' '.join(tokens[i:i + n])
+                col = vocab.get(term)
+                if col is not None:
+                    counts[col] = counts.get(col, 0) + 1
+        return counts
+
+    def transform(self, raw_documents):
+        preprocess, tokenize = self.build_preprocessor(), self.build_tokenizer()
+        vocab = self.vocabulary_
+        min_n, max_n = self.ngram_range
+        indptr, indices, data = [0], [], []
+        for doc in raw_documents:
+            counts = self._count(doc, preprocess, tokenize, vocab, min_n, max_n)
+            indices.extend(counts)
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        X = sp.csr_matrix((np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int32),
+                           np.asarray(indptr, dtype=np.int32)),
+                          shape=(len(indptr) - 1, len(vocab)))
+        X.sort_indices()
+        if self.binary:
+            X.data.fill(1.0)
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1.0
+        if self.use_idf:
+            X.data *= self.idf_[X.indices]
+        if self.norm is not None:
+            X = normalize(X, norm=self.norm, copy=False)
+        return X
+
+
+class _Classes(object):
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+
+class FlatClassifier(object):
+    """Binary logistic models for all traits, scored from one coefficient matrix."""
+
+    def __init__(self, coef, intercept, classes):
+        self.coef_ = coef            # (n_traits, V) float32, memory-mapped
+        self.intercept_ = intercept  # (n_traits,)
+        self.estimators_ = [_Classes(c) for c in classes]
+
+    def decision_function(self, X):
+        return np.asarray(X @ self.coef_.T, dtype=np.float64) + self.intercept_
+
+    def predict(self, X):
+        return (self.decision_function(X) > 0).astype(np.int64)
+
+    def predict_proba(self, X):
+        p = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return [np.column_stack([1.0 - p[:, j], p[:, j]]) for j in range(p.shape[1])]
+
+
+def load_flat(path):
+    """Load a flat artifact as a model dict like the joblib one.
+
+    Arrays are ``np.memmap``s, so processes loading the same artifact share
+    its pages through the OS page cache.
+    """
+    with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT or manifest.get('version') != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported artifact format {manifest.get('format')!r} v{manifest.get('version')}")
+
+    def array(name):
+        spec = manifest['arrays'][name]
+        return np.memmap(os.path.join(path, spec['file']), dtype=np.dtype(spec['dtype']),
+                         mode='r', shape=tuple(spec['shape']))
+
+    params = manifest['vectorizer']
+    if manifest['vocabulary'].get('hashing'):
+        vocabulary = HashedVocabulary(params['n_features'])
+    else:
+        vocabulary = FlatVocabulary(os.path.join(path, manifest['vocabulary']['file']), params['n_features'])
+    data = {
+        'vec': FlatVectorizer(params, vocabulary, array('idf')),
+        'clf': FlatClassifier(array('coef'), array('intercept'), manifest['classes']),
+        'trait_names': manifest['trait_names'],
+        'features': manifest.get('features', 'tfidf'),
+        'manifest': manifest,
+    }
+    preprocess = _resolve_preprocess(manifest['preprocess_func'])
+    if preprocess is not None:
+        data['preprocess_func'] = preprocess
+    return data
+
+
+def main():
+    # python flat_model.py personality_clf.joblib personality_clf.flat
+    import joblib
+    if len(sys.argv) != 3:
+        print("usage: python flat_model.py <model.joblib> <out_dir>")
+        sys.exit(2)
+    try:
+        manifest = export_flat(joblib.load(sys.argv[1]), sys.argv[2])
+    except ValueError as e:
+        print(f"Export failed: {e}")
+        sys.exit(1)
+    print(f"Flat model written to {sys.argv[2]} ({manifest['vectorizer']['n_features']} features)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import weakref
+
+import numpy as np
+from scipy.special import expit
+
+
+class FusedLogistic(object):
+    """All trait logistic regressions scored as one linear map.
+
+    The per-trait coefficient vectors are stacked into a (V, n_traits)
+    matrix, so one sparse-dense matmul gives every logit for every row,
+    instead of ``MultiOutputClassifier`` looping over its estimators twice
+    (``predict`` and ``predict_proba``). Labels and P(label=1) match
+    sklearn's binary ``LogisticRegression`` (``decision > 0`` and
+    ``expit(decision)``) up to float rounding: within 1e-12 for the joblib
+    model, about 1e-7 for float32 flat artifacts.
+    """
+
+    def __init__(self, coef, intercept, classes):
+        self.W = np.ascontiguousarray(np.asarray(coef, dtype=np.float64).T)  # (V, n_traits)
+        self.b = np.asarray(intercept, dtype=np.float64).reshape(-1)
+        classes = [list(c) for c in classes]
+        if any(len(c) != 2 for c in classes):
+            raise ValueError(f"fused scoring needs binary estimators, got classes {classes}")
+        # Label for a negative / positive logit, per trait
+        self.neg_label = np.array([c[0] for c in classes])
+        self.pos_label = np.array([c[1] for c in classes])
+        # P(label=1) is the positive-side probability when classes_[1] == 1,
+        # its complement when classes_[0] == 1, and 0 if 1 is not a class
+        self._proba_sign = np.array([1 if c[1] == 1 else -1 if c[0] == 1 else 0 for c in classes])
+
+    @classmethod
+    def from_classifier(cls, clf):
+        """Build from a fitted ``MultiOutputClassifier`` of linear models or a ``FlatClassifier``."""
+        coef = getattr(clf, 'coef_', None)
+        if coef is not None and np.ndim(coef) == 2:
+            return cls(coef, clf.intercept_, [e.classes_ for e in clf.estimators_])
+        estimators = clf.estimators_
+        for est in estimators:
+            if getattr(est, 'coef_', None) is None or est.coef_.shape[0] != 1:
+                raise ValueError(f"cannot fuse estimator {type(est).__name__}")
+        return cls(np.vstack([est.coef_ for est in estimators]),
+                   np.concatenate([est.intercept_ for est in estimators]),
+                   [est.classes_ for est in estimators])
+
+    def decision_function(self, X):
+        return np.asarray(X @ self.W) + self.b
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) > 0, self.pos_label, self.neg_label)
+
+    def predict_proba(self, X):
+        """(n_rows, n_traits) array of P(label=1)."""
+        return self.scores(X)[1]
+
+    def scores(self, X):
+        """Labels and P(label=1), both (n_rows, n_traits), from a single matmul."""
+        z = self.decision_function(X)
+        labels = np.where(z > 0, self.pos_label, self.neg_label)
+        proba = expit(z * np.where(self._proba_sign == 0, 1, self._proba_sign))
+        proba[:, self._proba_sign == 0] = 0.0
+        return labels, proba
+
+
+_scorers = weakref.WeakKeyDictionary()
+
+
+def fused_scorer(clf):
+    """FusedLogistic for a loaded classifier, built once; None if it cannot be fused."""
+    try:
+        return _scorers[clf]
+    except KeyError:
+        pass
+    try:
+        scorer = FusedLogistic.from_classifier(clf)
+    except (AttributeError, ValueError):
+        scorer = None
+    _scorers[clf] = scorer
+    return scorer
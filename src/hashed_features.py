@@ -0,0 +1,158 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.utils import murmurhash3_32
+
+DEFAULT_N_FEATURES = 2 ** 18
+
+
+def hashed_column(term, n_features):
+    # Same bucket sklearn's FeatureHasher assigns (murmurhash3 of the UTF-8 term)
+    h = murmurhash3_32(term, seed=0)
+    if h == -2 ** 31:
+        return (2 ** 31 - 1 - (n_features - 1)) % n_features
+    return abs(h) % n_features
+
+
+class HashedVocabulary(object):
+    """Stand-in for ``vocabulary_``: every term maps to its hash bucket.
+
+    Lets ``TermCounter`` (and anything else doing ``vocab.get(term)``) work
+    with hashed features without storing a term table.
+    """
+
+    def __init__(self, n_features):
+        self.n_features = n_features
+
+    def get(self, term, default=None):
+        return hashed_column(term, self.n_features)
+
+    def __getitem__(self, term):
+        return hashed_column(term, self.n_features)
+
+    def __contains__(self, term):
+        return True
+
+    def __len__(self):
+        return self.n_features
+
+
+class HashedTfidf(object):
+    """TF-IDF over hashed uni/bigrams, with the IDF learned in a streaming pass.
+
+    Terms go to ``n_features`` buckets through sklearn's ``HashingVectorizer``
+    (no vocabulary dict, no ``stop_words_``), so transform memory does not
+    depend on the corpus. Document frequencies are summed chunk by chunk in
+    ``partial_fit``; ``idf_`` uses the same smoothed formula as
+    ``TfidfVectorizer`` and is 0 for empty buckets. The attributes mirror a fitted ``TfidfVectorizer``
+    closely enough for ``TermCounter`` and the flat exporter.
+    """
+
+    analyzer = 'word'
+    preprocessor = None
+    tokenizer = None
+    strip_accents = None
+    binary = False
+    use_idf = True
+
+    def __init__(self, n_features=DEFAULT_N_FEATURES, ngram_range=(1, 2), lowercase=True,
+                 token_pattern=r'\b\w+\b', stop_words=None, sublinear_tf=True, norm='l2'):
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.token_pattern = token_pattern
+        self.stop_words = stop_words
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+        self.n_docs_ = 0
+        self.df_ = np.zeros(n_features, dtype=np.int64)
+        self.idf_ = None
+        self.vocabulary_ = HashedVocabulary(n_features)
+
+    def _hasher(self):
+        return HashingVectorizer(n_features=self.n_features, ngram_range=self.ngram_range,
+                                 lowercase=self.lowercase, token_pattern=self.token_pattern,
+                                 stop_words=self.stop_words, alternate_sign=False, norm=None)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_hv', None)
+        return state
+
+    @property
+    def hasher(self):
+        hv = self.__dict__.get('_hv')
+        if hv is None:
+            hv = self._hv = self._hasher()
+        return hv
+
+    def build_preprocessor(self):
+        return self.hasher.build_preprocessor()
+
+    def build_tokenizer(self):
+        return self.hasher.build_tokenizer()
+
+    def get_stop_words(self):
+        return self.hasher.get_stop_words()
+
+    def add_counts(self, X):
+        """Add document frequencies from a chunk of raw hashed counts."""
+        self.df_ += np.bincount(X.indices, minlength=self.n_features)
+        self.n_docs_ += X.shape[0]
+        self.idf_ = np.log((1.0 + self.n_docs_) / (1.0 + self.df_)) + 1.0
+        # Buckets never seen in training act like out-of-vocabulary terms:
+        # dropped, instead of getting the largest idf and swamping the norm
+        self.idf_[self.df_ == 0] = 0.0
+
+    def _reset(self):
+        self.n_docs_ = 0
+        self.df_[:] = 0
+        self.idf_ = None
+
+    def weight_counts(self, X):
+        """TF-IDF weight raw hashed counts (as from ``hasher.transform``) in place."""
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1.0
+        X.data *= self.idf_[X.indices]
+        X.eliminate_zeros()
+        if self.norm is not None:
+            X = normalize(X, norm=self.norm, copy=False)
+        return X
+
+    def partial_fit(self, docs):
+        """Add document frequencies of a chunk of documents."""
+        docs = list(docs)
+        if docs:
+            self.add_counts(self.hasher.transform(docs))
+        return self
+
+    def fit(self, docs, chunk_size=10000):
+        self._reset()
+        chunk = []
+        for doc in docs:
+            chunk.append(doc)
+            if len(chunk) >= chunk_size:
+                self.partial_fit(chunk)
+                chunk = []
+        self.partial_fit(chunk)
+        if self.idf_ is None:
+            raise ValueError("HashedTfidf.fit needs at least one document")
+        return self
+
+    def transform(self, docs):
+        docs = list(docs)
+        if not docs:
+            return sp.csr_matrix((0, self.n_features))
+        return self.weight_counts(self.hasher.transform(docs))
+
+    def fit_transform(self, docs):
+        # One hashing pass: the counts give the df and are then weighted in place
+        docs = list(docs)
+        if not docs:
+            raise ValueError("HashedTfidf.fit needs at least one document")
+        self._reset()
+        X = self.hasher.transform(docs)
+        self.add_counts(X)
+        return self.weight_counts(X)
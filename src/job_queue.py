@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+import metrics
+
+
+class QueueFull(Exception):
+    """Raised by ``JobQueue.submit`` when ``max_pending`` jobs are already waiting."""
+
+
+class Job(object):
+    """One background analysis: status, per-participant progress and the result."""
+
+    def __init__(self, func, cleanup=None):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.cleanup = cleanup
+        self.status = 'queued'  # queued -> running -> done | error
+        self.stage = None
+        self.participants = {}  # name -> {'messages': n, 'done': bool[, 'error': str]}
+        self.results = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.on_change = None  # set by JobQueue, called (throttled) as progress is made
+        self._published = 0
+        self._lock = threading.Lock()
+
+    def count_message(self, sender):
+        with self._lock:
+            entry = self.participants.get(sender)
+            if entry is None:
+                entry = self.participants[sender] = {'messages': 0, 'done': False}
+            entry['messages'] += 1
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def participant_done(self, sender, error=None):
+        """Mark one participant scored, or failed with ``error`` (the rest of the job goes on)."""
+        with self._lock:
+            entry = self.participants.setdefault(sender, {'messages': 0, 'done': False})
+            entry['done'] = True
+            if error is not None:
+                entry['error'] = error
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def track(self, records):
+        """Pass ``iter_chat_records`` output through, counting messages per sender."""
+        self.stage = 'reading'
+        for record in records:
+            if record[1] is not None:
+                self.count_message(record[1])
+            yield record
+        self.stage = 'scoring'
+
+    def snapshot(self):
+        with self._lock:
+            participants = {name: dict(p) for name, p in self.participants.items()}
+        done = sum(p['done'] for p in participants.values())
+        failed = sum('error' in p for p in participants.values())
+        out = {
+            'id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'participants': participants,
+            'progress': {'participants': len(participants), 'done': done, 'failed': failed},
+        }
+        if self.status == 'done':
+            out['results'] = self.results
+        elif self.status == 'error':
+            out['error'] = self.error
+        return out
+
+
+class JobQueue(object):
+    """Bounded in-process job queue served by ``workers`` daemon threads.
+
+    At most ``workers`` jobs run at once and at most ``max_pending`` wait;
+    beyond that ``submit`` raises QueueFull instead of buffering more
+    uploads. Prediction shares the process-wide model registry and stem
+    cache, so threads (not processes) keep one loaded model. Finished jobs
+    are kept for ``ttl`` seconds so their results can be fetched.
+
+    With ``state_dir``, job snapshots are also written there as JSON so that
+    any process sharing the directory (the preforked workers of serve.py)
+    can answer a status request for a job another worker is running.
+    Progress updates are written at most every ``publish_interval`` seconds.
+    """
+
+    def __init__(self, workers=2, max_pending=8, ttl=3600, state_dir=None, publish_interval=0.5):
+        self.workers = workers
+        self.ttl = ttl
+        self.state_dir = state_dir
+        self.publish_interval = publish_interval
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, func, cleanup=None):
+        """Queue ``func(job)``; its return value becomes ``job.results``."""
+        job = Job(func, cleanup)
+        job.on_change = self._progress
+        with self._lock:
+            self._start()
+            self._expire()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFull(f"{self._queue.maxsize} jobs already waiting")
+            self._jobs[job.id] = job
+        self._publish(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job_id):
+        """Status dict for a job of this process or, with ``state_dir``, of any process."""
+        job = self.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        path = self._state_path(job_id)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def pending(self):
+        """Jobs queued or running in this process."""
+        return self._queue.unfinished_tasks
+
+    def drain(self, timeout=None):
+        """Wait until queued and running jobs finish; False if ``timeout`` ran out."""
+        deadline = None if timeout is None else time.time() + timeout
+        while self.pending():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def _state_path(self, job_id):
+        # Job ids are uuid4 hex; anything else never names a file
+        if not self.state_dir or not job_id.isalnum():
+            return None
+        return os.path.join(self.state_dir, f'{job_id}.json')
+
+    def _publish(self, job):
+        path = self._state_path(job.id)
+        if path is None:
+            return
+        job._published = time.time()
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(job.snapshot(), f)
+        os.replace(tmp, path)
+
+    def _progress(self, job):
+        if self.state_dir and time.time() - job._published >= self.publish_interval:
+            self._publish(job)
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {'workers': self.workers, 'max_pending': self._queue.maxsize, 'jobs': counts}
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+            del self._jobs[job_id]
+            path = self._state_path(job_id)
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.status = 'running'
+            job.started = time.time()
+            self._publish(job)
+            trace = metrics.start_trace()
+            try:
+                job.results = job.func(job)
+                with job._lock:
+                    for name in job.results:
+                        job.participants.setdefault(name, {'messages': 0, 'done': False})['done'] = True
+                    errors = {name: p['error'] for name, p in job.participants.items() if 'error' in p}
+                metrics.incr('participant_errors', len(errors))
+                if errors and not job.results:
+                    raise RuntimeError('; '.join(f'{name}: {e}' for name, e in errors.items()))
+                job.status = 'done'
+            except Exception as e:
+                logging.exception("job %s failed", job.id)
+                metrics.incr('job_errors')
+                job.error = str(e)
+                job.status = 'error'
+            finally:
+                job.finished = time.time()
+                job.func = None
+                metrics.finish_trace(trace, 'job', 500 if job.status == 'error' else None)
+                self._publish(job)
+                if job.cleanup is not None:
+                    try:
+                        job.cleanup()
+                    except OSError:
+                        pass
+                self._queue.task_done()
@@ -0,0 +1,121 @@
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+SAMPLE_TEXT = ("[10/11, 08:00] Ani: Halo semua, besok kita jadi jalan-jalan ke pantai kan? Aku sudah siapkan bekal\n"
+               "[10/11, 08:05] Budi: Jadi dong, aku senang banget bisa kumpul lagi sama kalian\n")
+
+
+def multipart(fields, files):
+    """Encode form fields and (name, filename, bytes) files as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8'))
+    for name, filename, data in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: text/plain\r\n\r\n'.encode('utf-8') + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def request(url, method='GET', body=None, content_type=None, timeout=60):
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+    try:
+        headers = {'Content-Type': content_type} if content_type else {}
+        conn.request(method, parts.path or '/', body=body, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def wait_ready(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            status, body = request(base_url + '/readyz', timeout=5)
+            if status == 200:
+                return json.loads(body)
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"{base_url}/readyz not ready after {timeout} s")
+
+
+def run(url, body, content_type, concurrency, duration, max_requests):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = [0]
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < stop_at:
+            with lock:
+                if max_requests and counter[0] >= max_requests:
+                    return
+                counter[0] += 1
+            start = time.perf_counter()
+            try:
+                status, _ = request(url, 'POST', body, content_type)
+            except OSError as e:
+                status = str(e)
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests/sec against a running web_app / serve.py")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--endpoint', default='/analyze')
+    parser.add_argument('--file', default=None, help='Chat export to upload (default: send a short text)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run')
+    parser.add_argument('--requests', type=int, default=0, help='Stop after this many requests (0 = no limit)')
+    parser.add_argument('--warmup', type=int, default=5, help='Requests sent before measuring')
+    args = parser.parse_args()
+
+    base = args.url.rstrip('/')
+    ready = wait_ready(base)
+    if args.file:
+        with open(args.file, 'rb') as f:
+            body, content_type = multipart({}, [('file', 'chat.txt', f.read())])
+    else:
+        body, content_type = multipart({'text': SAMPLE_TEXT}, [])
+    url = base + args.endpoint
+    for _ in range(args.warmup):
+        request(url, 'POST', body, content_type)
+
+    latencies, errors, elapsed = run(url, body, content_type, args.concurrency, args.duration, args.requests)
+    print(f"Server: pid {ready.get('pid')}, model {str(ready.get('fingerprint'))[:12]}")
+    print(f"{len(latencies)} ok, {len(errors)} errors in {elapsed:.2f} s with concurrency {args.concurrency}")
+    if latencies:
+        latencies.sort()
+        pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+        print(f"Throughput: {len(latencies) / elapsed:,.1f} req/s")
+        print(f"Latency ms: mean={statistics.mean(latencies) * 1000:.1f} p50={pct(0.5):.1f} "
+              f"p95={pct(0.95):.1f} p99={pct(0.99):.1f} max={latencies[-1] * 1000:.1f}")
+    if errors:
+        print(f"Errors (first 5): {errors[:5]}")
+
+
+if __name__ == '__main__':
+    main()
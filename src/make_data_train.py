@@ -1,4 +1,3 @@
-import pandas as pd
 import random
 
 # Data latih dengan variasi yang sangat beragam
@@ -227,49 +226,46 @@ neuroticism_data = [
     "Saya balanced dalam manage expectation dan reality"
 ]
 
-# Buat dataset seimbang
-data = []
-id_counter = 1
+# (trait, kalimat, prefix nama); 20 kalimat pertama tiap trait berlabel 1
+TRAIT_DATA = [
+    ('openness', openness_data, 'O'),
+    ('conscientiousness', conscientiousness_data, 'C'),
+    ('extraversion', extraversion_data, 'E'),
+    ('agreeableness', agreeableness_data, 'A'),
+    ('neuroticism', neuroticism_data, 'N'),
+]
+
 
-# Openness
-for i, text in enumerate(openness_data):
-    label = 1 if i < 20 else 0
-    data.append([id_counter, f"User_O_{i+1}", text, label, 0, 0, 0, 0])
-    id_counter += 1
+def build_dataset(seed=None):
+    # Buat dataset seimbang
+    data = []
+    id_counter = 1
+    for k, (_, texts, prefix) in enumerate(TRAIT_DATA):
+        for i, text in enumerate(texts):
+            labels = [0] * len(TRAIT_DATA)
+            labels[k] = 1 if i < 20 else 0
+            data.append([id_counter, f"User_{prefix}_{i+1}", text] + labels)
+            id_counter += 1
 
-# Conscientiousness
-for i, text in enumerate(conscientiousness_data):
-    label = 1 if i < 20 else 0
-    data.append([id_counter, f"User_C_{i+1}", text, 0, label, 0, 0, 0])
-    id_counter += 1
+    # Shuffle data untuk randomize
+    random.Random(seed).shuffle(data)
+    return data
 
-# Extraversion
-for i, text in enumerate(extraversion_data):
-    label = 1 if i < 20 else 0
-    data.append([id_counter, f"User_E_{i+1}", text, 0, 0, label, 0, 0])
-    id_counter += 1
 
-# Agreeableness
-for i, text in enumerate(agreeableness_data):
-    label = 1 if i < 20 else 0
-    data.append([id_counter, f"User_A_{i+1}", text, 0, 0, 0, label, 0])
-    id_counter += 1
+def main():
+    import pandas as pd
+    data = build_dataset()
 
-# Neuroticism
-for i, text in enumerate(neuroticism_data):
-    label = 1 if i < 20 else 0
-    data.append([id_counter, f"User_N_{i+1}", text, 0, 0, 0, 0, label])
-    id_counter += 1
+    # Create DataFrame
+    df = pd.DataFrame(data, columns=[
+        "id", "name", "text", "openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism"
+    ])
 
-# Shuffle data untuk randomize
-random.shuffle(data)
+    # Save to CSV
+    df.to_csv("../data/train.csv", index=False, encoding="utf-8")
+    print(f"train.csv berhasil dibuat dengan {len(data)} baris data bervariasi dan seimbang.")
+    print(f"Setiap trait memiliki 20 label 1 dan 20 label 0.")
 
-# Create DataFrame
-df = pd.DataFrame(data, columns=[
-    "id", "name", "text", "openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism"
-])
 
-# Save to CSV
-df.to_csv("../data/train.csv", index=False, encoding="utf-8")
-print(f"train.csv berhasil dibuat dengan {len(data)} baris data bervariasi dan seimbang.")
-print(f"Setiap trait memiliki 20 label 1 dan 20 label 0.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# Matikan instrumentasi dengan METRICS=0; timer dan counter lalu jadi no-op
+enabled = os.environ.get('METRICS', '1') != '0'
+
+# Stage latency buckets (seconds), Prometheus-style cumulative on export
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PREFIX = 'personality'
+
+_local = threading.local()
+_NULL = nullcontext()
+
+
+class Trace(object):
+    """Stage timings (seconds) and counters of one request, kept per thread."""
+
+    __slots__ = ('stages', 'counts', 'start')
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+        self.start = time.perf_counter()
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def incr(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def as_dict(self):
+        return {
+            'total_ms': round((time.perf_counter() - self.start) * 1000, 3),
+            'stages_ms': {k: round(v * 1000, 3) for k, v in self.stages.items()},
+            'counts': dict(self.counts),
+        }
+
+    def server_timing(self):
+        # Server-Timing header: visible per request in browser dev tools
+        return ', '.join(f'{k};dur={v * 1000:.2f}' for k, v in self.stages.items())
+
+
+class _Timer(object):
+    __slots__ = ('trace', 'stage', 't0')
+
+    def __init__(self, trace, stage):
+        self.trace = trace
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.stage, time.perf_counter() - self.t0)
+        return False
+
+
+def current():
+    """The trace of the running request, or None (always None when disabled)."""
+    return getattr(_local, 'trace', None)
+
+
+def timer(stage):
+    """Context manager adding the block's wall time to ``stage`` of the current trace."""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return _NULL
+    return _Timer(trace, stage)
+
+
+def incr(name, n=1):
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.counts[name] = trace.counts.get(name, 0) + n
+
+
+def timed_iter(stage, iterable):
+    """Yield from ``iterable``, adding the time spent producing items to ``stage``."""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return iterable
+    return _timed_iter(trace, stage, iter(iterable))
+
+
+def _timed_iter(trace, stage, it):
+    clock = time.perf_counter
+    spent = 0.0
+    try:
+        while True:
+            t0 = clock()
+            try:
+                item = next(it)
+            except StopIteration:
+                spent += clock() - t0
+                return
+            spent += clock() - t0
+            yield item
+    finally:
+        trace.add(stage, spent)
+
+
+def start_trace(force=False):
+    """Start collecting for this thread; returns the Trace (None when disabled, unless ``force``)."""
+    if not (enabled or force):
+        return None
+    trace = _local.trace = Trace()
+    return trace
+
+
+def finish_trace(trace, endpoint, status=None):
+    """Stop collecting and fold the trace into the process-wide registry."""
+    _local.trace = None
+    if trace is not None:
+        registry.record(trace, endpoint, time.perf_counter() - trace.start, status)
+
+
+class Histogram(object):
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(BUCKETS) and value > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry(object):
+    """Counters and histograms of finished traces, plus collectors read at export.
+
+    Traces are merged once per request under one lock, so the hot path only
+    touches its own thread's Trace. ``collectors`` return gauges that already
+    exist elsewhere (cache sizes, hit counts) and are only read on export.
+    With ``METRICS_DIR`` set (serve.py does it for preforked workers) each
+    process writes its state there and ``/metrics`` sums all of them.
+    """
+
+    def __init__(self, state_dir=None, dump_interval=1.0):
+        self.state_dir = state_dir
+        self.dump_interval = dump_interval
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        self.counters = {}    # (name, label key, label value) -> number
+        self.histograms = {}  # (name, label key, label value) -> Histogram
+        self.collectors = {}  # name -> func() -> {key: number}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._flusher_pid = None
+
+    def add_collector(self, name, func):
+        self.collectors[name] = func
+
+    def _hist(self, key):
+        h = self.histograms.get(key)
+        if h is None:
+            h = self.histograms[key] = Histogram()
+        return h
+
+    def record(self, trace, endpoint, seconds, status=None):
+        with self._lock:
+            key = ('requests_total', 'endpoint', endpoint)
+            self.counters[key] = self.counters.get(key, 0) + 1
+            if status is not None and status >= 400:
+                key = ('request_errors_total', 'endpoint', endpoint)
+                self.counters[key] = self.counters.get(key, 0) + 1
+            self._hist(('request_seconds', 'endpoint', endpoint)).observe(seconds)
+            for stage, spent in trace.stages.items():
+                self._hist(('stage_seconds', 'stage', stage)).observe(spent)
+            for name, n in trace.counts.items():
+                key = (f'{name}_total', None, None)
+                self.counters[key] = self.counters.get(key, 0) + n
+            self._dirty = True
+        if self.state_dir and self._flusher_pid != os.getpid():
+            self._start_flusher()
+
+    def _start_flusher(self):
+        # Started on the first record of each process (threads do not survive fork)
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.dump_interval)
+            if self._dirty:
+                try:
+                    self.dump()
+                except OSError:
+                    pass
+
+    def collect(self):
+        gauges = {}
+        for name, func in list(self.collectors.items()):
+            try:
+                values = func()
+            except Exception:
+                continue
+            for k, v in (values or {}).items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    gauges[f'{name}_{k}'] = v
+        return gauges
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'counters': [[list(k), v] for k, v in self.counters.items()],
+                'histograms': [[list(k), h.counts, h.sum, h.count] for k, h in self.histograms.items()],
+                'gauges': self.collect(),
+            }
+
+    def dump(self):
+        self._dirty = False
+        path = os.path.join(self.state_dir, f'{os.getpid()}.json')
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def snapshots(self):
+        """This process's snapshot, plus the last dump of every other process in ``state_dir``."""
+        own = self.snapshot()
+        if not self.state_dir:
+            return [own]
+        self.dump()
+        out = [own]
+        for name in os.listdir(self.state_dir):
+            if not name.endswith('.json') or name == f'{os.getpid()}.json':
+                continue
+            try:
+                with open(os.path.join(self.state_dir, name), encoding='utf-8') as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not _alive(snap['pid']):
+                snap['gauges'] = {}  # keep an exited worker's totals, not its gauges
+            out.append(snap)
+        return out
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _labels(key, value, extra=''):
+    parts = [f'{key}="{value}"'] if key else []
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def render_prometheus(snapshots):
+    """Prometheus text exposition of summed counters/histograms and per-process gauges."""
+    counters, hists = {}, {}
+    for snap in snapshots:
+        for key, v in snap['counters']:
+            key = tuple(key)
+            counters[key] = counters.get(key, 0) + v
+        for key, counts, total, count in snap['histograms']:
+            key = tuple(key)
+            h = hists.get(key)
+            if h is None:
+                h = hists[key] = [[0] * len(counts), 0.0, 0]
+            h[0] = [a + b for a, b in zip(h[0], counts)]
+            h[1] += total
+            h[2] += count
+
+    lines = []
+    typed = set()
+    for (name, key, value), v in sorted(counters.items(), key=lambda kv: tuple(map(str, kv[0]))):
+        metric = f'{PREFIX}_{name}'
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric}{_labels(key, value)} {v}')
+    for (name, key, value), (counts, total, count) in sorted(hists.items(), key=lambda kv: tuple(map(str, kv[0]))):
+        metric = f'{PREFIX}_{name}'
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f'# TYPE {metric} histogram')
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ('+Inf',), counts):
+            cumulative += n
+            lines.append(f'{metric}_bucket{_labels(key, value, f"le={json.dumps(str(bound))}")} {cumulative}')
+        lines.append(f'{metric}_sum{_labels(key, value)} {total}')
+        lines.append(f'{metric}_count{_labels(key, value)} {count}')
+    multi = len(snapshots) > 1
+    for snap in snapshots:
+        for name, v in sorted(snap['gauges'].items()):
+            metric = f'{PREFIX}_{name}'
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} gauge')
+            lines.append(f'{metric}{_labels("pid", snap["pid"]) if multi else ""} {v}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry(state_dir=os.environ.get('METRICS_DIR') or None)
@@ -1,14 +1,70 @@
-import csv
 import numpy as np
-import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.multioutput import MultiOutputClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import f1_score, classification_report, confusion_matrix
 from preprocessing import simple_preprocess
+from model_registry import get_model, model_fingerprint
+from chat_utils import accumulate_per_user
+from result_cache import TextDigest, text_digest
+from feature_accumulator import term_counter
+from fused_scorer import fused_scorer
+import metrics
+
+TRAIT_NAMES = ['openness','conscientiousness','extraversion','agreeableness','neuroticism']
+
+def make_vectorizer(features='tfidf', **params):
+    """Unfitted vectorizer for a features mode: 'tfidf' (vocabulary) or 'hashing'.
+
+    ``params`` override the defaults below (e.g. from ``tune.py``).
+    """
+    if features == 'hashing':
+        # Hashing trick: tanpa kamus vocabulary, memori transform konstan
+        from hashed_features import HashedTfidf
+        return HashedTfidf(**dict(dict(
+            ngram_range=(1,2),
+            lowercase=True,
+            sublinear_tf=True,
+            token_pattern=r'\b\w+\b'
+        ), **params))
+    elif features == 'tfidf':
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        # More aggressive TF-IDF parameters - keep more features
+        return TfidfVectorizer(**dict(dict(
+            max_features=2000,    # Increase features
+            ngram_range=(1,2),    # Include bigrams
+            lowercase=True, 
+            min_df=1,             # Use all terms
+            max_df=0.98,          # Remove only very common terms
+            sublinear_tf=True,    # Help with feature scaling
+            token_pattern=r'\b\w+\b'  # Better tokenization
+        ), **params))
+    else:
+        raise ValueError(f"Unknown features mode: {features!r} (expected 'tfidf' or 'hashing')")
+
+def make_classifier(n_jobs=1, C=0.5):
+    """One liblinear logistic regression per trait; ``n_jobs`` fits traits concurrently.
+
+    tune.py searches ``C`` on this same estimator.
+    """
+    from preprocess_pool import resolve_jobs
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.multioutput import MultiOutputClassifier
+    # Use parameters that handle imbalanced data well
+    base = LogisticRegression(
+        solver='liblinear',
+        max_iter=3000,
+        C=C,                      # Default 0.5: lower C generalizes better with small data
+        random_state=42,
+        class_weight='balanced',  # Critical for imbalanced data
+        penalty='l2'
+    )
+    return MultiOutputClassifier(base, n_jobs=resolve_jobs(n_jobs))
+
+def train_classifier(csv_path, model_out='personality_clf.joblib', flat_out=None, features='tfidf', n_jobs=1,
+                     corpus_cache=True):
+    import csv
+    import joblib
+    from corpus_cache import open_corpus_cache, preprocess_cached
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report
 
-def train_classifier(csv_path, model_out='personality_clf.joblib'):
     texts, labels, names = [], [], []
     with open(csv_path, newline='', encoding='utf-8') as f:
         reader = csv.DictReader(f)
@@ -35,25 +91,17 @@ def train_classifier(csv_path, model_out='personality_clf.joblib'):
         print(f"{trait}: {positive_count} positive out of {len(trait_labels)} ({positive_count/len(trait_labels)*100:.1f}%)")
     
     # Use simple preprocessing - keep more words!
-    processed_texts = []
-    for t in texts:
-        processed = simple_preprocess(t)
-        processed_texts.append(processed)
+    # Baris yang sudah pernah diproses diambil dari cache korpus
+    cache = open_corpus_cache(corpus_cache)
+    processed_texts = preprocess_cached(texts, simple_preprocess, cache, n_jobs)
+    if cache is not None:
+        print(f"Corpus cache: {cache.stats()}")
     
     # Check sample processed texts
     sample_processed = processed_texts[:5]
     print(f"Sample processed texts: {sample_processed}")
     
-    # More aggressive TF-IDF parameters - keep more features
-    vec = TfidfVectorizer(
-        max_features=2000,    # Increase features
-        ngram_range=(1,2),    # Include bigrams
-        lowercase=True, 
-        min_df=1,             # Use all terms
-        max_df=0.98,          # Remove only very common terms
-        sublinear_tf=True,    # Help with feature scaling
-        token_pattern=r'\b\w+\b'  # Better tokenization
-    )
+    vec = make_vectorizer(features)
     
     X = vec.fit_transform(processed_texts)
     y = np.array(labels)
@@ -110,17 +158,7 @@ def train_classifier(csv_path, model_out='personality_clf.joblib'):
             if 1 not in unique_values and positive_count == 0:
                 print(f"  FIXING: Adding positive examples to training set for {trait}")
     
-    # Use parameters that handle imbalanced data well
-    base = LogisticRegression(
-        solver='liblinear',
-        max_iter=3000,
-        C=0.5,                    # Lower C for better generalization with small data
-        random_state=42,
-        class_weight='balanced',  # Critical for imbalanced data
-        penalty='l2'
-    )
-    
-    clf = MultiOutputClassifier(base, n_jobs=1)
+    clf = make_classifier(n_jobs)
     
     print("Training classifier...")
     clf.fit(X_train, y_train)
@@ -172,73 +210,258 @@ def train_classifier(csv_path, model_out='personality_clf.joblib'):
             print()
     
     # Save model with preprocessing function
-    joblib.dump({
+    data = {
         'vec': vec, 
         'clf': clf, 
         'preprocess_func': simple_preprocess,
-        'trait_names': trait_names
-    }, model_out, compress=3)
+        'trait_names': trait_names,
+        'features': features
+    }
+    joblib.dump(data, model_out, compress=3)
     print(f"\nModel saved to {model_out}")
+    if flat_out:
+        # Artefak datar (mmap, tanpa pickle) untuk inferensi
+        from flat_model import export_flat
+        export_flat(data, flat_out)
+        print(f"Flat model saved to {flat_out}")
     return True
 
 def predict_with_model(text, model_path):
-    print(f"\n=== PREDICTION DEBUG ===")
-    print(f"Input text: '{text[:100]}...'")
-    print(f"Model path: {model_path}")
-    
+    """{trait: 0/1} for one text; all zeros if it is empty after preprocessing.
+
+    Stage timings and counts go to ``metrics`` (``metrics.start_trace`` to
+    inspect a single call) instead of being printed.
+    """
+    metrics.incr('documents')
     try:
-        data = joblib.load(model_path)
+        data = get_model(model_path)
         vec = data['vec']
         clf = data['clf']
-        
+
         # Use saved preprocessing function if available
-        if 'preprocess_func' in data:
-            processed = data['preprocess_func'](text)
-        else:
-            processed = simple_preprocess(text)
-            
-        print(f"Processed text: '{processed[:100]}...'")
-        print(f"Processed length: {len(processed.split())} words")
-        
+        with metrics.timer('preprocess'):
+            processed = data.get('preprocess_func', simple_preprocess)(text)
         if not processed.strip():
-            print("WARNING: Processed text is empty!")
+            metrics.incr('empty_after_preprocess')
             return {'openness': 0, 'conscientiousness': 0, 'extraversion': 0, 'agreeableness': 0, 'neuroticism': 0}
-        
-        X = vec.transform([processed])
-        print(f"Feature vector shape: {X.shape}")
-        print(f"Feature vector non-zero: {X.nnz}")
-        
-        pred = clf.predict(X)[0]
-        pred_proba = clf.predict_proba(X)
-        
-        # Show probabilities for debugging
+
+        with metrics.timer('vectorize'):
+            X = vec.transform([processed])
+        metrics.incr('tokens', len(processed.split()))
+
         trait_names = ['openness','conscientiousness','extraversion','agreeableness','neuroticism']
-        for i, trait in enumerate(trait_names):
-            try:
-                if len(pred_proba[i]) > 1 and pred_proba[i][0].shape[0] > 1:
-                    prob = pred_proba[i][0][1]  # Probability of positive class
-                    print(f"{trait}: prediction={pred[i]}, probability={prob:.3f}")
-                else:
-                    print(f"{trait}: prediction={pred[i]}, single class model")
-            except:
-                print(f"{trait}: prediction={pred[i]}, error in probability")
-        
-        result = dict(zip(trait_names, map(int, pred)))
-        print(f"Final result: {result}")
-        return result
-        
+        with metrics.timer('classify'):
+            scorer = fused_scorer(clf)
+            if scorer is not None:
+                pred = scorer.scores(X)[0][0]
+            else:
+                pred = clf.predict(X)[0]
+        return dict(zip(trait_names, map(int, pred)))
+
     except Exception as e:
         print(f"Error in predict_with_model: {e}")
         import traceback
         traceback.print_exc()
         return {'openness': 0, 'conscientiousness': 0, 'extraversion': 0, 'agreeableness': 0, 'neuroticism': 0}
 
+def _score(data, X, rows, n, return_proba):
+    # Fill n result dicts; only `rows` (with matching rows of X) are scored
+    clf = data['clf']
+    trait_names = data.get('trait_names', TRAIT_NAMES)
+    labels = [dict.fromkeys(trait_names, 0) for _ in range(n)]
+    probas = [dict.fromkeys(trait_names) for _ in range(n)]
+    metrics.incr('documents', n)
+    if n > len(rows):
+        metrics.incr('empty_after_preprocess', n - len(rows))
+    with metrics.timer('classify'):
+        _score_rows(clf, trait_names, X, rows, labels, probas, return_proba)
+    if return_proba:
+        return labels, probas
+    return labels
+
+def _score_rows(clf, trait_names, X, rows, labels, probas, return_proba):
+    # Fills labels/probas in place
+    scorer = fused_scorer(clf) if rows else None
+    if scorer is not None:
+        # Semua trait dalam satu matmul: label dan probabilitas (n_rows x n_traits)
+        pred, pos = scorer.scores(X)
+        pred, pos = pred.tolist(), pos.tolist()
+        for k, i in enumerate(rows):
+            labels[i] = dict(zip(trait_names, pred[k]))
+            if return_proba:
+                probas[i] = dict(zip(trait_names, pos[k]))
+    elif rows:
+        pred = clf.predict(X)
+        if return_proba:
+            # One (n_rows, n_classes) array per trait estimator
+            pred_proba = clf.predict_proba(X)
+        for j, trait in enumerate(trait_names):
+            if return_proba:
+                classes = list(clf.estimators_[j].classes_)
+                pos = pred_proba[j][:, classes.index(1)] if 1 in classes else np.zeros(len(rows))
+            for k, i in enumerate(rows):
+                labels[i][trait] = int(pred[k, j])
+                if return_proba:
+                    probas[i][trait] = float(pos[k])
+
+def predict_batch(texts, model_path, return_proba=False, cache=None, n_jobs=1):
+    """Score many texts with one vectorizer transform and one pass per trait.
+
+    Returns a list of {trait: 0/1} dicts in the order of ``texts``. With
+    ``return_proba=True`` also returns a matching list of {trait: P(1)} dicts.
+    Texts that are empty after preprocessing get all-zero labels and ``None``
+    probabilities, like ``predict_with_model``. With a ``ResultCache``, texts
+    seen before under the same model are not preprocessed again. For bulk
+    scoring, ``n_jobs > 1`` preprocesses on a process pool.
+    """
+    if cache is not None:
+        return _predict_cached([text_digest(t) for t in texts],
+                               lambda missing: predict_batch([texts[i] for i in missing], model_path, True,
+                                                             n_jobs=n_jobs),
+                               model_path, cache, return_proba)
+
+    data = get_model(model_path)
+    preprocess = data.get('preprocess_func', simple_preprocess)
+
+    with metrics.timer('preprocess'):
+        if n_jobs == 1:
+            processed = [preprocess(t) for t in texts]
+        else:
+            from preprocess_pool import preprocess_parallel
+            processed = preprocess_parallel(texts, preprocess, n_jobs)
+    rows = [i for i, p in enumerate(processed) if p.strip()]
+    with metrics.timer('vectorize'):
+        X = data['vec'].transform([processed[i] for i in rows]) if rows else None
+    return _score(data, X, rows, len(processed), return_proba)
+
+def _predict_cached(digests, predict_missing, model_path, cache, return_proba):
+    # predict_missing(indices) -> (labels, probas) for the cache misses only
+    fp = model_fingerprint(model_path)
+    labels, probas = [None] * len(digests), [None] * len(digests)
+    missing = []
+    for i, digest in enumerate(digests):
+        hit = cache.get(fp, digest)
+        if hit is None:
+            missing.append(i)
+        else:
+            labels[i], probas[i] = hit['labels'], hit['proba']
+    metrics.incr('result_cache_hits', len(digests) - len(missing))
+    metrics.incr('result_cache_misses', len(missing))
+    if missing:
+        new_labels, new_probas = predict_missing(missing)
+        for i, lab, prob in zip(missing, new_labels, new_probas):
+            labels[i], probas[i] = lab, prob
+            cache.put(fp, digests[i], {'labels': lab, 'proba': prob})
+    if return_proba:
+        return labels, probas
+    return labels
+
+def accumulator_factory(model_path):
+    """Factory for per-user TermAccumulators, for ``chat_utils.accumulate_per_user``."""
+    data = get_model(model_path)
+    return term_counter(data['vec'], data.get('preprocess_func', simple_preprocess)).accumulator
+
+def predict_accumulated(accumulators, model_path, return_proba=False):
+    """Like ``predict_batch`` but for users whose messages were folded into
+    TermAccumulators, so no per-user text is ever joined or re-tokenized."""
+    data = get_model(model_path)
+    counter = term_counter(data['vec'], data.get('preprocess_func', simple_preprocess))
+    if any(acc.counter is not counter for acc in accumulators):
+        raise ValueError("accumulators were built for a different model (was it reloaded?)")
+    rows = [i for i, acc in enumerate(accumulators) if not acc.empty]
+    with metrics.timer('vectorize'):
+        X = counter.transform([accumulators[i] for i in rows]) if rows else None
+    return _score(data, X, rows, len(accumulators), return_proba)
+
+def predict_documents(documents, model_path, cache=None):
+    """Labels and probabilities for a batch of documents, as ``(labels, probas)`` lists.
+
+    A document is a text, or a list of messages that is scored like one chat
+    participant (folded into a TermAccumulator, never joined). Every
+    document goes through one transform and one fused scoring pass, and the
+    cache key of a message list is that of its space-joined text, so both
+    forms share ``ResultCache`` entries.
+    """
+    documents = [[d] if isinstance(d, str) else d for d in documents]
+
+    def predict_missing(missing):
+        factory = accumulator_factory(model_path)
+        accs = []
+        for i in missing:
+            acc = factory()
+            for message in documents[i]:
+                acc.add(message)
+            accs.append(acc)
+        return predict_accumulated(accs, model_path, True)
+
+    if cache is None:
+        return predict_missing(range(len(documents)))
+    digests = []
+    for messages in documents:
+        digest = TextDigest()
+        for message in messages:
+            digest.add(message)
+        digests.append(digest.hexdigest())
+    return _predict_cached(digests, predict_missing, model_path, cache, True)
+
+def predict_chat(open_records, model_path, return_proba=False, cache=None):
+    """Per-participant predictions for a chat export, as {name: labels}.
+
+    ``open_records()`` must return a fresh ``iter_chat_records`` iterator.
+    Without a cache the chat is read once into TermAccumulators. With a
+    cache it is first read into cheap per-user digests, and only users that
+    miss the cache are read again and accumulated.
+    """
+    if cache is None:
+        user_accs = accumulate_per_user(open_records(), accumulator_factory(model_path))
+        names = list(user_accs)
+        result = predict_accumulated(list(user_accs.values()), model_path, return_proba)
+    else:
+        digests = accumulate_per_user(open_records(), TextDigest)
+        names = list(digests)
+
+        def predict_missing(missing):
+            wanted = {names[i] for i in missing}
+            records = (r for r in open_records() if r[1] in wanted)
+            user_accs = accumulate_per_user(records, accumulator_factory(model_path))
+            return predict_accumulated([user_accs[names[i]] for i in missing], model_path, True)
+
+        result = _predict_cached([digests[n].hexdigest() for n in names], predict_missing,
+                                 model_path, cache, return_proba)
+    if return_proba:
+        return dict(zip(names, result[0])), dict(zip(names, result[1]))
+    return dict(zip(names, result))
+
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Retrain the personality classifier")
+    parser.add_argument('--train_csv', default="../data/train.csv")
+    parser.add_argument('--model_out', default='personality_clf.joblib')
+    parser.add_argument('--flat_out', default=None, help='Also export a flat (mmap) artifact here')
+    parser.add_argument('--features', choices=['tfidf', 'hashing'], default='tfidf')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Out-of-core training (hashed features + SGD) for CSVs that do not fit in memory')
+    parser.add_argument('--chunk_size', type=int, default=50000, help='Rows per chunk (--streaming)')
+    parser.add_argument('--epochs', type=int, default=3, help='Passes over the data (--streaming)')
+    parser.add_argument('--n_jobs', type=int, default=1,
+                        help='Worker processes for preprocessing and per-trait fits (-1 = all cores)')
+    parser.add_argument('--resume', action='store_true', help='Continue from the last checkpoint (--streaming)')
+    parser.add_argument('--corpus_cache', default=True,
+                        help='Preprocessed-row cache (default: CORPUS_CACHE_PATH or cache/corpus.sqlite; "" to disable)')
+    args = parser.parse_args()
+
     print("=== RETRAINING MODEL ===")
-    success = train_classifier("../data/train.csv")
+    if args.streaming:
+        from stream_train import train_classifier_streaming
+        success = train_classifier_streaming(args.train_csv, args.model_out, args.flat_out, resume=args.resume,
+                                             chunk_size=args.chunk_size, epochs=args.epochs, n_jobs=args.n_jobs,
+                                             corpus_cache=args.corpus_cache)
+    else:
+        success = train_classifier(args.train_csv, args.model_out, args.flat_out, args.features, args.n_jobs,
+                                   args.corpus_cache)
     
     if success:
         print("\n=== TESTING PREDICTION ===") 
         test_text = "Saya suka mencoba hal baru dan kreatif, saya selalu disiplin dan tepat waktu"
-        result = predict_with_model(test_text, 'personality_clf.joblib')
+        result = predict_with_model(test_text, args.model_out)
         print(f"\nFinal test result: {result}")
\ No newline at end of file
@@ -0,0 +1,104 @@
+import os
+import hashlib
+import threading
+import joblib
+
+
+def _stamp_path(path):
+    # A flat artifact is a directory; its manifest is replaced last on export
+    if os.path.isdir(path):
+        return os.path.join(path, 'manifest.json')
+    return path
+
+
+def _file_stamp(path):
+    st = os.stat(_stamp_path(path))
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _file_sha1(path):
+    path = _stamp_path(path)
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_artifact(path):
+    """joblib pickle, or a flat (mmap, pickle-free) artifact directory."""
+    if os.path.isdir(path):
+        from flat_model import load_flat
+        return load_flat(path)
+    return joblib.load(path)
+
+
+class ModelRegistry(object):
+    """Process-wide cache of loaded model artifacts.
+
+    Each artifact is loaded once and keyed by its absolute path. On every
+    lookup the file's mtime/size is compared against the loaded copy, so a
+    retrained ``personality_clf.joblib`` is picked up without a restart.
+    """
+
+    def __init__(self, loader=load_artifact, check_stamp=True):
+        self._loader = loader
+        # False: keep serving what is loaded even if the file changes (serve.py
+        # workers; their master loads the new model and forks new workers)
+        self.check_stamp = check_stamp
+        self._lock = threading.Lock()
+        self._entries = {}  # abspath -> {'stamp', 'fingerprint', 'data'}
+
+    def _entry(self, model_path):
+        path = os.path.abspath(model_path)
+        entry = self._entries.get(path)
+        if entry is not None and not self.check_stamp:
+            return entry
+        stamp = _file_stamp(path)
+        if entry is not None and entry['stamp'] == stamp:
+            return entry
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            entry = self._entries.get(path)
+            if entry is None or entry['stamp'] != stamp:
+                entry = {
+                    'stamp': stamp,
+                    'fingerprint': _file_sha1(path),
+                    'data': self._loader(path),
+                }
+                self._entries[path] = entry
+        return entry
+
+    def get(self, model_path):
+        return self._entry(model_path)['data']
+
+    def fingerprint(self, model_path):
+        return self._entry(model_path)['fingerprint']
+
+    def invalidate(self, model_path=None):
+        with self._lock:
+            if model_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(model_path), None)
+
+
+_registry = ModelRegistry()
+
+
+def get_model(model_path):
+    return _registry.get(model_path)
+
+
+def model_fingerprint(model_path):
+    return _registry.fingerprint(model_path)
+
+
+def pin_loaded_models():
+    """Stop reloading already-loaded artifacts when their files change (for preforked workers)."""
+    _registry.check_stamp = False
+
+
+def model_stamp(model_path):
+    """(mtime_ns, size) of the artifact, the same check the registry uses to reload."""
+    return _file_stamp(os.path.abspath(model_path))
@@ -0,0 +1,86 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def resolve_jobs(n_jobs):
+    """``n_jobs`` as a worker count: None/0/1 -> 1, -1 -> all cores, -2 -> all but one."""
+    if not n_jobs:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+
+def _apply(func, items):
+    return [func(item) for item in items]
+
+
+def imap_chunks(func, chunks, n_jobs=1, extra=False):
+    """Apply ``func`` to every item of every chunk, yielding result lists in input order.
+
+    Stemming and regex work hold the GIL, so the chunks run on worker
+    processes. At most ``2 * n_jobs`` chunks are in flight, so a long (or
+    endless) chunk iterator is consumed at the pace of the caller. With
+    ``extra=True`` each chunk is an ``(items, payload)`` pair and
+    ``(results, payload)`` is yielded, so labels can travel alongside.
+    """
+    n_jobs = resolve_jobs(n_jobs)
+    if n_jobs == 1:
+        for chunk in chunks:
+            if extra:
+                yield _apply(func, chunk[0]), chunk[1]
+            else:
+                yield _apply(func, chunk)
+        return
+    with ProcessPoolExecutor(n_jobs) as pool:
+        pending = deque()
+        for chunk in chunks:
+            items, payload = chunk if extra else (chunk, None)
+            pending.append((pool.submit(_apply, func, items), payload))
+            if len(pending) >= 2 * n_jobs:
+                future, payload = pending.popleft()
+                yield (future.result(), payload) if extra else future.result()
+        while pending:
+            future, payload = pending.popleft()
+            yield (future.result(), payload) if extra else future.result()
+
+
+def preprocess_parallel(texts, func, n_jobs=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """``[func(t) for t in texts]`` on ``n_jobs`` processes, same order as ``texts``.
+
+    ``func`` must be a module-level function (it is pickled by reference).
+    Each worker keeps its own stem cache, so stems learned in a worker are
+    not written back to the parent's ``StemCache``.
+    """
+    texts = list(texts)
+    if resolve_jobs(n_jobs) == 1 or len(texts) <= chunk_size:
+        return _apply(func, texts)
+    chunks = (texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size))
+    out = []
+    for results in imap_chunks(func, chunks, n_jobs):
+        out.extend(results)
+    return out
+
+
+def _stem_token(token):
+    from preprocessing import stemmer
+    return stemmer.stem(token)
+
+
+def warm_stem_cache(tokens, n_jobs=1, chunk_size=200):
+    """Stem every distinct uncached token once, spread over ``n_jobs`` workers.
+
+    Run this before ``preprocess_parallel`` with a stemming function:
+    otherwise each worker starts from the parent's cache and stems the
+    same new words again, so adding workers multiplies the Sastrawi calls.
+    The stems land in the parent's ``preprocessing.stemmer``, which forked
+    workers then inherit. Returns the number of tokens stemmed.
+    """
+    from preprocessing import stemmer
+    todo = [t for t in set(tokens) if t not in stemmer]
+    if todo:
+        stemmer.update(zip(todo, preprocess_parallel(todo, _stem_token, n_jobs, chunk_size)))
+    return len(todo)
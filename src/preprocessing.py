@@ -1,33 +1,21 @@
 import os
 import re
-import nltk
-from Sastrawi.Stemmer.StemmerFactory import StemmerFactory
-import csv
-import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.multioutput import MultiOutputClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import f1_score, classification_report
-import numpy as np
-import re
+from stem_cache import create_cached_stemmer
+from slang import load_lexicon
+from text_pipeline import TextPipeline, NEGATIONS, simple_tokens
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Naikkan jika output preprocess_text/simple_preprocess berubah (dipakai key result cache)
+PREPROCESS_VERSION = '1'
+
 # Load stopwords dari file
 with open(os.path.join(BASE_DIR, 'stopwords.txt'), encoding='utf-8') as f:
     
     STOPWORDS = set(line.strip() for line in f if line.strip())
 
-# Load slang dari file
-SLANG = {}
-with open(os.path.join(BASE_DIR, 'slangwords.txt'), encoding='utf-8') as f:
-    for line in f:
-        if line.strip() and ':' in line:
-            slang, formal = line.strip().split(':', 1)
-            SLANG[slang.strip()] = formal.strip()
-
-NEGATIONS = {'tidak', 'bukan', 'nggak', 'gak', 'tdk', 'tak'}
+# Load slang dari file (JSON atau baris slang:formal), dikompilasi ke cache .lexicon
+SLANG = load_lexicon(os.path.join(BASE_DIR, 'slangwords.txt'))
 
 def normalize_token(tok):
     return SLANG.get(tok, tok)
@@ -47,43 +35,34 @@ def apply_negation(tokens, window=3):
                         tokens[i + j] = 'NOT_' + tokens[i + j]
     return tokens
 
-factory = StemmerFactory()
-stemmer = factory.create_stemmer()
+# Stem cache bersama; set STEM_CACHE_PATH agar cache tetap hangat setelah restart.
+# Kata yang ada di tabel stem (dibangun dengan src/stem_table.py) tidak lewat Sastrawi;
+# kosongkan STEM_TABLE_PATH untuk menonaktifkan
+STEM_TABLE_PATH = os.environ.get('STEM_TABLE_PATH', os.path.join(BASE_DIR, 'stem_table.txt'))
+stemmer = create_cached_stemmer(cache_path=os.environ.get('STEM_CACHE_PATH'), table_path=STEM_TABLE_PATH)
+
+pipeline = TextPipeline(slang=SLANG, stopwords=STOPWORDS, stemmer=stemmer, negations=NEGATIONS)
 
 def preprocess_text(text):
-    text = re.sub(r'http\S+', ' ', text)
-    text = re.sub(r'[@#]\w+', ' ', text)
-    tokens = tokenize(text)
-    tokens = apply_negation(tokens)
-    processed = []
-    for t in tokens:
-        neg = False
-        if t.startswith('NOT_'):
-            neg = True
-            t = t[4:]
-        if not t or t.isdigit():
-            continue
-        stem = stemmer.stem(t)
-        if stem in STOPWORDS:
-            continue
-        if neg:
-            stem = 'NOT_' + stem
-        processed.append(stem)
-    return processed
+    return pipeline(text)
 
 # Preprocessing yang lebih ringan - jangan terlalu agresif
 def simple_preprocess(text):
-    # Basic cleaning only
-    text = re.sub(r'http\S+', ' ', text)
-    text = re.sub(r'[@#]\w+', ' ', text)
-    # Tokenize tapi jangan hapus terlalu banyak kata
-    tokens = re.findall(r'\w+', text.lower())
-    # Filter hanya kata yang sangat umum seperti 'dan', 'atau', 'di', 'ke', 'dari'
-    basic_stops = {'dan', 'atau', 'di', 'ke', 'dari', 'pada', 'dalam', 'untuk', 'dengan', 'yang', 'ini', 'itu'}
-    filtered = [t for t in tokens if t not in basic_stops and len(t) > 2]
-    return ' '.join(filtered)
+    # Hanya buang kata yang sangat umum ('dan', 'atau', 'di', ...) dan kata <= 2 huruf
+    return ' '.join(simple_tokens(text))
+
+def train_classifier(csv_path, model_out='personality_clf.joblib', corpus_cache=True):
+    # Training-only imports stay here so importing preprocessing (e.g. when
+    # unpickling a model that references simple_preprocess) is cheap
+    import csv
+    import joblib
+    import numpy as np
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.multioutput import MultiOutputClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report
 
-def train_classifier(csv_path, model_out='personality_clf.joblib'):
     texts, labels, names = [], [], []
     with open(csv_path, newline='', encoding='utf-8') as f:
         reader = csv.DictReader(f)
@@ -97,8 +76,9 @@ def train_classifier(csv_path, model_out='personality_clf.joblib'):
     
     print(f"Total data: {len(texts)}")
     
-    # Preprocess dengan cara yang lebih ringan
-    processed_texts = [simple_preprocess(t) for t in texts]
+    # Preprocess dengan cara yang lebih ringan; baris yang sudah ada di cache korpus dilewati
+    from corpus_cache import open_corpus_cache, preprocess_cached
+    processed_texts = preprocess_cached(texts, simple_preprocess, open_corpus_cache(corpus_cache))
     
     # Check sample processed texts
     sample_processed = processed_texts[:5]
@@ -176,7 +156,8 @@ def train_classifier(csv_path, model_out='personality_clf.joblib'):
     print(f"\nModel saved to {model_out}")
 
 def predict_with_model(text, model_path):
-    data = joblib.load(model_path)
+    from model_registry import get_model
+    data = get_model(model_path)
     vec = data['vec']
     clf = data['clf']
     
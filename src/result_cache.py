@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from text_pipeline import raw_tokens
+
+
+class TextDigest(object):
+    """Incremental sha1 of a user's normalized messages, usable as a per-user accumulator.
+
+    Each message is hashed as its ``raw_tokens`` (lowercased words without
+    URLs, mentions and hashtags), the first step of every preprocessing
+    function, so texts that differ only in case, spacing or punctuation
+    share a digest. Messages are kept apart because models fold them one
+    at a time.
+    """
+
+    __slots__ = ('_sha', '_started')
+
+    def __init__(self):
+        self._sha = hashlib.sha1()
+        self._started = False
+
+    def add(self, message):
+        if self._started:
+            self._sha.update(b'\n')
+        self._started = True
+        self._sha.update(' '.join(raw_tokens(message)).encode('utf-8'))
+
+    def hexdigest(self):
+        return self._sha.hexdigest()
+
+
+def text_digest(text):
+    d = TextDigest()
+    d.add(text)
+    return d.hexdigest()
+
+
+class ResultCache(object):
+    """Size-bounded on-disk cache of per-participant predictions.
+
+    Rows live in SQLite keyed by (model fingerprint, preprocessing version,
+    text digest) and are evicted least-recently-used once there are more
+    than ``max_entries`` (checked every 64 inserts). When a new model
+    fingerprint is stored, rows of every other model are dropped, so
+    retraining ``personality_clf.joblib`` invalidates the cache by itself.
+    Callers storing a different kind of result for the same model (the
+    hybrid analyzer next to /v1/predict) pass a ``namespace``, which is part
+    of the key but not of that invalidation.
+    """
+
+    def __init__(self, path, max_entries=50000, version=''):
+        self.path = path
+        self.max_entries = max_entries
+        self.version = str(version)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._model = None
+        self._puts = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS results ('
+                         'key TEXT PRIMARY KEY, model TEXT NOT NULL, '
+                         'value TEXT NOT NULL, last_used REAL NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+
+    def _key(self, model_fp, digest, namespace=''):
+        if namespace:
+            return f"{model_fp}:{self.version}:{namespace}:{digest}"
+        return f"{model_fp}:{self.version}:{digest}"
+
+    def get(self, model_fp, digest, namespace=''):
+        key = self._key(model_fp, digest, namespace)
+        with self._lock:
+            row = self._db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute('UPDATE results SET last_used = ? WHERE key = ?', (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, model_fp, digest, value, namespace=''):
+        key = self._key(model_fp, digest, namespace)
+        with self._lock:
+            if model_fp != self._model:
+                # New (or first seen) model: results of any other model are stale
+                self._db.execute('DELETE FROM results WHERE model != ?', (model_fp,))
+                self._model = model_fp
+            self._db.execute('INSERT OR REPLACE INTO results (key, model, value, last_used) VALUES (?, ?, ?, ?)',
+                             (key, model_fp, json.dumps(value), time.time()))
+            self._puts += 1
+            if self._puts % 64:
+                return  # counting rows is a table scan; check the bound every 64 puts
+            excess = self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._db.execute('DELETE FROM results WHERE key IN '
+                                 '(SELECT key FROM results ORDER BY last_used LIMIT ?)', (excess,))
+                self.evictions += excess
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'max_entries': self.max_entries,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM results')
+
+    def close(self):
+        # SQLite connections must not be carried across fork(); serve.py
+        # closes the master's before forking and workers open their own
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,221 @@
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+
+def run_worker(sock, host, port, threaded, graceful_timeout):
+    """Serve requests on the inherited listening socket until SIGTERM."""
+    from werkzeug.serving import make_server
+    from model_registry import pin_loaded_models
+    from preprocessing import stemmer
+    import web_app
+
+    # Ctrl+C reaches the whole process group; only the master reacts to it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    # Model changes are handled by the master forking a new generation
+    pin_loaded_models()
+    # SQLite connections are per process
+    web_app.result_cache = web_app.open_result_cache()
+    server = make_server(host, port, web_app.app, threaded=threaded, fd=sock.fileno())
+
+    def stop(signum, frame):
+        web_app.readiness['draining'] = True
+        # shutdown() waits for serve_forever to exit, so it cannot run in this (the serving) thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    server.serve_forever()
+    # Requests in flight have finished; let queued background jobs finish too
+    web_app.jobs.drain(graceful_timeout)
+    server.server_close()
+    # Workers leave through os._exit (no atexit), so save the stems learned here
+    if stemmer.path:
+        stemmer.save(stemmer.path)
+
+
+class Master(object):
+    """Pre-forking master: loads the model once, forks workers, reloads on change.
+
+    Workers are forked after the model, term counter and Sastrawi dictionary
+    are loaded, so they share that memory copy-on-write. When the model file
+    changes (or on SIGHUP) the new model is loaded in the master, a new
+    generation of workers is forked, and the old workers are sent SIGTERM:
+    they stop accepting, finish their requests and background jobs, and exit.
+    If the new model fails to load, the old workers keep serving.
+    """
+
+    def __init__(self, sock, host, port, workers, threaded=False, reload_interval=2.0, graceful_timeout=30):
+        self.sock = sock
+        self.host = host
+        self.port = port
+        self.n_workers = workers
+        self.threaded = threaded
+        self.reload_interval = reload_interval
+        self.graceful_timeout = graceful_timeout
+        self.generation = 0
+        self.workers = {}  # pid -> generation
+        self._stopping = False
+        self._reload = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.sock, self.host, self.port, self.threaded, self.graceful_timeout)
+            except Exception:
+                logging.exception("worker crashed")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self.workers[pid] = self.generation
+        return pid
+
+    def load(self):
+        import web_app
+        from model_registry import model_stamp
+        stamp = model_stamp(web_app.MODEL_PATH)
+        web_app.warm_up()
+        # Objects loaded so far are never freed; keep the collector from touching
+        # (and so un-sharing) their pages in the workers
+        gc.freeze()
+        return stamp
+
+    def reload(self):
+        import web_app
+        old = [pid for pid, gen in self.workers.items() if gen == self.generation]
+        try:
+            self.stamp = self.load()
+        except Exception as e:
+            print(f"[serve] model reload failed, old workers keep serving: {e}", flush=True)
+            return
+        self.generation += 1
+        for _ in range(self.n_workers):
+            self.spawn()
+        for pid in old:
+            self._signal(pid, signal.SIGTERM)
+        print(f"[serve] reloaded model {web_app.readiness['fingerprint'][:12]}, "
+              f"generation {self.generation}", flush=True)
+
+    def _signal(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self):
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            gen = self.workers.pop(pid, None)
+            if gen == self.generation and not self._stopping:
+                print(f"[serve] worker {pid} exited unexpectedly (status {status}), restarting", flush=True)
+                self.spawn()
+
+    def _model_changed(self):
+        import web_app
+        from model_registry import model_stamp
+        try:
+            stamp = model_stamp(web_app.MODEL_PATH)
+        except OSError:
+            return False  # being replaced right now; check again next tick
+        if stamp != self.stamp:
+            # Also remembered on a failed load, so a broken file is not retried every tick
+            self.stamp = stamp
+            return True
+        return False
+
+    def run(self):
+        import web_app
+        self.stamp = self.load()
+        if web_app.result_cache is not None:
+            web_app.result_cache.close()  # the master serves nothing; workers open their own
+        for _ in range(self.n_workers):
+            self.spawn()
+        print(f"[serve] master {os.getpid()}: {self.n_workers} workers on http://{self.host}:{self.port}, "
+              f"model {web_app.MODEL_PATH}", flush=True)
+
+        def stop(signum, frame):
+            self._stopping = True
+
+        def hup(signum, frame):
+            self._reload = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, hup)
+
+        last_check = time.time()
+        while not self._stopping:
+            time.sleep(0.2)
+            self._reap()
+            if self.reload_interval and time.time() - last_check >= self.reload_interval:
+                last_check = time.time()
+                if self._model_changed():
+                    self._reload = True
+            if self._reload:
+                self._reload = False
+                self.reload()
+
+        print("[serve] shutting down", flush=True)
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.time() + self.graceful_timeout + 5
+        while self.workers and time.time() < deadline:
+            time.sleep(0.1)
+            self._reap()
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGKILL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-forking production server for the web app")
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--model', default=os.environ.get('MODEL_PATH'), help='Model artifact (.joblib or .flat dir)')
+    parser.add_argument('--threaded', action='store_true', help='One thread per request inside each worker')
+    parser.add_argument('--reload_interval', type=float, default=2.0,
+                        help='Seconds between model file checks (0 = only reload on SIGHUP)')
+    parser.add_argument('--graceful_timeout', type=float, default=30)
+    parser.add_argument('--access_log', action='store_true')
+    args = parser.parse_args()
+
+    # web_app reads its settings from the environment at import time
+    if args.model:
+        os.environ['MODEL_PATH'] = os.path.abspath(args.model)
+    # Job status and /metrics are per process; share them through directories
+    shared_dirs = []
+    for var, prefix in (('JOB_STATE_DIR', 'personality-jobs-'), ('METRICS_DIR', 'personality-metrics-')):
+        if args.workers > 1 and not os.environ.get(var):
+            os.environ[var] = tempfile.mkdtemp(prefix=prefix)
+            shared_dirs.append(os.environ[var])
+    if not args.access_log:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    Master(sock, args.host, args.port, args.workers, args.threaded,
+           args.reload_interval, args.graceful_timeout).run()
+    sock.close()
+    for path in shared_dirs:
+        shutil.rmtree(path, ignore_errors=True)
+    # The stem cache is saved at exit by the workers that filled it; the
+    # master's copy is the stale one it loaded at startup
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
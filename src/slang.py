@@ -0,0 +1,157 @@
+import os
+import re
+import json
+import marshal
+
+_WORD_RE = re.compile(r'\w+')
+# Bump when the compiled layout changes so stale caches are rebuilt
+_FORMAT_VERSION = 1
+
+
+def parse_slang(text):
+    """Parse slang source text into {slang: formal}.
+
+    Accepts a JSON object (the format of ``slangwords.txt``) or one
+    ``slang:formal`` pair per line.
+    """
+    stripped = text.strip()
+    if stripped.startswith('{'):
+        return json.loads(stripped)
+    pairs = {}
+    for line in stripped.splitlines():
+        if line.strip() and ':' in line:
+            slang, formal = line.strip().split(':', 1)
+            pairs[slang.strip()] = formal.strip()
+    return pairs
+
+
+class SlangLexicon(object):
+    """Slang table compiled for token streams.
+
+    Keys and values are split into word tokens the same way texts are, so
+    a key such as ``"ajep ajep"`` (or ``"bo'ong"``) is matched as a token
+    phrase. Single-token keys live in a plain dict; multi-token keys in a
+    trie of nested dicts, where the ``None`` key holds a phrase's
+    replacement. Matching is greedy longest-match.
+    """
+
+    def __init__(self, words, phrases):
+        self.words = words      # token -> tuple of replacement tokens
+        self.phrases = phrases  # trie: token -> {token: ..., None: replacement}
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        words, phrases = {}, {}
+        for key, value in mapping.items():
+            key_toks = _WORD_RE.findall(key.lower())
+            if not key_toks:
+                continue
+            replacement = tuple(_WORD_RE.findall(value.lower()))
+            if len(key_toks) == 1:
+                words[key_toks[0]] = replacement
+            else:
+                node = phrases
+                for tok in key_toks:
+                    node = node.setdefault(tok, {})
+                node[None] = replacement
+        return cls(words, phrases)
+
+    def __len__(self):
+        def count(node):
+            return sum(count(child) if tok is not None else 1 for tok, child in node.items())
+        return len(self.words) + count(self.phrases)
+
+    def __contains__(self, tok):
+        return tok in self.words
+
+    def get(self, tok, default=None):
+        # dict-style lookup for single tokens, kept for normalize_token()
+        replacement = self.words.get(tok)
+        if replacement is None:
+            return default
+        return ' '.join(replacement)
+
+    def normalize(self, tokens):
+        """Yield tokens with slang words and phrases replaced."""
+        words = self.words
+        phrases = self.phrases
+        it = iter(tokens)
+        lookahead = []
+        while True:
+            if lookahead:
+                tok = lookahead.pop(0)
+            else:
+                tok = next(it, None)
+                if tok is None:
+                    return
+            node = phrases.get(tok)
+            if node is not None:
+                # Walk the trie, remembering the longest complete phrase
+                best, best_len, i = None, 0, 0
+                while True:
+                    if i == len(lookahead):
+                        nxt = next(it, None)
+                        if nxt is None:
+                            break
+                        lookahead.append(nxt)
+                    node = node.get(lookahead[i])
+                    if node is None:
+                        break
+                    i += 1
+                    if None in node:
+                        best, best_len = node[None], i
+                if best is not None:
+                    del lookahead[:best_len]
+                    yield from best
+                    continue
+            replacement = words.get(tok)
+            if replacement is None:
+                yield tok
+            else:
+                yield from replacement
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def compile_lexicon(path, cache_path):
+    with open(path, encoding='utf-8') as f:
+        lexicon = SlangLexicon.from_mapping(parse_slang(f.read()))
+    payload = {
+        'format': _FORMAT_VERSION,
+        'marshal': marshal.version,
+        'source': _source_stamp(path),
+        'words': lexicon.words,
+        'phrases': lexicon.phrases,
+    }
+    try:
+        tmp = cache_path + '.tmp'
+        with open(tmp, 'wb') as f:
+            marshal.dump(payload, f)
+        os.replace(tmp, cache_path)
+    except OSError:
+        pass  # read-only checkout: just use the in-memory copy
+    return lexicon
+
+
+def load_lexicon(path, cache_path=None):
+    """Load a slang lexicon, using the compiled cache when it is current.
+
+    The cache (default: ``<source>.lexicon`` beside the source) is a marshal
+    dump of plain dicts and tuples, so loading it only deserializes data.
+    It is rebuilt whenever the source file's mtime or size changes.
+    """
+    if cache_path is None:
+        cache_path = os.path.splitext(path)[0] + '.lexicon'
+    try:
+        with open(cache_path, 'rb') as f:
+            payload = marshal.load(f)
+        if (payload.get('format') == _FORMAT_VERSION
+                and payload.get('marshal') == marshal.version
+                and payload.get('source') == _source_stamp(path)):
+            return SlangLexicon(payload['words'], payload['phrases'])
+    except (OSError, EOFError, ValueError, TypeError, AttributeError):
+        pass
+    return compile_lexicon(path, cache_path)
@@ -0,0 +1,183 @@
+import os
+import json
+import atexit
+import threading
+from collections import OrderedDict
+
+import metrics
+
+
+class StemCache(object):
+    """Bounded LRU cache of token -> stem in front of a Sastrawi stemmer.
+
+    Chat vocabulary is Zipf-distributed, so a modest cache answers most
+    lookups without running Sastrawi's affix removal. ``hits``/``misses``
+    are kept for monitoring and the cache can be saved to and loaded from
+    disk so it stays warm across restarts.
+
+    An optional precomputed ``table`` (see stem_table.py) is checked first,
+    without the lock; only tokens missing from it (``oov``) reach the LRU.
+    """
+
+    def __init__(self, stemmer, maxsize=100000, table=None):
+        self._stemmer = stemmer
+        self._stem = stemmer.stem
+        self.maxsize = maxsize
+        self.path = None  # where create_cached_stemmer saves it at exit
+        self.table = table if table is not None else {}
+        self.table_hits = 0
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stem(self, token):
+        stem = self.table.get(token)
+        if stem is not None:
+            # Unlocked: a lost increment between threads only skews the gauge
+            self.table_hits += 1
+            return stem
+        with self._lock:
+            stem = self._cache.get(token)
+            if stem is not None:
+                self._cache.move_to_end(token)
+                self.hits += 1
+                return stem
+            self.misses += 1
+        # Sastrawi only runs on a miss; its time is the 'stem' stage
+        with metrics.timer('stem'):
+            stem = self._stem(token)
+        with self._lock:
+            self._cache[token] = stem
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return stem
+
+    def preload(self):
+        """Load a lazy backend now (e.g. before forking server workers)."""
+        load = getattr(self._stemmer, 'load', None)
+        if load is not None:
+            load()
+
+    def __contains__(self, token):
+        return token in self.table or token in self._cache
+
+    def update(self, pairs):
+        """Insert precomputed (token, stem) pairs, e.g. stemmed by worker processes."""
+        with self._lock:
+            for token, stem in pairs:
+                self._cache[token] = stem
+                self._cache.move_to_end(token)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        lookups = total + self.table_hits
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._cache),
+            'maxsize': self.maxsize,
+            'table_size': len(self.table),
+            'table_hits': self.table_hits,
+            'oov': total,
+            'oov_rate': total / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        """Empty the LRU and reset the counters; the precomputed table stays."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = self.table_hits = 0
+
+    def save(self, path):
+        with self._lock:
+            items = list(self._cache.items())
+        # Per-process temp name: forked server workers may save at the same time
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(items, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        with open(path, encoding='utf-8') as f:
+            items = json.load(f)
+        with self._lock:
+            # Saved oldest-first, so the most recent entries survive truncation
+            for token, stem in items[-self.maxsize:]:
+                self._cache[token] = stem
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+
+class SetDictionary(object):
+    """Sastrawi dictionary backed by a set.
+
+    Sastrawi's ``ArrayDictionary`` keeps the ~30k root words in a list, so
+    each of the many ``contains`` calls per stemmed word is a linear scan.
+    """
+
+    def __init__(self, words=None):
+        self.words = set()
+        if words:
+            self.add_words(words)
+
+    def contains(self, word):
+        return word in self.words
+
+    def count(self):
+        return len(self.words)
+
+    def add_words(self, words):
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if word and word.strip():
+            self.words.add(word)
+
+
+class _LazySastrawi(object):
+    # Builds the Sastrawi stemmer (imports + root dictionary) on the first
+    # cache miss, so a process with a warm cache may never need it
+    def __init__(self):
+        self._stemmer = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._stemmer is None:
+            with self._lock:
+                if self._stemmer is None:
+                    from Sastrawi.Stemmer.StemmerFactory import StemmerFactory
+                    from Sastrawi.Stemmer.Stemmer import Stemmer
+                    words = StemmerFactory().get_words()
+                    self._stemmer = Stemmer(SetDictionary(words))
+        return self._stemmer
+
+    def stem(self, token):
+        return (self._stemmer or self.load()).stem(token)
+
+
+def create_cached_stemmer(maxsize=100000, cache_path=None, table_path=None):
+    """Sastrawi stemmer behind a StemCache.
+
+    The plain ``Stemmer`` is used instead of ``StemmerFactory.create_stemmer``
+    because the latter wraps it in an unbounded dict cache. Sastrawi itself
+    is loaded lazily on the first miss. If ``cache_path`` is given the cache
+    is warmed from it and written back at exit. ``table_path`` is a stem
+    table built by stem_table.py; it is skipped if missing or built with
+    another Sastrawi version.
+    """
+    table = None
+    if table_path:
+        from stem_table import load_stem_table
+        table = load_stem_table(table_path)
+    cache = StemCache(_LazySastrawi(), maxsize=maxsize, table=table)
+    if cache_path:
+        cache.path = cache_path
+        if os.path.exists(cache_path):
+            cache.load(cache_path)
+        atexit.register(cache.save, cache_path)
+    return cache
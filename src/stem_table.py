@@ -0,0 +1,125 @@
+import argparse
+import csv
+import importlib.util
+import os
+import re
+import time
+
+_WORD_RE = re.compile(r'\w+')
+_HEADER = '# stem table: sastrawi '
+
+
+def sastrawi_version():
+    """Installed Sastrawi version, or None if it is not installed."""
+    # Read from the dist-info folder name: importlib.metadata alone costs
+    # ~50 ms of imports on every startup that loads the table
+    spec = importlib.util.find_spec('Sastrawi')
+    if spec is None or not spec.origin:
+        return None
+    site = os.path.dirname(os.path.dirname(spec.origin))
+    for name in os.listdir(site):
+        if name.lower().startswith('sastrawi-') and name.endswith(('.dist-info', '.egg-info')):
+            return name[len('sastrawi-'):].rsplit('.', 1)[0]
+    from importlib.metadata import version
+    return version('Sastrawi')
+
+
+def corpus_words(paths):
+    """Distinct tokens of the texts in ``paths`` as the stemmer sees them.
+
+    ``.csv`` files are read from their ``text`` column, anything else as a
+    WhatsApp export. Tokens go through slang normalization first, like in
+    ``preprocess_text``, so the table holds the forms that actually get
+    stemmed.
+    """
+    from chat_utils import iter_chat_records
+    from preprocessing import SLANG
+    from text_pipeline import raw_tokens
+    words = set()
+    for path in paths:
+        if path.endswith('.csv'):
+            with open(path, newline='', encoding='utf-8') as f:
+                texts = [row['text'] for row in csv.DictReader(f)]
+        else:
+            texts = [message for _, _, message in iter_chat_records(path)]
+        for text in texts:
+            words.update(SLANG.normalize(raw_tokens(text)))
+    return words
+
+
+def reference_words(paths):
+    """Corpus tokens plus Sastrawi's root words, the slang targets and the stopwords."""
+    from Sastrawi.Stemmer.StemmerFactory import StemmerFactory
+    from preprocessing import BASE_DIR, STOPWORDS
+    from slang import parse_slang
+    words = corpus_words(paths)
+    words.update(w for w in StemmerFactory().get_words() if _WORD_RE.fullmatch(w.lower()))
+    with open(os.path.join(BASE_DIR, 'slangwords.txt'), encoding='utf-8') as f:
+        for formal in parse_slang(f.read()).values():
+            words.update(_WORD_RE.findall(formal.lower()))
+    words.update(w.lower() for w in STOPWORDS if _WORD_RE.fullmatch(w.lower()))
+    # The pipeline never stems digits or mixed-case tokens
+    return {w.lower() for w in words if not w.isdigit()}
+
+
+def build_stem_table(words, stem):
+    return {word: stem(word) for word in sorted(words)}
+
+
+def save_stem_table(path, table, version):
+    """One ``word`` (stems to itself) or ``word<TAB>stem`` line per entry."""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(f'{_HEADER}{version}\n')
+        for word in sorted(table):
+            s = table[word]
+            f.write(f'{word}\n' if s == word else f'{word}\t{s}\n')
+    os.replace(tmp, path)
+
+
+def load_stem_table(path):
+    """{word: stem} from a built table, or None if the file is missing or stale.
+
+    A table built with a different Sastrawi version than the installed one
+    is ignored, since its stems may no longer match the live stemmer.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            header = f.readline()
+            if not header.startswith(_HEADER):
+                return None
+            built_with = header[len(_HEADER):].strip()
+            installed = sastrawi_version()
+            if installed is not None and installed != built_with:
+                return None
+            table = {}
+            for line in f:
+                word, _, s = line.rstrip('\n').partition('\t')
+                table[word] = s if _ else word
+    except OSError:
+        return None
+    return table
+
+
+def main():
+    from preprocessing import BASE_DIR
+    from stem_cache import create_cached_stemmer
+    data_dir = os.path.join(BASE_DIR, 'data')
+    default_corpus = sorted(os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith(('.txt', '.csv')))
+    parser = argparse.ArgumentParser(description="Precompute Sastrawi stems for the reference vocabulary")
+    parser.add_argument('--corpus', nargs='*', default=default_corpus,
+                        help='Chat exports (.txt) or CSVs with a text column (default: data/*)')
+    parser.add_argument('--out', default=os.path.join(BASE_DIR, 'stem_table.txt'))
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    words = reference_words(args.corpus)
+    # A fresh stemmer without any table: every entry comes from live Sastrawi
+    table = build_stem_table(words, create_cached_stemmer(maxsize=0).stem)
+    save_stem_table(args.out, table, sastrawi_version())
+    changed = sum(1 for w, s in table.items() if s != w)
+    print(f"{len(table):,} words ({changed:,} with a different stem) in {time.perf_counter() - start:.1f} s -> {args.out}")
+
+
+if __name__ == '__main__':
+    main()
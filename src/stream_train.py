@@ -0,0 +1,249 @@
+import os
+import csv
+import time
+import shutil
+
+import numpy as np
+import scipy.sparse as sp
+
+from preprocessing import simple_preprocess
+from hashed_features import HashedTfidf
+from corpus_cache import imap_cached, open_corpus_cache
+from model import TRAIT_NAMES
+
+
+def iter_csv_chunks(csv_path, chunk_size, trait_names=TRAIT_NAMES, stats=None):
+    """Yield (texts, labels) lists of up to ``chunk_size`` labeled rows.
+
+    Rows with a missing or non-integer label are skipped and counted in
+    ``stats['skipped']``.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault('skipped', 0)
+    texts, labels = [], []
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            try:
+                labels.append([int(row[t]) for t in trait_names])
+            except (KeyError, TypeError, ValueError):
+                stats['skipped'] += 1
+                continue
+            texts.append(row.get('text') or '')
+            if len(texts) >= chunk_size:
+                yield texts, labels
+                texts, labels = [], []
+    if texts:
+        yield texts, labels
+
+
+def balanced_class_weights(label_counts, n_rows):
+    # Same formula as class_weight='balanced', which partial_fit does not accept
+    weights = []
+    for pos in label_counts:
+        pos, neg = int(pos), int(n_rows - pos)
+        weights.append({0: n_rows / (2.0 * neg), 1: n_rows / (2.0 * pos)} if pos and neg else None)
+    return weights
+
+
+def as_multioutput(estimators):
+    # The same object train_classifier saves, so predict_with_model/_score work unchanged
+    from sklearn.multioutput import MultiOutputClassifier
+    clf = MultiOutputClassifier(estimators[0], n_jobs=1)
+    clf.estimators_ = estimators
+    return clf
+
+
+class StreamingTrainer(object):
+    """Out-of-core trainer producing the same artifact as ``train_classifier``.
+
+    Pass 1 reads the CSV in chunks, preprocesses them on ``n_jobs``
+    processes, hashes them with ``HashedTfidf`` (a vocabulary cannot be
+    built in one pass) and spools the raw counts to ``spool_dir`` while
+    summing document frequencies; every ``holdout_every``-th row is kept
+    apart for validation. Pass 2 trains one ``SGDClassifier`` with logistic
+    loss per trait by ``partial_fit`` over the spooled chunks, shuffled per
+    epoch, so text is preprocessed once however many epochs run.
+
+    The whole state (idf counts, estimators, position) is checkpointed to
+    ``spool_dir/checkpoint.joblib`` every ``checkpoint_every`` chunks, and
+    ``run(resume=True)`` continues from it.
+    """
+
+    def __init__(self, csv_path, model_out='personality_clf.joblib', chunk_size=50000, epochs=3,
+                 n_jobs=1, alpha=1e-5, holdout_every=20, checkpoint_every=10, spool_dir=None,
+                 seed=42, trait_names=TRAIT_NAMES, corpus_cache=True):
+        self.csv_path = csv_path
+        self.model_out = model_out
+        self.chunk_size = chunk_size
+        self.epochs = epochs
+        self.n_jobs = n_jobs
+        self.alpha = alpha
+        self.holdout_every = holdout_every
+        self.checkpoint_every = checkpoint_every
+        self.spool_dir = spool_dir or model_out + '.spool'
+        self.seed = seed
+        self.trait_names = list(trait_names)
+        self.corpus_cache = corpus_cache
+        self.state = None
+
+    def _fresh_state(self):
+        return {
+            'stage': 'spool',
+            'vec': HashedTfidf(ngram_range=(1, 2), lowercase=True, sublinear_tf=True, token_pattern=r'\b\w+\b'),
+            'csv_chunks': 0,     # CSV chunks spooled
+            'train_files': [],   # chunk indices that have a train-<i> file
+            'holdout_files': [],
+            'rows': 0,           # labeled rows read
+            'train_rows': 0,
+            'label_counts': np.zeros(len(self.trait_names), dtype=np.int64),
+            'skipped': 0,
+            'estimators': None,
+            'epoch': 0,
+            'step': 0,           # train files done in the current epoch
+        }
+
+    def _file(self, kind, i):
+        return os.path.join(self.spool_dir, f"{kind}-{i:06d}")
+
+    def _save_chunk(self, kind, i, X, y):
+        sp.save_npz(self._file(kind, i) + '.npz', X)
+        np.save(self._file(kind, i) + '.npy', y)
+
+    def _load_chunk(self, kind, i):
+        X = sp.load_npz(self._file(kind, i) + '.npz').astype(np.float64)
+        return X, np.load(self._file(kind, i) + '.npy')
+
+    def checkpoint(self):
+        import joblib
+        path = os.path.join(self.spool_dir, 'checkpoint.joblib')
+        joblib.dump(self.state, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    def _load_checkpoint(self):
+        import joblib
+        path = os.path.join(self.spool_dir, 'checkpoint.joblib')
+        return joblib.load(path) if os.path.exists(path) else None
+
+    def _spool(self):
+        st = self.state
+        vec = st['vec']
+        stats = {'skipped': 0}
+        # On resume, chunks spooled before the checkpoint are read but not preprocessed
+        chunks = (c for i, c in enumerate(iter_csv_chunks(self.csv_path, self.chunk_size, self.trait_names, stats))
+                  if i >= st['csv_chunks'])
+        start, start_rows = time.time(), st['rows']
+        cache = open_corpus_cache(self.corpus_cache)
+        for processed, labels in imap_cached(simple_preprocess, chunks, cache, self.n_jobs):
+            i = st['csv_chunks']
+            y = np.asarray(labels, dtype=np.int8)
+            counts = vec.hasher.transform(processed).astype(np.float32)
+            held = np.zeros(len(y), dtype=bool)
+            if self.holdout_every:
+                held = np.arange(st['rows'], st['rows'] + len(y)) % self.holdout_every == 0
+            if (~held).any():
+                X_train, y_train = counts[~held], y[~held]
+                self._save_chunk('train', i, X_train, y_train)
+                vec.add_counts(X_train)
+                st['label_counts'] += y_train.sum(axis=0)
+                st['train_rows'] += len(y_train)
+                st['train_files'].append(i)
+            if held.any():
+                self._save_chunk('holdout', i, counts[held], y[held])
+                st['holdout_files'].append(i)
+            st['rows'] += len(y)
+            st['csv_chunks'] += 1
+            elapsed = max(time.time() - start, 1e-9)
+            print(f"  spooled {st['rows']} rows ({(st['rows'] - start_rows) / elapsed:.0f} rows/s)")
+            if st['csv_chunks'] % self.checkpoint_every == 0:
+                self.checkpoint()
+        st['skipped'] += stats['skipped']
+        if not st['train_rows']:
+            raise ValueError(f"No labeled rows in {self.csv_path}")
+        st['stage'] = 'train'
+        self.checkpoint()
+
+    def _train(self):
+        from sklearn.linear_model import SGDClassifier
+        st = self.state
+        vec = st['vec']
+        if st['estimators'] is None:
+            weights = balanced_class_weights(st['label_counts'], st['train_rows'])
+            st['estimators'] = [SGDClassifier(loss='log_loss', alpha=self.alpha, class_weight=weights[j],
+                                               random_state=self.seed + j)
+                                for j in range(len(self.trait_names))]
+        classes = np.array([0, 1])
+        while st['epoch'] < self.epochs:
+            # Seeded per epoch (and per chunk below) so a resumed run replays the same order
+            order = np.random.RandomState(self.seed + st['epoch']).permutation(st['train_files'])
+            for i in order[st['step']:]:
+                X, y = self._load_chunk('train', i)
+                X = vec.weight_counts(X)
+                perm = np.random.RandomState([self.seed, st['epoch'], int(i)]).permutation(X.shape[0])
+                X, y = X[perm], y[perm]
+                for j, est in enumerate(st['estimators']):
+                    est.partial_fit(X, y[:, j], classes=classes)
+                st['step'] += 1
+                if st['step'] % self.checkpoint_every == 0:
+                    self.checkpoint()
+            st['epoch'] += 1
+            st['step'] = 0
+            print(f"  epoch {st['epoch']}/{self.epochs} done")
+            self.checkpoint()
+        st['stage'] = 'done'
+
+    def evaluate(self, clf):
+        from sklearn.metrics import classification_report
+        files = self.state['holdout_files']
+        if not files:
+            return
+        X, y = zip(*(self._load_chunk('holdout', i) for i in files))
+        X = self.state['vec'].weight_counts(sp.vstack(X).tocsr())
+        y = np.vstack(y)
+        print(f"\nHoldout: {len(y)} rows")
+        print(classification_report(y, clf.predict(X), target_names=self.trait_names, zero_division=0))
+
+    def run(self, resume=False, flat_out=None, keep_spool=False):
+        import joblib
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.state = self._load_checkpoint() if resume else None
+        if self.state is None:
+            self.state = self._fresh_state()
+        else:
+            print(f"Resuming from checkpoint: stage={self.state['stage']} rows={self.state['rows']} "
+                  f"epoch={self.state['epoch']} step={self.state['step']}")
+
+        if self.state['stage'] == 'spool':
+            print(f"Pass 1: spooling {self.csv_path} in chunks of {self.chunk_size} (n_jobs={self.n_jobs})")
+            self._spool()
+            print(f"Train rows: {self.state['train_rows']}, holdout rows: "
+                  f"{self.state['rows'] - self.state['train_rows']}, skipped rows: {self.state['skipped']}")
+        if self.state['stage'] == 'train':
+            print(f"Pass 2: training for {self.epochs} epochs")
+            self._train()
+
+        clf = as_multioutput(self.state['estimators'])
+        self.evaluate(clf)
+        data = {
+            'vec': self.state['vec'],
+            'clf': clf,
+            'preprocess_func': simple_preprocess,
+            'trait_names': self.trait_names,
+            'features': 'hashing',
+        }
+        joblib.dump(data, self.model_out, compress=3)
+        print(f"\nModel saved to {self.model_out}")
+        if flat_out:
+            from flat_model import export_flat
+            export_flat(data, flat_out)
+            print(f"Flat model saved to {flat_out}")
+        if not keep_spool:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+        return data
+
+
+def train_classifier_streaming(csv_path, model_out='personality_clf.joblib', flat_out=None, resume=False,
+                               keep_spool=False, **options):
+    """Streaming counterpart of ``model.train_classifier``; see ``StreamingTrainer``."""
+    trainer = StreamingTrainer(csv_path, model_out, **options)
+    trainer.run(resume=resume, flat_out=flat_out, keep_spool=keep_spool)
+    return True
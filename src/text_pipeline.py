@@ -0,0 +1,114 @@
+import re
+from itertools import chain
+
+from slang import SlangLexicon
+
+# Texts without "http" only need mentions/hashtags skipped. Capturing the
+# word group makes findall return '' for the skipped matches.
+_WORD_RE = re.compile(r'[@#]\w+|(\w+)')
+# The old chain removed URLs before anything else, so when a text contains
+# "http" a word or mention must stop where a URL would have started.
+_URL_WORD_RE = re.compile(r'http\S+|[@#](?:(?!http\S)\w)+|((?:(?!http\S)\w)+)')
+_PLAIN_WORD_RE = re.compile(r'\w+')
+
+NEGATIONS = frozenset({'tidak', 'bukan', 'nggak', 'gak', 'tdk', 'tak'})
+BASIC_STOPS = frozenset({'dan', 'atau', 'di', 'ke', 'dari', 'pada', 'dalam', 'untuk', 'dengan', 'yang', 'ini', 'itu'})
+
+
+def raw_tokens(text):
+    """Lowercased word tokens with URLs, @mentions and #hashtags removed.
+
+    Same tokens as ``re.sub`` for URLs, then mentions, then
+    ``re.findall(r'\\w+', text.lower())`` -- but in a single scan.
+    """
+    pattern = _URL_WORD_RE if 'http' in text else _WORD_RE
+    for tok in pattern.findall(text):
+        if not tok:
+            continue
+        low = tok.lower()
+        if len(low) == len(tok):
+            yield low
+        else:
+            # Lowercasing can add combining marks (e.g. 'İ'), which split words
+            yield from _PLAIN_WORD_RE.findall(low)
+
+
+class TextPipeline(object):
+    """Compiled preprocessing: scan, slang, negation, stem and stopwords in one pass.
+
+    ``tokens`` yields the same stream as the old
+    tokenize -> apply_negation -> stem -> stopword chain, without building
+    the intermediate lists. ``slang`` is a SlangLexicon or a plain
+    {slang: formal} dict; multi-word replacements become separate tokens.
+    """
+
+    def __init__(self, slang=None, stopwords=frozenset(), stemmer=None, negations=NEGATIONS, window=3):
+        if not isinstance(slang, SlangLexicon):
+            slang = SlangLexicon.from_mapping(slang or {})
+        self.slang = slang
+        self.stopwords = stopwords
+        self.stemmer = stemmer
+        self.negations = negations
+        self.window = window
+
+    def tagged_tokens(self, text):
+        """Yield (token, negated) after slang normalization and negation tagging."""
+        return self._tag(raw_tokens(text))
+
+    def _tag(self, raw, state=None):
+        negations = self.negations
+        window = self.window
+        remaining = state[0] if state else 0
+        for tok in self.slang.normalize(raw):
+            if remaining:
+                # A negation word inside another's window does not restart it
+                remaining -= 1
+                yield tok, True
+            else:
+                if tok in negations:
+                    remaining = window
+                yield tok, False
+        if state:
+            state[0] = remaining
+
+    def tokens(self, text):
+        return self._stem(self.tagged_tokens(text))
+
+    def tokens_from_messages(self, messages):
+        """Tokens of ``' '.join(messages)``, streamed without building the string."""
+        return self._stem(self._tag(chain.from_iterable(map(raw_tokens, messages))))
+
+    def message_tokens(self, raw, state):
+        """Tokens of one message given its ``raw_tokens``, for messages fed one at a time.
+
+        ``state`` (start with ``[0]``) carries an open negation window over to
+        the next message, so a user's messages give the same tokens as
+        ``tokens_from_messages`` except that slang phrases do not span two
+        messages. Consume the result fully before the next call.
+        """
+        return self._stem(self._tag(raw, state))
+
+    def _stem(self, tagged):
+        stem = self.stemmer.stem
+        stopwords = self.stopwords
+        for tok, negated in tagged:
+            if not tok or tok.isdigit():
+                continue
+            s = stem(tok)
+            if s in stopwords:
+                continue
+            yield 'NOT_' + s if negated else s
+
+    def __call__(self, text):
+        return list(self.tokens(text))
+
+
+def simple_tokens(text, stops=BASIC_STOPS, min_len=3):
+    return simple_filter(raw_tokens(text), stops, min_len)
+
+
+def simple_filter(tokens, stops=BASIC_STOPS, min_len=3):
+    # simple_tokens for text that was already split with raw_tokens
+    for tok in tokens:
+        if len(tok) >= min_len and tok not in stops:
+            yield tok
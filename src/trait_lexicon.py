@@ -0,0 +1,192 @@
+import hashlib
+import json
+import marshal
+import os
+import re
+
+import numpy as np
+import scipy.sparse as sp
+
+_WORD_RE = re.compile(r'\w+')
+# Bump when the compiled layout changes so stale caches are rebuilt
+_FORMAT_VERSION = 1
+NEG_PREFIX = 'NOT_'
+
+
+def parse_trait_lexicon(text):
+    """Parse lexicon source into [(term, trait, weight)].
+
+    Accepts a JSON object ``{trait: [word, ...]}`` or ``{trait: {word: weight}}``,
+    or one ``term trait [weight]`` entry per line (``#`` starts a comment,
+    weight defaults to 1). Terms written as ``NOT_word`` apply to negated
+    occurrences of the word.
+    """
+    stripped = text.strip()
+    entries = []
+    if stripped.startswith('{'):
+        for trait, words in json.loads(stripped).items():
+            if isinstance(words, dict):
+                entries.extend((term, trait, float(w)) for term, w in words.items())
+            else:
+                entries.extend((term, trait, 1.0) for term in words)
+        return entries
+    for line in stripped.splitlines():
+        parts = line.split('#', 1)[0].replace(',', ' ').split()
+        if len(parts) >= 2:
+            entries.append((parts[0], parts[1], float(parts[2]) if len(parts) > 2 else 1.0))
+    return entries
+
+
+class TraitLexicon(object):
+    """Weighted trait lexicon compiled to a sparse term x trait matrix.
+
+    Terms are stemmed with the same stemmer as the texts, so ``vocabulary``
+    (stem -> row of ``weights``) lines up with the pipeline's tokens,
+    including the ``NOT_`` forms of negated words. Unless the lexicon lists
+    ``NOT_word`` itself, a negated word gets ``negated_weight`` times the
+    word's weight (default -1: "tidak senang" counts against extraversion).
+    A batch of documents is scored with one sparse matmul of their term
+    counts against ``weights``.
+    """
+
+    def __init__(self, traits, vocabulary, weights):
+        self.traits = traits          # column order of ``weights``
+        self.vocabulary = vocabulary  # term -> row
+        self.weights = weights        # CSR, (n_terms, n_traits)
+        # row + 1, so that filter(None, ...) can drop the misses
+        self._ids = {term: i + 1 for term, i in vocabulary.items()}
+        self._fingerprint = None
+
+    @classmethod
+    def from_entries(cls, entries, stem=None, traits=None, negated_weight=-1.0):
+        table = {}  # (term, trait) -> weight
+        explicit_neg = set()
+        order = list(traits or [])
+        for term, trait, weight in entries:
+            negated = term.startswith(NEG_PREFIX)
+            toks = _WORD_RE.findall((term[len(NEG_PREFIX):] if negated else term).lower())
+            if len(toks) != 1:
+                continue  # terms are single words; the pipeline has no phrases after stemming
+            s = stem(toks[0]) if stem is not None else toks[0]
+            if negated:
+                s = NEG_PREFIX + s
+                explicit_neg.add((s, trait))
+            if trait not in order:
+                if traits:
+                    continue
+                order.append(trait)
+            # Several forms of one word can share a stem; keep the strongest weight
+            prev = table.get((s, trait))
+            if prev is None or abs(weight) > abs(prev):
+                table[(s, trait)] = weight
+        if negated_weight:
+            for (s, trait), weight in list(table.items()):
+                key = (NEG_PREFIX + s, trait)
+                if not s.startswith(NEG_PREFIX) and key not in explicit_neg:
+                    table[key] = weight * negated_weight
+
+        vocabulary = {term: i for i, term in enumerate(sorted({s for s, _ in table}))}
+        column = {trait: j for j, trait in enumerate(order)}
+        rows = [vocabulary[s] for s, _ in table]
+        cols = [column[trait] for _, trait in table]
+        return cls(order, vocabulary, _matrix(rows, cols, list(table.values()), len(vocabulary), len(order)))
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def fingerprint(self):
+        """Short hash of the compiled terms and weights, for cache keys."""
+        if self._fingerprint is None:
+            payload = json.dumps(self.to_payload(), sort_keys=True)
+            self._fingerprint = hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+        return self._fingerprint
+
+    def counts_matrix(self, docs):
+        """CSR (n_docs, n_terms) of lexicon term counts; each doc is tokens or a {token: count} dict."""
+        ids = self._ids
+        hits, indptr, counted = [], [0], []
+        for doc in docs:
+            if isinstance(doc, dict):
+                for tok, n in doc.items():
+                    j = ids.get(tok)
+                    if j is not None:
+                        counted.append((len(hits), n))
+                        hits.append(j)
+            else:
+                # Lookup and miss filtering both run in C; only lexicon hits are kept
+                hits.extend(filter(None, map(ids.get, doc)))
+            indptr.append(len(hits))
+        cols = np.asarray(hits, dtype=np.int64) - 1
+        data = np.ones(len(cols))
+        for pos, n in counted:
+            data[pos] = n
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        # COO -> CSR sums the repeated (doc, term) pairs into counts
+        return sp.csr_matrix((data, (rows, cols)), shape=(len(indptr) - 1, len(self.vocabulary)))
+
+    def scores_matrix(self, docs):
+        """Dense (n_docs, n_traits) raw scores."""
+        return (self.counts_matrix(docs) @ self.weights).toarray()
+
+    def to_payload(self):
+        coo = self.weights.tocoo()
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        return {'traits': list(self.traits), 'terms': terms,
+                'rows': coo.row.tolist(), 'cols': coo.col.tolist(), 'weights': coo.data.tolist()}
+
+    @classmethod
+    def from_payload(cls, payload):
+        terms, traits = payload['terms'], payload['traits']
+        vocabulary = {term: i for i, term in enumerate(terms)}
+        return cls(traits, vocabulary,
+                   _matrix(payload['rows'], payload['cols'], payload['weights'], len(terms), len(traits)))
+
+
+def _matrix(rows, cols, weights, n_terms, n_traits):
+    return sp.csr_matrix((np.asarray(weights, dtype=np.float64), (rows, cols)), shape=(n_terms, n_traits))
+
+
+def normalize_scores(scores):
+    """Divide each row by its maximum, negatives clipped to 0; all-zero rows stay 0."""
+    clipped = np.maximum(scores, 0.0)
+    mx = clipped.max(axis=1, keepdims=True)
+    mx[mx == 0] = 1.0
+    return clipped / mx
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def load_trait_lexicon(path, stem=None, version=None, negated_weight=-1.0, cache_path=None):
+    """Load and compile a trait lexicon, using the compiled cache when it is current.
+
+    Stemming every term is the expensive part, so the compiled matrix is
+    kept in ``<source>.lexicon`` (marshal of plain lists) and rebuilt when
+    the source's mtime/size, ``version`` (pass the preprocessing version,
+    since stems depend on it) or ``negated_weight`` change.
+    """
+    if cache_path is None:
+        cache_path = os.path.splitext(path)[0] + '.lexicon'
+    key = [_FORMAT_VERSION, marshal.version, _source_stamp(path), version, negated_weight]
+    try:
+        with open(cache_path, 'rb') as f:
+            payload = marshal.load(f)
+        if payload.get('key') == key:
+            return TraitLexicon.from_payload(payload)
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, KeyError):
+        pass
+
+    with open(path, encoding='utf-8') as f:
+        lexicon = TraitLexicon.from_entries(parse_trait_lexicon(f.read()), stem=stem, negated_weight=negated_weight)
+    payload = lexicon.to_payload()
+    payload['key'] = key
+    try:
+        tmp = f'{cache_path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            marshal.dump(payload, f)
+        os.replace(tmp, cache_path)
+    except OSError:
+        pass  # read-only checkout: just use the in-memory copy
+    return lexicon
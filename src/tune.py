@@ -0,0 +1,251 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import statistics
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model import TRAIT_NAMES, make_classifier, make_vectorizer
+from preprocessing import BASE_DIR, simple_preprocess
+from preprocess_pool import resolve_jobs
+
+# Filled per worker process by _init_worker, so the corpus is sent once per worker
+_DATA = {}
+
+
+def _init_worker(texts, y):
+    warnings.filterwarnings('ignore')
+    _DATA['texts'] = texts
+    _DATA['y'] = y
+
+
+def _logistic(C):
+    # The per-trait estimator of model.make_classifier, so C is tuned for the production solver
+    from sklearn.base import clone
+    return clone(make_classifier(C=C).estimator)
+
+
+def _fold_task(task):
+    """Fit one vectorizer config on one CV fold, then every trait along the C path."""
+    from sklearn.metrics import f1_score
+    cfg_id, cfg, fold, train_idx, val_idx, Cs = task
+    texts, y = _DATA['texts'], _DATA['y']
+    start = time.perf_counter()
+    vec = make_vectorizer(cfg['features'], **cfg['params'])
+    X_train = vec.fit_transform([texts[i] for i in train_idx])
+    X_val = vec.transform([texts[i] for i in val_idx])
+    vec_s = time.perf_counter() - start
+
+    f1 = np.zeros((len(Cs), y.shape[1]))
+    start = time.perf_counter()
+    for j in range(y.shape[1]):
+        y_train, y_val = y[train_idx, j], y[val_idx, j]
+        if len(np.unique(y_train)) < 2:
+            # Nothing to learn: score the constant prediction
+            f1[:, j] = f1_score(y_val, np.full(len(y_val), y_train[0]), zero_division=0)
+            continue
+        for k, C in enumerate(Cs):
+            clf = _logistic(C).fit(X_train, y_train)
+            f1[k, j] = f1_score(y_val, clf.predict(X_val), zero_division=0)
+    return cfg_id, fold, f1.tolist(), vec_s, time.perf_counter() - start
+
+
+def load_csv(path):
+    texts, labels = [], []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            texts.append(row['text'])
+            labels.append([int(row[t]) for t in TRAIT_NAMES])
+    return texts, np.array(labels)
+
+
+def make_folds(y, n_splits, seed=42):
+    from sklearn.model_selection import KFold, StratifiedKFold
+    # Stratify on the label combination when every combination is frequent enough
+    combos = [''.join(map(str, row)) for row in y]
+    counts = {c: combos.count(c) for c in set(combos)}
+    if min(counts.values()) >= n_splits:
+        splits = StratifiedKFold(n_splits, shuffle=True, random_state=seed).split(y, combos)
+    else:
+        splits = KFold(n_splits, shuffle=True, random_state=seed).split(y)
+    return [(train.tolist(), val.tolist()) for train, val in splits]
+
+
+def vectorizer_grid(features, max_features, ngram_ranges, max_dfs):
+    grid = []
+    for feat in features:
+        if feat == 'hashing':
+            # Hashed features have no vocabulary to cap or prune
+            for ngram in ngram_ranges:
+                grid.append({'features': feat, 'params': {'ngram_range': ngram}})
+        else:
+            for mf, ngram, mdf in itertools.product(max_features, ngram_ranges, max_dfs):
+                grid.append({'features': feat, 'params': {'max_features': mf, 'ngram_range': ngram, 'max_df': mdf}})
+    return grid
+
+
+def footprint(cfg, texts, sample=200, repeat=5):
+    """Flat-artifact size in bytes and median per-text inference latency (µs) for a config."""
+    from fused_scorer import FusedLogistic
+    vec = make_vectorizer(cfg['features'], **cfg['params'])
+    vec.fit_transform(texts)
+    n_features = len(vec.vocabulary_)
+    # float32 idf + 5 coefficient rows (+ intercepts), and the term table when there is one
+    size = n_features * 4 * (1 + len(TRAIT_NAMES)) + len(TRAIT_NAMES) * 4
+    if cfg['features'] != 'hashing':
+        size += sum(len(t.encode('utf-8')) + 1 for t in vec.vocabulary_)
+    scorer = FusedLogistic(np.zeros((len(TRAIT_NAMES), n_features)), np.zeros(len(TRAIT_NAMES)),
+                           [[0, 1]] * len(TRAIT_NAMES))
+    docs = texts[:sample]
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for doc in docs:
+            scorer.scores(vec.transform([doc]))
+        times.append((time.perf_counter() - start) / len(docs) * 1e6)
+    return n_features, size, statistics.median(times)
+
+
+def pareto_front(points):
+    """Indices of points not dominated on (higher macro_f1, lower size, lower latency)."""
+    front = []
+    for i, p in enumerate(points):
+        dominated = any(
+            q['macro_f1'] >= p['macro_f1'] and q['size_bytes'] <= p['size_bytes'] and
+            q['latency_us'] <= p['latency_us'] and
+            (q['macro_f1'] > p['macro_f1'] or q['size_bytes'] < p['size_bytes'] or q['latency_us'] < p['latency_us'])
+            for q in points)
+        if not dominated:
+            front.append(i)
+    return front
+
+
+def run_grid(texts, y, grid, Cs, folds, n_jobs=1):
+    Cs = sorted(Cs)
+    tasks = [(cfg_id, cfg, fold, train, val, Cs)
+             for cfg_id, cfg in enumerate(grid) for fold, (train, val) in enumerate(folds)]
+    n_jobs = resolve_jobs(n_jobs)
+    if n_jobs == 1:
+        _init_worker(texts, y)
+        results = [_fold_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=(texts, y)) as pool:
+            results = list(pool.map(_fold_task, tasks))
+
+    # scores[cfg_id][fold] -> (len(Cs), n_traits)
+    scores = [[None] * len(folds) for _ in grid]
+    timing = [{'vectorize_s': 0.0, 'fit_s': 0.0} for _ in grid]
+    for cfg_id, fold, f1, vec_s, fit_s in results:
+        scores[cfg_id][fold] = np.array(f1)
+        timing[cfg_id]['vectorize_s'] += vec_s
+        timing[cfg_id]['fit_s'] += fit_s
+    return Cs, scores, timing
+
+
+def main():
+    def floats(v):
+        return [float(x) for x in v.split(',')]
+
+    def ints_or_none(v):
+        return [None if x.lower() == 'none' else int(x) for x in v.split(',')]
+
+    def ngrams(v):
+        return [tuple(int(n) for n in x.split('-')) for x in v.split(',')]
+
+    parser = argparse.ArgumentParser(description="Cross-validated grid search over vectorizer settings and C")
+    parser.add_argument('--train_csv', default=os.path.join(BASE_DIR, 'data', 'train.csv'))
+    parser.add_argument('--features', default='tfidf', help='Comma-separated: tfidf,hashing')
+    parser.add_argument('--max_features', type=ints_or_none, default=[500, 1000, 2000, None])
+    parser.add_argument('--ngram_range', type=ngrams, default=[(1, 1), (1, 2)], help='e.g. 1-1,1-2')
+    parser.add_argument('--max_df', type=floats, default=[0.9, 0.98, 1.0])
+    parser.add_argument('--C', type=floats, default=[0.03, 0.1, 0.3, 0.5, 1.0, 3.0, 10.0])
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--n_jobs', type=int, default=1, help='Worker processes (-1 = all cores)')
+    parser.add_argument('--corpus_cache', default=True, help='Preprocessed-row cache ("" to disable)')
+    parser.add_argument('--report', default='tune_report.json')
+    parser.add_argument('--save_best', default=None, help='Retrain the best setting on all rows and save it here')
+    args = parser.parse_args()
+
+    from corpus_cache import open_corpus_cache, preprocess_cached
+    warnings.filterwarnings('ignore')
+    raw, y = load_csv(args.train_csv)
+    texts = preprocess_cached(raw, simple_preprocess, open_corpus_cache(args.corpus_cache), args.n_jobs)
+    grid = vectorizer_grid(args.features.split(','), args.max_features, args.ngram_range, args.max_df)
+    folds = make_folds(y, args.folds)
+    print(f"{len(texts)} rows, {len(grid)} vectorizer configs x {len(args.C)} C values x {len(folds)} folds")
+
+    start = time.perf_counter()
+    Cs, scores, timing = run_grid(texts, y, grid, args.C, folds, args.n_jobs)
+    print(f"Grid done in {time.perf_counter() - start:.1f} s")
+
+    points = []
+    for cfg_id, cfg in enumerate(grid):
+        n_features, size, latency = footprint(cfg, texts)
+        per_fold = np.stack(scores[cfg_id])  # (folds, Cs, traits)
+        for k, C in enumerate(Cs):
+            macro = per_fold[:, k, :].mean(axis=1)
+            points.append({
+                'features': cfg['features'],
+                'vectorizer': {key: (list(v) if isinstance(v, tuple) else v) for key, v in cfg['params'].items()},
+                'C': C,
+                'macro_f1': float(macro.mean()),
+                'macro_f1_std': float(macro.std()),
+                'f1_per_trait': dict(zip(TRAIT_NAMES, per_fold[:, k, :].mean(axis=0).round(4).tolist())),
+                'n_features': n_features,
+                'size_bytes': size,
+                'latency_us': round(latency, 2),
+                'cv_vectorize_s': round(timing[cfg_id]['vectorize_s'], 3),
+                'cv_fit_s': round(timing[cfg_id]['fit_s'], 3),
+            })
+
+    front = pareto_front(points)
+    best = max(range(len(points)), key=lambda i: (points[i]['macro_f1'], -points[i]['size_bytes']))
+    report = {
+        'train_csv': args.train_csv,
+        'rows': len(texts),
+        'folds': len(folds),
+        'C_path': Cs,
+        'results': points,
+        'pareto_front': front,
+        'best': best,
+    }
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n=== Pareto front (macro-F1 vs size vs latency), {len(front)} of {len(points)} ===")
+    print(f"{'features':<8} {'vectorizer':<52} {'C':>6} {'macroF1':>8} {'±':>6} {'size KB':>8} {'µs/text':>8}")
+    for i in sorted(front, key=lambda i: -points[i]['macro_f1']):
+        p = points[i]
+        mark = ' *' if i == best else ''
+        print(f"{p['features']:<8} {json.dumps(p['vectorizer']):<52} {p['C']:>6g} {p['macro_f1']:8.3f} "
+              f"{p['macro_f1_std']:6.3f} {p['size_bytes'] / 1024:8.1f} {p['latency_us']:8.1f}{mark}")
+    print(f"\nReport written to {args.report}")
+
+    if args.save_best:
+        save_best(points[best], texts, y, args.save_best)
+
+
+def save_best(point, texts, y, model_out):
+    import joblib
+    params = {k: (tuple(v) if isinstance(v, list) else v) for k, v in point['vectorizer'].items()}
+    vec = make_vectorizer(point['features'], **params)
+    X = vec.fit_transform(texts)
+    clf = make_classifier(C=point['C']).fit(X, y)
+    joblib.dump({
+        'vec': vec,
+        'clf': clf,
+        'preprocess_func': simple_preprocess,
+        'trait_names': TRAIT_NAMES,
+        'features': point['features'],
+        'tuning': point,
+    }, model_out, compress=3)
+    print(f"Best setting retrained on all rows and saved to {model_out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,154 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Request, Response, g, render_template, request, jsonify, stream_with_context
+import io
 import os
-from werkzeug.utils import secure_filename
-from chat_utils import parse_chat_per_user
-from model import predict_with_model
+import tempfile
+from werkzeug.exceptions import RequestEntityTooLarge
+from chat_utils import iter_chat_records, iter_stream_lines
+from job_queue import JobQueue, QueueFull
+import metrics
+from fused_scorer import fused_scorer
+from model import accumulator_factory, predict_documents
+from model_registry import get_model, model_fingerprint
+from preprocessing import PREPROCESS_VERSION, stemmer
+from result_cache import ResultCache
 import traceback
 import json
-import re
+from app import get_analyzer, get_lexicon
+
+# Upload tidak disimpan ke uploads/: isi file dibaca langsung dari stream request.
+# Upload kecil tetap di memori, di atas UPLOAD_SPOOL_BYTES dipindah ke file sementara.
+UPLOAD_SPOOL_BYTES = int(os.environ.get('UPLOAD_SPOOL_BYTES', 1024 * 1024))
+
+class SpooledRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES, mode='w+b')
+
+    @property
+    def max_content_length(self):
+        # NDJSON ke /v1/predict dibaca per batch, tidak pernah utuh di memori:
+        # batasnya PREDICT_NDJSON_MAX_MB, bukan MAX_UPLOAD_MB
+        if self.path == '/v1/predict' and self.mimetype == NDJSON:
+            return PREDICT_NDJSON_MAX_BYTES
+        return super().max_content_length
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+app.request_class = SpooledRequest
+# Upload yang lebih besar ditolak dengan 413
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 50)) * 1024 * 1024
+
+# Path model (.joblib atau folder .flat) bisa diatur lewat env MODEL_PATH
+MODEL_PATH = os.environ.get('MODEL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'personality_clf.joblib'))
+
+# Cache hasil per peserta; kosongkan RESULT_CACHE_PATH untuk menonaktifkan
+RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH', os.path.join('cache', 'results.sqlite'))
+
+def open_result_cache():
+    return ResultCache(RESULT_CACHE_PATH, version=PREPROCESS_VERSION) if RESULT_CACHE_PATH else None
 
-MODEL_PATH = r'E:\muhar\Tugas Matkul\S5\KECERDASAN BUATAN\ai_personality_detector\src\personality_clf.joblib'
+result_cache = open_result_cache()
 
-def clean_chat_text(text):
+# Antrian job analisis di background: JOB_WORKERS job jalan bersamaan, maksimal JOB_QUEUE_SIZE menunggu.
+# JOB_STATE_DIR dipakai bersama oleh worker serve.py, supaya status job bisa dicek dari worker mana pun.
+jobs = JobQueue(workers=int(os.environ.get('JOB_WORKERS', 2)),
+                max_pending=int(os.environ.get('JOB_QUEUE_SIZE', 8)),
+                ttl=int(os.environ.get('JOB_TTL', 3600)),
+                state_dir=os.environ.get('JOB_STATE_DIR') or None)
+
+# Diisi warm_up() (serve.py memanggilnya sebelum fork; di host WSGI lain /readyz memanggilnya sendiri).
+# /readyz membalas 503 sampai model termuat atau saat worker sedang berhenti
+readiness = {'model': None, 'fingerprint': None, 'draining': False}
+
+def warm_up():
+    """Load the model, its term counter and fused scorer, the trait lexicon and the Sastrawi dictionary.
+
+    serve.py calls this in the master before forking, so workers share the
+    loaded objects copy-on-write instead of each loading them on first use.
     """
-    Menghapus timestamp dan nama pengirim dari format chat WhatsApp.
+    data = get_model(MODEL_PATH)
+    accumulator_factory(MODEL_PATH)
+    fused_scorer(data['clf'])
+    get_lexicon()
+    stemmer.preload()
+    readiness['model'] = MODEL_PATH
+    readiness['fingerprint'] = model_fingerprint(MODEL_PATH)
+
+# Gauge untuk /metrics, dibaca hanya saat di-scrape (bukan di hot path)
+metrics.registry.add_collector('stem_cache', stemmer.stats)
+metrics.registry.add_collector('result_cache', lambda: result_cache.stats() if result_cache is not None else {})
+metrics.registry.add_collector('jobs', lambda: {'pending': jobs.pending()})
+
+@app.before_request
+def start_request_trace():
+    g.trace = metrics.start_trace()
+
+@app.after_request
+def add_server_timing(response):
+    # ?trace=1 atau header X-Trace: 1 -> timing per stage di header Server-Timing
+    if g.get('trace') is not None and (request.args.get('trace') == '1' or request.headers.get('X-Trace') == '1'):
+        response.headers['Server-Timing'] = g.trace.server_timing()
+    return response
+
+@app.teardown_request
+def finish_request_trace(exc):
+    trace = g.pop('trace', None)
+    if trace is not None:
+        metrics.finish_trace(trace, request.endpoint or 'unknown', 500 if exc is not None else None)
+
+def streamed(body):
+    """Stream ``body`` and finish the request trace after its last chunk, not at teardown."""
+    trace, endpoint = g.pop('trace', None), request.endpoint
+
+    def generate():
+        try:
+            yield from body
+        finally:
+            metrics.finish_trace(trace, endpoint)
+    return stream_with_context(generate())
+
+def respond(data, status=200):
+    """jsonify timed as the 'serialize' stage; adds the trace when the request asked for it."""
+    trace = g.get('trace')
+    if trace is not None and (request.args.get('trace') == '1' or request.headers.get('X-Trace') == '1'):
+        data['trace'] = trace.as_dict()
+    with metrics.timer('serialize'):
+        return jsonify(data), status
+
+def take_upload(file):
+    """Detach an uploaded file's stream so it outlives the request.
+
+    Flask closes request files when the request ends; a background job
+    keeps reading the stream, so it gets the stream and closes it itself.
     """
-    lines = text.split('\n')
-    cleaned = []
-    for line in lines:
-        m = re.match(r"\[\d{2}/\d{2}/\d{2}, \d{2}\.\d{2}\.\d{2}\] [^:]+: (.+)", line.strip())
-        if m:
-            cleaned.append(m.group(1))
-        else:
-            cleaned.append(line.strip())
-    return ' '.join(cleaned)
+    stream = file.stream
+    file.stream = io.BytesIO()
+    return stream
+
+def analyze_chat_stream(stream, job=None):
+    """Per-participant analyses (``Analysis.as_dict``) for an uploaded chat export (a seekable binary stream).
+
+    With a ``job``, the first read of the stream counts messages per
+    participant and each participant is marked done (or failed) as soon as
+    it is scored, so ``GET /jobs/<id>`` can report progress.
+    """
+    reads = []
+
+    def open_records():
+        records = metrics.timed_iter('parse', iter_chat_records(iter_stream_lines(stream)))
+        reads.append(1)
+        if job is not None and len(reads) == 1:
+            return job.track(records)
+        return records
+
+    # Pesan tiap user ditokenisasi sekali untuk lexicon dan model, tanpa join teks;
+    # peserta yang sudah ada di cache tidak diproses ulang
+    results = get_analyzer(MODEL_PATH).analyze_chat(open_records, cache=result_cache, progress=job)
+    return {name: analysis.as_dict() for name, analysis in results.items()}
+
+def analyze_text(text):
+    # Timestamp dan nama pengirim format WhatsApp dibuang, semua pesan dianggap satu user
+    with metrics.timer('parse'):
+        messages = [message for _, _, message in iter_chat_records(text.split('\n'))]
+    return {"User": get_analyzer(MODEL_PATH).analyze_messages(messages).as_dict()}
 
 @app.route('/')
 def index():
@@ -36,57 +159,160 @@ def analyze():
     try:
         # Jika file diupload
         if 'file' in request.files and request.files['file'].filename != '':
-            file = request.files['file']
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            user_msgs = parse_chat_per_user(file_path)
-            os.remove(file_path)
-            results = {}
-            for name, msgs in user_msgs.items():
-                text = ' '.join(msgs)
-                print(f"\n=== ANALYZING USER: {name} ===")
-                print(f"Text length: {len(text)} characters")
-                print(f"Text sample: {text[:200]}...")
-                pred = predict_with_model(text, MODEL_PATH)
-                print(f"Prediction result: {pred}")
-                print(f"Prediction type: {type(pred)}")
-                # Ensure all values are regular Python integers
-                clean_pred = {k: int(v) for k, v in pred.items()}
-                print(f"Cleaned prediction: {clean_pred}")
-                results[name] = clean_pred
-            
-            response_data = {'success': True, 'results': results}
-            print(f"Final response: {response_data}")
-            return jsonify(response_data)
-            
+            results = analyze_chat_stream(request.files['file'].stream)
+            metrics.incr('participants', len(results))
+            return respond({'success': True, 'results': results})
+
         # Jika teks dikirim langsung
         elif 'text' in request.form and request.form['text'].strip():
-            text = request.form['text']
-            print(f"\n=== ANALYZING DIRECT TEXT ===")
-            print(f"Text length: {len(text)} characters")
-            print(f"Text sample: {text[:200]}...")
-            cleaned_text = clean_chat_text(text)
-            print(f"Cleaned text: {cleaned_text[:200]}...")
-            # (opsional) processed_text = simple_preprocess(cleaned_text)
-            pred = predict_with_model(cleaned_text, MODEL_PATH)
-            print(f"Prediction result: {pred}")
-            print(f"Prediction type: {type(pred)}")
-            
-            # Ensure all values are regular Python integers  
-            clean_pred = {k: int(v) for k, v in pred.items()}
-            print(f"Cleaned prediction: {clean_pred}")
-            results = {"User": clean_pred}
-            
-            response_data = {'success': True, 'results': results}
-            print(f"Final response: {response_data}")
-            return jsonify(response_data)
+            return respond({'success': True, 'results': analyze_text(request.form['text'])})
         else:
             return jsonify({'success': False, 'error': 'Mohon upload file chat atau masukkan teks.'})
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         print(f"Error in analyze endpoint: {str(e)}")
         print(traceback.format_exc())
         return jsonify({'success': False, 'error': str(e)})
 
+@app.errorhandler(413)
+def upload_too_large(e):
+    limit = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'success': False, 'error': f'File terlalu besar (maksimal {limit} MB).'}), 413
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Like /analyze, but returns a job id at once and runs the analysis in the background."""
+    if 'file' in request.files and request.files['file'].filename != '':
+        stream = take_upload(request.files['file'])
+        func, cleanup = (lambda job: analyze_chat_stream(stream, job)), stream.close
+    elif 'text' in request.form and request.form['text'].strip():
+        text = request.form['text']
+        func, cleanup = (lambda job: analyze_text(text)), None
+    else:
+        return jsonify({'success': False, 'error': 'Mohon upload file chat atau masukkan teks.'}), 400
+    try:
+        job = jobs.submit(func, cleanup)
+    except QueueFull:
+        if cleanup is not None:
+            cleanup()
+        response = jsonify({'success': False, 'error': 'Server sedang sibuk, coba lagi sebentar lagi.'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return jsonify({'success': True, 'job_id': job.id, 'status_url': f'/jobs/{job.id}'}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    snapshot = jobs.snapshot(job_id)
+    if snapshot is None:
+        return jsonify({'success': False, 'error': 'Job tidak ditemukan atau sudah kedaluwarsa.'}), 404
+    return jsonify({'success': True, 'job': snapshot})
+
+# /v1/predict: JSON maksimal PREDICT_MAX_DOCUMENTS dokumen per request; NDJSON diproses per PREDICT_BATCH_SIZE
+PREDICT_MAX_DOCUMENTS = int(os.environ.get('PREDICT_MAX_DOCUMENTS', 10000))
+PREDICT_BATCH_SIZE = int(os.environ.get('PREDICT_BATCH_SIZE', 512))
+PREDICT_NDJSON_MAX_BYTES = int(os.environ.get('PREDICT_NDJSON_MAX_MB', 4096)) * 1024 * 1024
+NDJSON = 'application/x-ndjson'
+
+def parse_document(doc, index):
+    """(id, text or message list) from a /v1/predict document; ValueError if malformed."""
+    if not isinstance(doc, dict):
+        raise ValueError(f"document {index}: expected an object with 'text' or 'messages'")
+    doc_id = doc.get('id', index)
+    if isinstance(doc.get('text'), str):
+        return doc_id, doc['text']
+    messages = doc.get('messages')
+    if isinstance(messages, list) and all(isinstance(m, str) for m in messages):
+        return doc_id, messages
+    raise ValueError(f"document {doc_id!r}: needs 'text' (string) or 'messages' (list of strings)")
+
+def score_documents(parsed):
+    labels, probas = predict_documents([body for _, body in parsed], MODEL_PATH, cache=result_cache)
+    return [{'id': doc_id, 'labels': lab, 'proba': prob}
+            for (doc_id, _), lab, prob in zip(parsed, labels, probas)]
+
+def ndjson_line(result):
+    with metrics.timer('serialize'):
+        return json.dumps(result) + '\n'
+
+def iter_ndjson_results(lines, batch_size):
+    # Satu baris hasil per dokumen, urutan sama dengan input; baris rusak
+    # (JSON salah atau bukan UTF-8) dapat baris error. ``lines`` berisi bytes
+    batch = []
+    for index, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            batch.append(parse_document(json.loads(line.decode('utf-8')), index))
+        except ValueError as e:
+            if batch:
+                yield from score_documents(batch)
+                batch = []
+            yield {'id': index, 'error': str(e)}
+            continue
+        if len(batch) >= batch_size:
+            yield from score_documents(batch)
+            batch = []
+    if batch:
+        yield from score_documents(batch)
+
+@app.route('/v1/predict', methods=['POST'])
+def predict_v1():
+    """Score a batch of ``{id, text}`` / ``{id, messages}`` documents.
+
+    JSON in (an array or ``{"documents": [...]}``) gives JSON out. An NDJSON
+    request body (one document per line) is read and scored in batches of
+    ``batch_size`` while the NDJSON response is streamed back; JSON input
+    also gets an NDJSON response when ``Accept: application/x-ndjson``.
+    """
+    batch_size = max(1, min(request.args.get('batch_size', PREDICT_BATCH_SIZE, type=int), PREDICT_MAX_DOCUMENTS))
+    fingerprint = model_fingerprint(MODEL_PATH)
+    if request.mimetype == NDJSON:
+        body = (ndjson_line(r) for r in iter_ndjson_results(request.stream, batch_size))
+        return Response(streamed(body), mimetype=NDJSON, headers={'X-Model-Fingerprint': fingerprint})
+
+    payload = request.get_json(silent=True)
+    documents = payload.get('documents') if isinstance(payload, dict) else payload
+    if not isinstance(documents, list):
+        return jsonify({'success': False, 'error': "Body must be a JSON array of documents or {\"documents\": [...]}"}), 400
+    if len(documents) > PREDICT_MAX_DOCUMENTS:
+        return jsonify({'success': False, 'error': f"At most {PREDICT_MAX_DOCUMENTS} documents per JSON request; "
+                                                   f"send larger batches as {NDJSON}"}), 413
+    try:
+        parsed = [parse_document(doc, i) for i, doc in enumerate(documents)]
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if NDJSON in request.headers.get('Accept', ''):
+        body = (ndjson_line(r) for start in range(0, len(parsed), batch_size)
+                for r in score_documents(parsed[start:start + batch_size]))
+        return Response(streamed(body), mimetype=NDJSON, headers={'X-Model-Fingerprint': fingerprint})
+    return respond({'success': True, 'model': fingerprint, 'results': score_documents(parsed)})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text format (``?format=json`` for the raw per-process snapshots)."""
+    snapshots = metrics.registry.snapshots()
+    if request.args.get('format') == 'json':
+        return jsonify(snapshots)
+    return Response(metrics.render_prometheus(snapshots), mimetype='text/plain; version=0.0.4')
+
+@app.route('/readyz')
+def readyz():
+    error = None
+    if readiness['fingerprint'] is None and not readiness['draining']:
+        # Not started by serve.py (flask run, other WSGI hosts): load on the first probe
+        try:
+            warm_up()
+        except Exception as e:
+            error = str(e)
+    ready = readiness['fingerprint'] is not None and not readiness['draining']
+    body = {'ready': ready, 'pid': os.getpid(), 'model': readiness['model'], 'fingerprint': readiness['fingerprint']}
+    if error is not None:
+        body['error'] = error
+    return jsonify(body), (200 if ready else 503)
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Server pengembangan; untuk produksi pakai serve.py.
+    # Reloader debug menggandakan proses, jadi hanya aktif dengan FLASK_DEBUG=1
+    warm_up()
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1')
\ No newline at end of file